@@ -0,0 +1,70 @@
+"""
+Débit de l'encodage des critiques: un processus (threads torch) vs pool de N processus (EmbeddingPool)
+
+Modes:
+    - direct    : Embedding.embeddings_generer dans ce processus, torch avec tous ses threads
+    - pool N    : EmbeddingPool(workers=N, threads_per_worker=1), N = 1, 2, 4 ... --workers-max
+Le démarrage des workers (chargement du modèle) est exclu: une premiere passe d'échauffement
+charge le modèle dans chaque processus. Affiche textes/s et l'accélération par rapport au direct.
+
+Sans accès au hub HuggingFace, --synthetique utilise un modèle de meme architecture
+que all-MiniLM-L6-v2 à poids aléatoires (voir modele_synthetique.py).
+
+Usage: python benchmarks/bench_embedding_pool.py --synthetique --n 2000
+
+Auteur: Jo Kabonga
+Date: 18/10/2026
+"""
+
+import argparse
+import logging
+import sys
+import time
+from pathlib import Path
+
+import torch
+
+RACINE = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RACINE / "src"))
+sys.path.insert(0, str(RACINE / "benchmarks"))
+
+from data_processing.embedding import Embedding
+from data_processing.embedding_pool import EmbeddingPool, physical_cores
+from modele_synthetique import construire_modele, textes_synthetiques
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--synthetique", action="store_true", help="modèle local à poids aléatoires (hors ligne)")
+    parser.add_argument("--n", type=int, default=2000)
+    parser.add_argument("--workers-max", type=int, default=physical_cores())
+    parser.add_argument("--taille-tranche", type=int, default=256)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    model_name = construire_modele("/tmp/minilm_synthetique") if args.synthetique else args.model
+    textes = textes_synthetiques(args.n)
+    print(f"{len(textes)} textes, {physical_cores()} coeurs physiques, torch {torch.get_num_threads()} threads")
+    print(f"{'mode':>10}{'textes/s':>10}{'accélération':>14}")
+
+    embedding = Embedding(model_name)
+    embedding.embeddings_generer(textes[:32], show_progress=False) # échauffement
+    debut = time.perf_counter()
+    embedding.embeddings_generer(textes, show_progress=False)
+    reference = len(textes) / (time.perf_counter() - debut)
+    print(f"{'direct':>10}{reference:>10.1f}{1.0:>14.2f}")
+
+    comptes = sorted({2 ** i for i in range(args.workers_max.bit_length()) if 2 ** i <= args.workers_max} | {args.workers_max})
+    for workers in comptes:
+        with EmbeddingPool(model_name, workers=workers, taille_tranche=args.taille_tranche) as pool:
+            pool.encode(textes[:workers * args.taille_tranche]) # échauffement: une tranche par worker (modèle chargé)
+            debut = time.perf_counter()
+            pool.encode(textes)
+            debit = len(textes) / (time.perf_counter() - debut)
+        #end with
+        print(f"{f'pool {workers}':>10}{debit:>10.1f}{debit / reference:>14.2f}")
+    #end for
+#end main
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Débit de l'encodage des requetes texte avec et sans micro-batching (QueryEncoder)
+
+--clients threads envoient chacun --requetes textes différents (cache des requetes désactivé):
+    - sans lots : un appel au modèle par requete (max_batch=1)
+    - avec lots : MicroBatcher (max_batch=--max-batch, max_wait=--max-wait-ms)
+Affiche le débit (requetes/s), les latences p50 / p95 et la taille moyenne des lots.
+
+Sans accès au hub HuggingFace, --synthetique utilise un modèle de meme architecture
+que all-MiniLM-L6-v2 à poids aléatoires (voir modele_synthetique.py).
+
+Usage: python benchmarks/bench_micro_batching.py --synthetique --clients 16 --requetes 8
+
+Auteur: Jo Kabonga
+Date: 18/10/2026
+"""
+
+import argparse
+import logging
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+RACINE = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RACINE / "src"))
+sys.path.insert(0, str(RACINE / "benchmarks"))
+
+from recommandation.query_encoder import QueryEncoder
+from modele_synthetique import construire_modele, textes_synthetiques
+
+def mesurer(encodeur, textes, clients):
+    """débit (requetes/s) et latences (ms) de clients threads qui se partagent les textes"""
+    latences = []
+    verrou = threading.Lock()
+    depart = threading.Barrier(clients + 1)
+
+    def client(part):
+        depart.wait()
+        for texte in part:
+            debut = time.perf_counter()
+            encodeur.encode(texte)
+            with verrou:
+                latences.append((time.perf_counter() - debut) * 1e3)
+            #end with
+        #end for
+    #end client
+
+    threads = [threading.Thread(target=client, args=(textes[i::clients],)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    #end for
+    depart.wait()
+    debut = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    #end for
+    duree = time.perf_counter() - debut
+    return len(textes) / duree, np.percentile(latences, 50), np.percentile(latences, 95)
+#end mesurer
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--synthetique", action="store_true", help="modèle local à poids aléatoires (hors ligne)")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requetes", type=int, default=8, help="requetes par client")
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    model = construire_modele("/tmp/minilm_synthetique") if args.synthetique else args.model
+    textes = textes_synthetiques(args.clients * args.requetes, mots_min=2, mots_max=12) # requetes courtes
+
+    sans_lots = QueryEncoder(model_name=model, max_entries=0, max_batch=1)
+    avec_lots = QueryEncoder(model_name=model, max_entries=0, max_batch=args.max_batch, max_wait=args.max_wait_ms / 1e3)
+    avec_lots._embedding = sans_lots._modele() # meme modèle chargé une fois
+    sans_lots.encode("échauffement")
+
+    print(f"{args.clients} clients x {args.requetes} requetes, modèle {model}")
+    print(f"{'mode':>10}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'lot moyen':>11}")
+    for nom, encodeur in (("sans lots", sans_lots), ("avec lots", avec_lots)):
+        debit, p50, p95 = mesurer(encodeur, textes, args.clients)
+        lot = encodeur.stats()['lots']['taille_moyenne'] if encodeur.batcher is not None else 1.0
+        print(f"{nom:>10}{debit:>10.1f}{p50:>10.1f}{p95:>10.1f}{lot:>11.1f}")
+    #end for
+    avec_lots.close()
+#end main
+
+if __name__ == "__main__":
+    main()
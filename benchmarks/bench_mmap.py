@@ -0,0 +1,119 @@
+"""
+Mesure du chargement des vecteurs: copie complète (np.load) vs mmap partagé (embeddings.vec)
+
+Lance N processus (comme N workers uvicorn) qui chargent le meme film puis
+font une premiere recherche. On mesure par worker:
+    - RSS après chargement et après la premiere requete (compte les pages partagées dans chaque processus)
+    - PSS (mémoire proportionnelle, les pages partagées sont divisées entre les processus)
+    - temps de chargement et latence de la premiere requete
+
+Usage: python benchmarks/bench_mmap.py --n 100000 --workers 4
+
+Auteur: Jo Kabonga
+Date: 18/10/2026
+"""
+
+import argparse
+import multiprocessing as mp
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+RACINE = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RACINE / "src"))
+
+from vector_store.storage import write_vectors, NOM_FICHIER
+from vector_store.columnar import write_columnar
+
+def lire_memoire_kb():
+    """RSS et PSS du processus courant en kB (Linux)"""
+    memoire = {"Rss": 0, "Pss": 0}
+    with open("/proc/self/smaps_rollup") as fichier:
+        for ligne in fichier:
+            cle = ligne.split(":")[0]
+            if cle in memoire:
+                memoire[cle] = int(ligne.split()[1])
+            #end if
+        #end for
+    #end with
+    return memoire["Rss"], memoire["Pss"]
+#end lire_memoire_kb
+
+def creer_film(data_path, n, dim):
+    """film synthétique: vecteurs normalisés + métadonnées minimales"""
+    film_path = Path(data_path) / "bench"
+    film_path.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((n, dim), dtype=np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    np.save(film_path / "embeddings.npy", embeddings)
+    write_vectors(film_path / NOM_FICHIER, embeddings)
+    write_columnar(film_path, pd.DataFrame({"id": np.arange(n, dtype=np.int64), "user_id": 0}))
+#end creer_film
+
+def worker(data_path, mmap, barriere, resultats):
+    """un worker: chargement, premiere requete puis mesure mémoire"""
+    import logging
+    from vector_store.vector_store import VectorStore
+    logging.disable(logging.INFO)
+
+    rss_avant, _ = lire_memoire_kb()
+    vector_store = VectorStore(data_path, mmap=mmap)
+
+    debut = time.perf_counter()
+    film_data = vector_store.load_film("bench")
+    temps_chargement = time.perf_counter() - debut
+    rss_charge, _ = lire_memoire_kb()
+
+    debut = time.perf_counter()
+    vector_store.search_similar_vectors("bench", np.asarray(film_data["embeddings"][0]), k=10)
+    temps_requete = time.perf_counter() - debut
+
+    barriere.wait() # tous les workers ont chargé le film -> pages partagées visibles dans le PSS
+    rss, pss = lire_memoire_kb()
+    resultats.put((rss_charge - rss_avant, rss - rss_avant, pss, temps_chargement, temps_requete))
+    barriere.wait()
+#end worker
+
+def mesurer(data_path, mmap, n_workers):
+    """lance n_workers processus et retourne leurs mesures"""
+    ctx = mp.get_context("spawn")
+    barriere = ctx.Barrier(n_workers)
+    resultats = ctx.Queue()
+    processus = [ctx.Process(target=worker, args=(data_path, mmap, barriere, resultats)) for _ in range(n_workers)]
+    for p in processus:
+        p.start()
+    #end for
+    mesures = [resultats.get() for _ in processus]
+    for p in processus:
+        p.join()
+    #end for
+    return mesures
+#end mesurer
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--n", type=int, default=100_000, help="nombre de critiques du film synthétique")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_path:
+        creer_film(data_path, args.n, args.dim)
+        taille_mb = args.n * args.dim * 4 / 1e6
+        print(f"film: {args.n} x {args.dim} float32 ({taille_mb:.0f} MB), {args.workers} workers")
+        print(f"{'mode':<8}{'dRSS chargé MB':>16}{'dRSS requete MB':>17}{'PSS MB':>9}{'chargement ms':>15}{'1re requete ms':>16}")
+        for mode, mmap in (("eager", False), ("mmap", True)):
+            mesures = np.array(mesurer(data_path, mmap, args.workers))
+            rss_charge, rss, pss, chargement, requete = mesures.mean(axis=0) # moyenne par worker
+            print(f"{mode:<8}{rss_charge / 1024:>16.1f}{rss / 1024:>17.1f}{pss / 1024:>9.1f}{chargement * 1e3:>15.1f}{requete * 1e3:>16.1f}")
+        #end for
+    #end with
+#end main
+
+if __name__ == "__main__":
+    main()
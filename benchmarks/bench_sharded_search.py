@@ -0,0 +1,88 @@
+"""
+Passage à l'échelle de la recherche exacte répartie en tranches (VectorStore(shards=N))
+
+Sur un film synthétique (--n vecteurs), mesure la latence moyenne d'une requete
+pour 1, 2, 4, ... threads (jusqu'au nombre de coeurs) et l'accélération par rapport
+à un seul coeur. Les tranches sont des vues de la meme matrice (pas de copie).
+
+BLAS est limité à un thread (OPENBLAS_NUM_THREADS / OMP_NUM_THREADS / MKL_NUM_THREADS),
+pour mesurer le parallélisme des tranches et pas celui de la bibliothèque.
+
+Usage: python benchmarks/bench_sharded_search.py --n 2000000 --requetes 20
+
+Auteur: Jo Kabonga
+Date: 18/10/2026
+"""
+
+import os
+for variable in ("OPENBLAS_NUM_THREADS", "OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+    os.environ.setdefault(variable, "1") # avant l'import de numpy
+#end for
+
+import argparse
+import logging
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+RACINE = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RACINE / "src"))
+
+from vector_store.search import normaliser, topk_dot, topk_dot_sharded
+
+def film_synthetique(n, dim, seed=0, bloc=262_144):
+    """vecteurs normalisés aléatoires (générés par blocs pour limiter la mémoire de travail)"""
+    rng = np.random.default_rng(seed)
+    embeddings = np.empty((n, dim), dtype=np.float32)
+    for debut in range(0, n, bloc):
+        fin = min(debut + bloc, n)
+        embeddings[debut:fin] = normaliser(rng.standard_normal((fin - debut, dim), dtype=np.float32))
+    #end for
+    return embeddings
+#end film_synthetique
+
+def latence(fonction, requetes):
+    """latence moyenne en ms (une requete d'échauffement non comptée)"""
+    fonction(requetes[0])
+    debut = time.perf_counter()
+    for q in requetes:
+        fonction(q)
+    #end for
+    return (time.perf_counter() - debut) / len(requetes) * 1e3
+#end latence
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--n", type=int, default=2_000_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--requetes", type=int, default=20)
+    parser.add_argument("--max-threads", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    embeddings = film_synthetique(args.n, args.dim)
+    requetes = embeddings[np.random.default_rng(1).choice(args.n, size=args.requetes, replace=False)]
+    reference = latence(lambda q: topk_dot(embeddings, q, args.k), requetes)
+    print(f"{args.n} x {args.dim} ({embeddings.nbytes / 1e9:.2f} GB), k={args.k}, {os.cpu_count()} coeurs")
+    print(f"{'threads':>8}{'ms/requete':>12}{'accélération':>14}")
+    print(f"{'réf.':>8}{reference:>12.1f}{1.0:>14.2f}") # topk_dot sur un coeur
+
+    threads = 1
+    while threads <= args.max_threads:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            # vérification: meme résultat que la recherche sur un coeur
+            attendu = topk_dot(embeddings, requetes[0], args.k)[1]
+            assert set(topk_dot_sharded(embeddings, requetes[0], args.k, executor, threads)[1].tolist()) == set(attendu.tolist())
+            duree = latence(lambda q: topk_dot_sharded(embeddings, q, args.k, executor, threads), requetes)
+        #end with
+        print(f"{threads:>8}{duree:>12.1f}{reference / duree:>14.2f}")
+        threads *= 2
+    #end while
+#end main
+
+if __name__ == "__main__":
+    main()
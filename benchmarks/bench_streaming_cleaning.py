@@ -0,0 +1,68 @@
+"""
+Mémoire et durée du nettoyage des critiques: en mémoire (clean_critiques_data) vs streaming (clean_critiques_stream)
+
+Un export est simulé en recopiant --copies fois le csv de --csv (ids décalés, 1 copie sur 2 avec
+des textes modifiés: le reste est fait de doublons exacts entre lots). Chaque mode tourne dans un
+processus séparé; affiche la durée, la mémoire max (RSS) du processus et les lignes gardées.
+
+Usage: python benchmarks/bench_streaming_cleaning.py --copies 200 --chunksize 10000
+
+Auteur: Jo Kabonga
+Date: 18/10/2026
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+
+RACINE = Path(__file__).resolve().parent.parent
+
+CODE_MODE = """
+import json, logging, resource, sys, time
+sys.path.insert(0, {src!r})
+logging.disable(logging.INFO)
+from data_processing.data_cleaner import clean_critiques_data, clean_critiques_stream, save_cleaned_data
+debut = time.perf_counter()
+if {mode!r} == "memoire":
+    dataF = clean_critiques_data({csv!r}, "export")
+    save_cleaned_data(dataF, "memoire", {sortie!r})
+    lignes = len(dataF)
+else:
+    lignes = clean_critiques_stream({csv!r}, "export", {sortie!r} + "/stream.csv", chunksize={chunksize})['lignes_finales']
+print(json.dumps({{'duree': time.perf_counter() - debut, 'rss_mo': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 'lignes': lignes}}))
+"""
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", default=str(RACINE / "data" / "interstellar_critique.csv"))
+    parser.add_argument("--copies", type=int, default=200)
+    parser.add_argument("--chunksize", type=int, default=10_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as dossier:
+        brut = pd.read_csv(args.csv)
+        export = Path(dossier) / "export.csv"
+        for copie in range(args.copies):
+            morceau = brut.assign(id=brut['id'] + copie * len(brut))
+            if copie % 2 == 1:
+                morceau = morceau.assign(review_content=morceau['review_content'] + f" ({copie})")
+            #end if
+            morceau.to_csv(export, mode="a", index=False, header=copie == 0)
+        #end for
+        print(f"export: {export.stat().st_size / 2**20:.0f} Mo, {args.copies * len(brut)} lignes, lots de {args.chunksize}")
+        print(f"{'mode':>10}{'durée s':>10}{'RSS max Mo':>12}{'lignes':>10}")
+        for mode in ("memoire", "stream"):
+            code = CODE_MODE.format(src=str(RACINE / "src"), mode=mode, csv=str(export), sortie=dossier, chunksize=args.chunksize)
+            resultat = json.loads(subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout.strip().splitlines()[-1])
+            print(f"{mode:>10}{resultat['duree']:>10.1f}{resultat['rss_mo']:>12.0f}{resultat['lignes']:>10}")
+        #end for
+    #end with
+#end main
+
+if __name__ == "__main__":
+    main()
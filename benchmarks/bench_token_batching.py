@@ -0,0 +1,92 @@
+"""
+Débit de l'encodage des critiques: lots fixes de 32 textes vs lots à budget de tokens (+ découpage)
+
+Les textes ont la distribution de longueurs (en mots) des critiques de --csv. Modes:
+    - lots fixes   : SentenceTransformer.encode(batch_size=32), critiques longues tronquées
+    - budget       : encode_bucketed (lots triés, --budget tokens par lot), tronquées
+    - budget+chunk : idem avec découpage des critiques longues en fenetres moyennées
+Affiche textes/s, tokens utiles/s (hors padding), part de padding et textes tronqués.
+
+Sans accès au hub HuggingFace, --synthetique utilise un modèle de meme architecture
+que all-MiniLM-L6-v2 à poids aléatoires, textes faits de mots de son vocabulaire.
+
+Usage: python benchmarks/bench_token_batching.py --synthetique --n 500
+
+Auteur: Jo Kabonga
+Date: 18/10/2026
+"""
+
+import argparse
+import logging
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+RACINE = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RACINE / "src"))
+sys.path.insert(0, str(RACINE / "benchmarks"))
+
+from data_processing.embedding import Embedding
+from data_processing.token_batching import encode_bucketed
+from modele_synthetique import construire_modele, textes_vocabulaire
+
+def stats_lots_fixes(model, textes, batch_size):
+    """tokens utiles et de padding des lots fixes (textes triés par nombre de caractères, comme encode)"""
+    longueur_max = model.max_seq_length
+    longueurs = np.array([min(len(ids), longueur_max) for ids in model.tokenizer(textes, verbose=False)['input_ids']])
+    tronques = int(sum(len(ids) > longueur_max for ids in model.tokenizer(textes, verbose=False)['input_ids']))
+    ordre = np.argsort([-len(texte) for texte in textes], kind="stable")
+    padding = 0
+    for debut in range(0, len(textes), batch_size):
+        lot = longueurs[ordre[debut:debut + batch_size]]
+        padding += len(lot) * int(lot.max()) - int(lot.sum())
+    #end for
+    return {'tokens': int(longueurs.sum()), 'tokens_padding': padding, 'tronques': tronques}
+#end stats_lots_fixes
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--synthetique", action="store_true", help="modèle local à poids aléatoires (hors ligne)")
+    parser.add_argument("--csv", default=str(RACINE / "data" / "processed" / "fightclub_cleaned.csv"))
+    parser.add_argument("--n", type=int, default=500)
+    parser.add_argument("--budget", type=int, default=8192)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    critiques = pd.read_csv(args.csv, usecols=['review_content'])['review_content'].dropna().astype(str)
+    critiques = critiques.sample(n=min(args.n, len(critiques)), random_state=args.seed, replace=args.n > len(critiques))
+    if args.synthetique:
+        dossier = construire_modele("/tmp/minilm_synthetique")
+        embedding = Embedding(dossier)
+        textes = textes_vocabulaire(critiques.str.split().str.len().to_numpy(), dossier, seed=args.seed)
+    else:
+        embedding = Embedding(args.model)
+        textes = critiques.tolist()
+    #end if
+    model = embedding.model
+    model.encode(textes[:8], show_progress_bar=False) # échauffement
+
+    print(f"{len(textes)} critiques, max_seq_length={model.max_seq_length}, budget={args.budget} tokens")
+    print(f"{'mode':>14}{'textes/s':>10}{'tokens/s':>10}{'padding':>9}{'tronqués':>10}")
+    for nom in ("lots fixes", "budget", "budget+chunk"):
+        debut = time.perf_counter()
+        if nom == "lots fixes":
+            model.encode(textes, batch_size=32, normalize_embeddings=True, show_progress_bar=False)
+            stats = stats_lots_fixes(model, textes, 32)
+        else:
+            stats = {}
+            encode_bucketed(model, "torch", textes, token_budget=args.budget, chunking=nom == "budget+chunk", stats=stats)
+        #end if
+        duree = time.perf_counter() - debut
+        part_padding = stats['tokens_padding'] / (stats['tokens'] + stats['tokens_padding'])
+        print(f"{nom:>14}{len(textes) / duree:>10.1f}{stats['tokens'] / duree:>10.0f}{part_padding:>9.1%}{stats['tronques']:>10}")
+    #end for
+#end main
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Evaluation rappel@k de l'index IVF par rapport à la recherche exacte
+
+Sur un film existant (--film fightclub) ou un film synthétique en groupes (--n 200000).
+Affiche pour chaque nprobe le rappel@k et la latence moyenne par requete, pour choisir
+le réglage (VectorStore(nprobe=...)) en connaissance de cause.
+
+Usage: python benchmarks/eval_ann_recall.py --n 200000 --k 10
+
+Auteur: Jo Kabonga
+Date: 18/10/2026
+"""
+
+import argparse
+import logging
+import sys
+from pathlib import Path
+
+import numpy as np
+
+RACINE = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RACINE / "src"))
+
+from vector_store.ann_index import IVFIndex, evaluate_recall
+from vector_store.search import normaliser
+from vector_store.snapshot import base_dir
+
+def film_synthetique(n, dim, n_groupes=1000, bruit=1.5, seed=0):
+    """vecteurs normalisés regroupés autour de n_groupes thèmes (comme des critiques d'un film)"""
+    rng = np.random.default_rng(seed)
+    themes = normaliser(rng.standard_normal((n_groupes, dim), dtype=np.float32))
+    embeddings = themes[rng.integers(n_groupes, size=n)]
+    embeddings += bruit / np.sqrt(dim) * rng.standard_normal((n, dim), dtype=np.float32)
+    return normaliser(embeddings)
+#end film_synthetique
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--film", help="film de data/processed (sinon film synthétique)")
+    parser.add_argument("--n", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--n-listes", type=int, default=None)
+    parser.add_argument("--requetes", type=int, default=200)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    if args.film:
+        embeddings = np.load(base_dir(RACINE / "data" / "processed" / args.film) / "embeddings.npy")
+    else:
+        embeddings = film_synthetique(args.n, args.dim)
+    #end if
+
+    index = IVFIndex.build(embeddings, n_listes=args.n_listes)
+    print(f"{len(embeddings)} vecteurs, {index.n_listes} listes, k={args.k}")
+    print(f"{'nprobe':>7}{'recall@k':>10}{'ANN ms':>9}{'exact ms':>10}")
+    for ligne in evaluate_recall(embeddings, index, k=args.k, n_requetes=args.requetes):
+        print(f"{ligne['nprobe']:>7}{ligne['recall']:>10.3f}{ligne['latence_ms']:>9.2f}{ligne['latence_exacte_ms']:>10.2f}")
+    #end for
+#end main
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Modèle sentence-transformers synthétique pour les benchmarks sans accès au hub HuggingFace
+
+Meme architecture que all-MiniLM-L6-v2 (BERT 6 couches, 384 dimensions, 12 tetes,
+pooling moyen + normalisation), poids aléatoires et vocabulaire généré: le cout de
+l'inférence est représentatif, pas la qualité des vecteurs.
+
+Usage: python benchmarks/modele_synthetique.py --dossier /tmp/minilm_synthetique
+
+Auteur: Jo Kabonga
+Date: 18/10/2026
+"""
+
+import argparse
+import string
+from pathlib import Path
+
+import numpy as np
+
+TAILLE_VOCABULAIRE = 20_000
+
+def construire_modele(dossier, seed=0):
+    """
+    écrit le modèle synthétique dans dossier (rien à faire s'il existe déjà)
+    Returns:
+        str: chemin à passer à Embedding(model_name=...)
+    """
+    dossier = Path(dossier)
+    if (dossier / "modules.json").exists():
+        return str(dossier)
+    #end if
+    import torch
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+    from sentence_transformers import SentenceTransformer, models
+
+    torch.manual_seed(seed)
+    rng = np.random.default_rng(seed)
+    lettres = list(string.ascii_lowercase)
+    mots = set()
+    while len(mots) < TAILLE_VOCABULAIRE:
+        mots.add("".join(rng.choice(lettres, size=rng.integers(2, 9))))
+    #end while
+    vocabulaire = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + lettres + ["##" + c for c in lettres] + sorted(mots)
+
+    bert_dir = dossier / "bert"
+    bert_dir.mkdir(parents=True, exist_ok=True)
+    (bert_dir / "vocab.txt").write_text("\n".join(vocabulaire))
+    tokenizer = BertTokenizerFast(vocab_file=str(bert_dir / "vocab.txt"), do_lower_case=True)
+    config = BertConfig(vocab_size=len(vocabulaire), hidden_size=384, num_hidden_layers=6, num_attention_heads=12,
+                        intermediate_size=1536, max_position_embeddings=512)
+    BertModel(config).save_pretrained(bert_dir)
+    tokenizer.save_pretrained(bert_dir)
+
+    transformer = models.Transformer(str(bert_dir), max_seq_length=256)
+    modele = SentenceTransformer(modules=[transformer, models.Pooling(384, "mean"), models.Normalize()])
+    modele.save(str(dossier))
+    return str(dossier)
+#end construire_modele
+
+def textes_synthetiques(n, seed=0, mots_min=5, mots_max=60):
+    """textes de longueurs variées (mots du vocabulaire synthétique et mots inconnus)"""
+    rng = np.random.default_rng(seed)
+    lettres = list(string.ascii_lowercase)
+    textes = []
+    for _ in range(n):
+        longueur = int(rng.integers(mots_min, mots_max + 1))
+        textes.append(" ".join("".join(rng.choice(lettres, size=rng.integers(2, 9))) for _ in range(longueur)))
+    #end for
+    return textes
+#end textes_synthetiques
+
+def textes_vocabulaire(nombres_mots, dossier, seed=0):
+    """textes faits de mots du vocabulaire du modèle synthétique (environ un token par mot)"""
+    vocabulaire = (Path(dossier) / "bert" / "vocab.txt").read_text().split("\n")[57:] # sans tokens spéciaux ni lettres
+    rng = np.random.default_rng(seed)
+    return [" ".join(rng.choice(vocabulaire, size=int(n))) for n in nombres_mots]
+#end textes_vocabulaire
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dossier", default="/tmp/minilm_synthetique")
+    args = parser.parse_args()
+    print(construire_modele(args.dossier))
+#end main
+
+if __name__ == "__main__":
+    main()
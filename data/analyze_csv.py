@@ -22,18 +22,23 @@ def analyze_csv_structure():
 
         try:
             with open(csv_file, 'r', encoding='utf-8') as file:
-                # Lecture du fichier pour l'analyse
-                lines = file.readlines() 
-                print(f"Nombre total de lignes: {len(lines)}") 
-                print(f" En-têtes: {lines[0].strip()}")
+                # Lecture ligne par ligne (pas de readlines: les exports font plusieurs Go)
+                first_line = file.readline()
+                apercu = []
+                nb_lignes = 1 if first_line else 0
+                for line in file:
+                    if len(apercu) < 4:
+                        apercu.append(line) # lignes 2,3,4,5
+                    nb_lignes += 1
+                print(f"Nombre total de lignes: {nb_lignes}") 
+                print(f" En-têtes: {first_line.strip()}")
 
                 #Afficher les premieres lignes de données
                 print(f"\n Apercu du contenu: ")
-                for i, line in enumerate(lines[1:5],2): #lignes 2,3,4,5
+                for i, line in enumerate(apercu,2): #lignes 2,3,4,5
                     print(f"ligne {i}: {line.strip()[:100]}")
 
                 # Analyser le séparateur
-                first_line = lines[0]
                 if ',' in first_line:
                     sep = ','
                 elif ';' in first_line:
@@ -43,7 +48,7 @@ def analyze_csv_structure():
                 print(f"Separateur détecté: '{sep}'")
 
                 # compter les colonnes
-                reader = csv.reader(lines, delimiter=sep)
+                reader = csv.reader([first_line], delimiter=sep)
                 headers = next(reader)
                 print(f"Nombre de colonnes: {len(headers)}")
                 print(f"Colonnes: {headers}")
@@ -5,7 +5,11 @@ Auteur :Jo kabonga
 Date:2/11/2025
 """
 import logging
+import os
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 sys.path.append(str(Path(__file__).parent.parent))
@@ -17,7 +21,13 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+import numpy as np
+
 from recommandation.recommender_engine import RecommanderEngine
+from recommandation.result_cache import ResultCache, TAILLE_MAX_DEFAUT, TTL_DEFAUT, OCTETS_MAX_DEFAUT
+from recommandation.scoring import HybridScorer, DEMI_VIE_DEFAUT
+from recommandation.query_encoder import QueryEncoder, TAILLE_CACHE_DEFAUT
+from recommandation.batch_scheduler import TAILLE_LOT_DEFAUT, ATTENTE_MAX_DEFAUT
 from vector_store.vector_store import VectorStore
 
 def get_recommender():
@@ -32,11 +42,50 @@ def get_recommender():
 
         # initialisation de la class  VectorStore
 
-        vector_store = VectorStore()
+        # SC_VECTOR_MMAP=1 : vecteurs mappés en lecture seule, partagés entre les workers uvicorn
+        # SC_MEMORY_BUDGET_MB : budget mémoire des films chargés (éviction LRU), illimité par defaut
+        # SC_SEARCH_SHARDS : recherche exacte des très gros films répartie sur N threads
+        budget_mb = os.environ.get("SC_MEMORY_BUDGET_MB")
+        shards = os.environ.get("SC_SEARCH_SHARDS")
+        vector_store = VectorStore(
+            mmap=os.environ.get("SC_VECTOR_MMAP", "0") == "1",
+            memory_budget=int(float(budget_mb) * 1024 * 1024) if budget_mb else None,
+            shards=int(shards) if shards else None
+        )
         logger.info("vectorStore initialisé...")
 
+        # cache des résultats: SC_RESULT_CACHE_SIZE (entrées, 0 -> désactivé), SC_RESULT_CACHE_TTL (s),
+        # SC_RESULT_CACHE_MB (taille max des résultats gardés)
+        taille_cache = int(os.environ.get("SC_RESULT_CACHE_SIZE", TAILLE_MAX_DEFAUT))
+        result_cache = None
+        if taille_cache > 0:
+            result_cache = ResultCache(
+                max_entries=taille_cache,
+                ttl=float(os.environ.get("SC_RESULT_CACHE_TTL", TTL_DEFAUT)),
+                max_bytes=int(float(os.environ.get("SC_RESULT_CACHE_MB", OCTETS_MAX_DEFAUT / (1024 * 1024))) * 1024 * 1024)
+            )
+        #end if
+
+        # score hybride: SC_SCORE_POPULARITE / SC_SCORE_RECENCE (poids, 0 par defaut -> cosinus seul),
+        # SC_SCORE_DEMI_VIE (jours)
+        scorer = HybridScorer(
+            poids_popularite=float(os.environ.get("SC_SCORE_POPULARITE", 0)),
+            poids_recence=float(os.environ.get("SC_SCORE_RECENCE", 0)),
+            demi_vie_jours=float(os.environ.get("SC_SCORE_DEMI_VIE", DEMI_VIE_DEFAUT))
+        )
+
+        # recherche par texte (/search): modèle chargé à la premiere requete,
+        # SC_QUERY_CACHE_SIZE vecteurs de requetes gardés (LRU, 0 -> désactivé),
+        # micro-batching des requetes concurrentes: SC_QUERY_BATCH_MAX (1 -> désactivé), SC_QUERY_BATCH_WAIT_MS
+        query_encoder = QueryEncoder(
+            max_entries=int(os.environ.get("SC_QUERY_CACHE_SIZE", TAILLE_CACHE_DEFAUT)),
+            max_batch=int(os.environ.get("SC_QUERY_BATCH_MAX", TAILLE_LOT_DEFAUT)),
+            max_wait=float(os.environ.get("SC_QUERY_BATCH_WAIT_MS", ATTENTE_MAX_DEFAUT * 1e3)) / 1e3,
+            backend=os.environ.get("SC_EMBEDDING_BACKEND", "torch") # voir data_processing/inference_backends.py
+        )
+
         # le moteur de recommandation
-        engine_R = RecommanderEngine(vector_store)
+        engine_R = RecommanderEngine(vector_store, result_cache=result_cache, scorer=scorer, query_encoder=query_encoder)
         logger.info("RecommanderEngine initialisé...")
 
         # films disponible
@@ -50,6 +99,93 @@ def get_recommender():
         logger.error(f"erreur initialiation: {ex}")
         raise
 
+def films_a_precharger(vector_store, config):
+    """
+    liste des films à précharger selon la config (variable SC_WARMUP)
+    Args:
+        vector_store: instance de VectorStore
+        config: "" (aucun), "all" (tous), "top:N" (N films les plus demandés, trafic.json)
+            ou liste "film1,film2"
+    Returns:
+        list: films à précharger
+    """
+    config = (config or "").strip().lower()
+    if config == "":
+        return []
+    #end if
+    films = vector_store.list_available_films()
+    if config == "all":
+        return films
+    #end if
+    if config.startswith("top:"):
+        trafic = vector_store.load_traffic()
+        tries = sorted(films, key=lambda film: trafic.get(film, 0), reverse=True)
+        return tries[:int(config.split(":", 1)[1])]
+    #end if
+    return [film.strip() for film in config.split(",") if film.strip() in films]
+#end films_a_precharger
+
+def _precharger_film(engine_R, film_id):
+    """
+    charge un film puis fait une recherche factice (pages des vecteurs et tables en mémoire),
+    sans compter ces accès dans le trafic du film (top:N)
+    """
+    with engine_R.vector_store.untracked():
+        film_data = engine_R.vector_store.load_film(film_id)
+        if len(film_data['embeddings']) == 0:
+            return
+        #end if
+        engine_R.vector_store.search_similar_vectors(film_id, np.asarray(film_data['embeddings'][0]), k=10)
+        critique_id = str(film_data['metadata']['id'].iloc[0])
+        engine_R.find_similar(critique_id=critique_id, film_id=film_id, k=10, scores_sim_min=0.0)
+    #end with
+#end _precharger_film
+
+# état du préchargement, lu par l'endpoint /ready
+etat_warmup = {"pret": threading.Event(), "films": [], "erreurs": {}, "duree": None}
+
+def warm_up(engine_R, films, max_workers=4):
+    """
+    préchargement des films en parallèle (threads) avant d'accepter le trafic
+    Args:
+        engine_R: moteur de recommandation
+        films: films à précharger
+        max_workers: nombre de threads de chargement
+    """
+    debut = time.time()
+    try:
+        logger.info(f"préchargement de {len(films)} films: {films}")
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            futures = {film: pool.submit(_precharger_film, engine_R, film) for film in films}
+            for film, future in futures.items():
+                try:
+                    future.result()
+                    etat_warmup["films"].append(film)
+                except Exception as ex:
+                    logger.error(f"préchargement du film '{film}' échoué: {ex}")
+                    etat_warmup["erreurs"][film] = str(ex)
+                #end try
+            #end for
+        #end with
+    finally:
+        etat_warmup["duree"] = time.time() - debut
+        etat_warmup["pret"].set()
+        logger.info(f"préchargement terminé en {etat_warmup['duree']:.2f}s")
+    #end try
+#end warm_up
+
+def start_warm_up(engine_R):
+    """
+    lance le préchargement en arrière-plan selon SC_WARMUP / SC_WARMUP_WORKERS
+    (sans SC_WARMUP, l'api est prête immédiatement)
+    """
+    films = films_a_precharger(engine_R.vector_store, os.environ.get("SC_WARMUP", ""))
+    max_workers = int(os.environ.get("SC_WARMUP_WORKERS", "4"))
+    thread = threading.Thread(target=warm_up, args=(engine_R, films, max_workers), daemon=True, name="warm-up")
+    thread.start()
+    return thread
+#end start_warm_up
+
 recommender_engine = get_recommender()
 
 
@@ -6,14 +6,19 @@ Auteur: Jo kabonga
 Date: 2/11/2025
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header
+from fastapi.responses import JSONResponse
 import logging
+import os
+import secrets
 import time
-from typing import List
+from contextlib import asynccontextmanager
+from typing import List, Optional
 
 # importation des modules
 from src.schemas.models import CritiqueReference, RecommandationRequest, RecommendationResponse,CritiqueResponse
-from src.api.dependencies import recommender_engine
+from src.schemas.models import RechercheTexteRequest, RechercheTexteResponse
+from src.api.dependencies import recommender_engine, start_warm_up, etat_warmup
 
 #Config du logging
 logging.basicConfig(
@@ -22,13 +27,45 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    démarrage: préchargement des films en arrière-plan (voir /ready) et surveillance des instantanés
+    arret: sauvegarde du trafic par film pour le préchargement des films les plus demandés
+    """
+    start_warm_up(recommender_engine)
+    # SC_RELOAD_INTERVAL : surveillance des instantanés publiés (secondes), désactivée par defaut
+    intervalle = os.environ.get("SC_RELOAD_INTERVAL")
+    if intervalle:
+        recommender_engine.vector_store.start_watcher(float(intervalle))
+    #end if
+    # SC_COMPACT_INTERVAL : compaction des segments delta (secondes), désactivée par defaut
+    intervalle_compaction = os.environ.get("SC_COMPACT_INTERVAL")
+    if intervalle_compaction:
+        recommender_engine.vector_store.start_compactor(float(intervalle_compaction))
+    #end if
+    yield
+    recommender_engine.vector_store.stop_watcher()
+    if recommender_engine.query_encoder is not None:
+        recommender_engine.query_encoder.close()
+    #end if
+    try:
+        if recommender_engine.vector_store.acces_films:
+            recommender_engine.vector_store.save_traffic()
+        #end if
+    except Exception as ex:
+        logger.error(f"erreur sauvegarde trafic: {ex}")
+#end lifespan
+
 #app
 
 app = FastAPI(
     title = "SensCritique Recommendation API",
-    description = "API de recommandation de critiques similaires "
+    description = "API de recommandation de critiques similaires ",
+    lifespan = lifespan
 )
 
+
 @app.post("/recommendations", response_model=RecommendationResponse)
 def get_recommendations(request: RecommandationRequest):
     """
@@ -39,22 +76,31 @@ def get_recommendations(request: RecommandationRequest):
     try:
         logger.info(f"requete: film='{request.film_id}', critique='{request.critique_id}', k={request.k}")
 
-        # appel au moteur
-        critiques_similaires = recommender_engine.find_similar(
-            critique_id = request.critique_id,
-            film_id = request.film_id,
-            k=request.k,
-            scores_sim_min = 0.7 # à ajuster
-        )
-        process_time = time.time() - start_time
-
         # recup les infos
         film_id_normalizer = request.film_id.lower().strip()
-        film_data = recommender_engine.vector_store.load_film(film_id_normalizer)
-        dataF_metadata = film_data['metadata']
+        if not recommender_engine.vector_store.film_exists(film_id_normalizer):
+            raise ValueError(f"film '{request.film_id}' non dispo")
+        #end if
+
+        # meme instantané du film pour la recherche et la critique de ref (rechargement à chaud)
+        with recommender_engine.vector_store.snapshot(film_id_normalizer):
+            # appel au moteur
+            critiques_similaires = recommender_engine.find_similar(
+                critique_id = request.critique_id,
+                film_id = request.film_id,
+                k=request.k,
+                scores_sim_min = 0.7, # à ajuster
+                mmr_lambda = request.mmr_lambda,
+                filtres = request.filtres.model_dump(exclude_none=True) if request.filtres else None
+            )
+            process_time = time.time() - start_time
 
-        #trouver la critique de ref
-        critique_ref = dataF_metadata[dataF_metadata['id'] == int(request.critique_id)].iloc[0]
+            #trouver la critique de ref (index ID -> ligne du VectorStore)
+            critique_ref = recommender_engine.vector_store.get_critique_by_id(film_id_normalizer,request.critique_id)
+            if critique_ref is None:
+                raise ValueError(f"critique {request.critique_id} inexistante pour le film {request.film_id}")
+            #end if
+        #end with
 
         #construction de la rep
         response = RecommendationResponse(
@@ -69,6 +115,7 @@ def get_recommendations(request: RecommandationRequest):
                     id=str(row['id']),
                     user_id = str(row['user_id']),
                     score_similarity = round(row['similarity_score'],4),
+                    score_hybride = round(row['hybrid_score'],4) if 'hybrid_score' in row else None,
                     review_content = row['review_content']
                 )
                 for _, row in critiques_similaires.iterrows()
@@ -94,6 +141,61 @@ def get_recommendations(request: RecommandationRequest):
         raise HTTPException(status_code = 500, detail="erreur interne et/ou serveur")
 #end get_recommendations
 
+@app.post("/search", response_model=RechercheTexteResponse)
+def search_text(request: RechercheTexteRequest):
+    """
+    recherche pendant la frappe - retourne les critiques d'un film proches d'un texte libre
+    (modèle chargé à la premiere requete, vecteurs des requetes en cache LRU)
+    """
+    start_time = time.time()
+
+    try:
+        logger.info(f"recherche texte: film='{request.film_id}', k={request.k}")
+        if request.filtres and request.filtres.exclude_same_user:
+            raise HTTPException(status_code=422, detail="'exclude_same_user' sans critique de reference")
+        #end if
+        critiques_similaires = recommender_engine.search_text(
+            texte = request.texte,
+            film_id = request.film_id,
+            k = request.k,
+            scores_sim_min = 0.0, # requetes courtes: scores plus bas que critique/critique
+            mmr_lambda = request.mmr_lambda,
+            filtres = request.filtres.model_dump(exclude_none=True, exclude={'exclude_same_user'}) if request.filtres else None
+        )
+        process_time = time.time() - start_time
+
+        response = RechercheTexteResponse(
+            requete = request.texte,
+            recommendations=[
+                CritiqueResponse(
+                    id=str(row['id']),
+                    user_id = str(row['user_id']),
+                    score_similarity = round(row['similarity_score'],4),
+                    score_hybride = round(row['hybrid_score'],4) if 'hybrid_score' in row else None,
+                    review_content = row['review_content']
+                )
+                for _, row in critiques_similaires.iterrows()
+            ],
+            metadata={
+                "total_results": len(critiques_similaires),
+                "temps_exec": f"{process_time:.3f}s",
+                "film": request.film_id
+            }
+        )
+        logger.info(f"recherche texte traitée: {len(critiques_similaires)} resultats en {process_time:.3f}s")
+        return response
+
+    except HTTPException:
+        raise
+    except ValueError as ex:
+        # film non trouvé
+        logger.warning(f"{str(ex)}")
+        raise HTTPException(status_code=404, detail=str(ex))
+    except Exception as ex:
+        logger.error(f"erreur : {ex}")
+        raise HTTPException(status_code = 500, detail="erreur interne et/ou serveur")
+#end search_text
+
 @app.get("/health")
 def health_check():
     """
@@ -108,6 +210,63 @@ def health_check():
     }
 #end health_check
 
+@app.get("/ready")
+def readiness_check():
+    """
+    prêt à recevoir du trafic seulement apres le préchargement des films (503 avant),
+    distinct de /health qui indique seulement que le processus répond
+    """
+    etat = {
+        "films_precharges": etat_warmup["films"],
+        "erreurs": etat_warmup["erreurs"]
+    }
+    if not etat_warmup["pret"].is_set():
+        return JSONResponse(status_code=503, content={"status": "warming_up", **etat})
+    #end if
+    return {"status": "ready", "duree_warmup": f"{etat_warmup['duree']:.3f}s", **etat}
+#end readiness_check
+
+@app.post("/admin/films/{film_id}/reload")
+def reload_film(film_id: str, x_admin_token: Optional[str] = Header(default=None)):
+    """
+    recharge l'instantané publié d'un film (manifest.json) puis l'échange atomiquement,
+    les requetes en cours finissent sur l'ancienne version
+    (fermé sans SC_ADMIN_TOKEN, l'en-tête X-Admin-Token doit correspondre)
+    """
+    token = os.environ.get("SC_ADMIN_TOKEN")
+    if not token:
+        raise HTTPException(status_code=404, detail="Not Found") # route admin désactivée
+    #end if
+    if x_admin_token is None or not secrets.compare_digest(x_admin_token.encode(), token.encode()):
+        raise HTTPException(status_code=403, detail="token admin invalide")
+    #end if
+    if not recommender_engine.vector_store.film_exists(film_id):
+        raise HTTPException(status_code=404, detail=f"film '{film_id}' non dispo")
+    #end if
+    try:
+        ancienne, nouvelle = recommender_engine.vector_store.reload_film(film_id)
+        return {"film": film_id, "ancienne_version": ancienne, "version": nouvelle, "recharge": ancienne != nouvelle}
+    except Exception as ex:
+        logger.error(f"erreur rechargement '{film_id}': {ex}")
+        raise HTTPException(status_code=500, detail="rechargement échoué, ancienne version conservée")
+#end reload_film
+
+@app.get("/stats")
+def cache_stats():
+    """
+    compteurs du cache des films (hits, misses, évictions) pour dimensionner le budget mémoire
+    et des caches des résultats ('resultats') et des vecteurs de requetes texte ('requetes')
+    """
+    stats = recommender_engine.vector_store.cache_stats()
+    if recommender_engine.result_cache is not None:
+        stats['resultats'] = recommender_engine.result_cache.stats()
+    #end if
+    if recommender_engine.query_encoder is not None:
+        stats['requetes'] = recommender_engine.query_encoder.stats()
+    #end if
+    return stats
+#end cache_stats
+
 @app.get("/films")
 def list_films():
     """
@@ -131,8 +290,11 @@ def root():
         "endspoints": {
             "documentation": "/docs",
             "santé": "/health",
+            "prêt": "/ready",
             "films": "/films",
-            "recommandations": "POST /recommendations"
+            "stats": "/stats",
+            "recommandations": "POST /recommendations",
+            "recherche texte": "POST /search"
         }
     }
 #end root
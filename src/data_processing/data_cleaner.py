@@ -1,5 +1,9 @@
 import pandas as pd
+import numpy as np
+import argparse
+import hashlib
 import logging # pour suivre le déroulement du script 
+import os
 import sys 
 from pathlib import Path
 
@@ -12,6 +16,12 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__) 
 
+# signaux gardés pour les filtres et le classement (s'ils sont dans le csv), en tableaux typés compacts
+COLONNES_SIGNAUX = ['rating','review_date_creation','review_hits','gen_review_like_count']
+FORMAT_DATE = "%d/%m/%y %H:%M" # format SensCritique ex: 28/01/15 09:33
+TAILLE_LOT_DEFAUT = 10_000 # lignes lues par lot en mode streaming (~30 Mo de critiques)
+TAILLE_EMPREINTE = 16 # octets (blake2b) par texte gardé pour le dédoublonnage entre lots
+
 """TODO: Teste chaque methode apres chaque implementation !!!!!!!!!!"""
 
 def clean_critiques_data(csv_path,film_name):
@@ -39,7 +49,8 @@ def clean_critiques_data(csv_path,film_name):
         
         # Chargement 
         try:
-            colonnes_utiles = ['id','review_content','user_id'] # charger que les colonnes utiles 
+            colonnes_csv = pd.read_csv(csv_path, nrows=0).columns # en-tête seulement
+            colonnes_utiles = ['id','review_content','user_id'] + [col for col in COLONNES_SIGNAUX if col in colonnes_csv] # charger que les colonnes utiles 
             dataF = pd.read_csv(csv_path, usecols=colonnes_utiles) # création du dataFrame avec les colonnes jugées utile
         except KeyError as ex :
             logger.error(f"Colonne manquante dans le fichier csv -> {ex}")
@@ -53,50 +64,22 @@ def clean_critiques_data(csv_path,film_name):
                 raise ValueError("colonne 'review_content' manquante")
             # si la colonne review_content existe
 
-            colonnes_utiles = [col  for col in ['id','review_content','user_id'] if col in  dataF.columns]
+            colonnes_utiles = [col  for col in ['id','review_content','user_id'] + COLONNES_SIGNAUX if col in  dataF.columns]
 
             dataF = dataF[colonnes_utiles]
 
         logger.info(f"données initiales: {len(dataF)} lignes, {len(dataF.columns)} colonnes")
 
-        # NETTOYAGE 
-        # Supprimer les lignes où review_content manque : inutile pour le moteur
-        initial_count = len(dataF) # les données initiales avant suppression
-
-        dataF_clean = dataF[dataF['review_content'].notna()]
-        nan_suppr = initial_count - len(dataF_clean) 
-        logger.info(f" {nan_suppr} lignes spprimées ")
-
-        # Supprimer les chaines vides
-        empty_count = len(dataF_clean)
-        dataF_clean = dataF_clean[dataF_clean['review_content'].str.strip() != '']
-        empty_suppr = empty_count - len(dataF_clean)
-        logger.info(f"{empty_suppr} lignes supprimées")
+        # NETTOYAGE : un seul masque (review manquante, vide ou doublon exact), une seule copie
+        dataF_clean, compteurs = clean_chunk(dataF, film_name)
 
         # Verfier qu'il y a des données 
         if len(dataF_clean)==0:
             raise ValueError("Aucune données restante")
         #End if
 
-        # Gestion des user_id manquants
-        user_id_nan_count = dataF_clean['user_id'].isna().sum() # le nombre d'user_id manquant
-
-        dataF_clean['user_id'] = dataF_clean['user_id'].fillna('anonyme') # remplacer les user_id manquant par anonyme
-
-        if user_id_nan_count > 0:
-            logger.info(f"{user_id_nan_count} remplacés par anonymes")
-        #End if
-
-        # Ajouter film_id pour avoir les colonnes jugées utiles
-        dataF_clean['film_id']= film_name # parametre 
-
-        # Supprimer les doublons exacts 
-        data_count = len(dataF_clean) # les données avant suppression des doublons
-        dataF_clean = dataF_clean.drop_duplicates(subset='review_content')
-        doublons_suppr = data_count - len(dataF_clean)
-        logger.info(f"{doublons_suppr} de lignes supprimées")
-
-        """TODO : Rapport final d'avant et apres nettoyage """
+        # Rapport final d'avant et apres nettoyage
+        log_cleaning_report(cleaning_report(len(dataF), [compteurs], dataF_clean.columns), film_name)
 
         return dataF_clean
     except Exception as ex:
@@ -104,6 +87,164 @@ def clean_critiques_data(csv_path,film_name):
         raise 
 #End clean_critiques_data
 
+def clean_chunk(dataF, film_name, vus=None):
+    """
+    Nettoie un DataFrame (fichier entier ou lot d'un fichier lu en streaming)
+        - supprime les review_content manquantes ou vides et les doublons exacts (premiere occurrence gardée)
+        - user_id manquant -> 'anonyme', ajoute film_id, convertit les signaux
+    Args:
+        - dataF: les colonnes utiles du csv
+        - film_name: le titre du film
+        - vus: ensemble des empreintes des textes gardés dans les lots précédents (complété),
+            None -> doublons cherchés dans dataF seulement
+    return: tuple:(dataF nettoyé, compteurs des lignes supprimées / modifiées)
+    """
+    contenu = dataF['review_content']
+    manquantes = contenu.isna().to_numpy()
+    vides = ~manquantes & (contenu.str.strip() == '').to_numpy(dtype=bool, na_value=False)
+    valides = ~(manquantes | vides)
+    doublons = valides & contenu.duplicated().to_numpy() # un texte valide n'est jamais égal à un texte vide
+
+    if vus is not None:
+        # doublons des lots précédents: empreintes des textes encore candidats
+        candidats = np.flatnonzero(valides & ~doublons)
+        empreintes = [hashlib.blake2b(str(texte).encode('utf-8'), digest_size=TAILLE_EMPREINTE).digest()
+                      for texte in contenu.to_numpy()[candidats]]
+        doublons[candidats[[empreinte in vus for empreinte in empreintes]]] = True
+        vus.update(empreintes)
+    #End if
+
+    dataF_clean = dataF.loc[valides & ~doublons]
+    user_id_nan_count = 0
+    if 'user_id' in dataF_clean.columns:
+        user_id_nan_count = int(dataF_clean['user_id'].isna().sum()) # le nombre d'user_id manquant
+        dataF_clean = dataF_clean.assign(user_id=dataF_clean['user_id'].fillna('anonyme')) # remplacer les user_id manquant par anonyme
+    #End if
+    dataF_clean = convert_signal_columns(dataF_clean.assign(film_id=film_name)) # signaux en types compacts (note, date, vues, likes)
+
+    compteurs = {
+        'review_manquantes': int(manquantes.sum()),
+        'review_vides': int(vides.sum()),
+        'doublons': int(doublons.sum()),
+        'user_id_anonymes': user_id_nan_count
+    }
+    return dataF_clean, compteurs
+#End clean_chunk
+
+def cleaning_report(lignes_initiales, compteurs_lots, colonnes):
+    """
+    Rapport d'avant et apres nettoyage (somme des compteurs des lots)
+    return: dict: lignes initiales / finales, lignes supprimées par motif, user_id remplacés, colonnes gardées
+    """
+    rapport = {'lignes_initiales': int(lignes_initiales)}
+    for cle in ['review_manquantes','review_vides','doublons','user_id_anonymes']:
+        rapport[cle] = sum(compteurs[cle] for compteurs in compteurs_lots)
+    #End for
+    rapport['lignes_finales'] = rapport['lignes_initiales'] - rapport['review_manquantes'] - rapport['review_vides'] - rapport['doublons']
+    rapport['colonnes'] = list(colonnes)
+    return rapport
+#End cleaning_report
+
+def log_cleaning_report(rapport, film_name):
+    """affiche le rapport de nettoyage"""
+    gardees = rapport['lignes_finales'] / max(rapport['lignes_initiales'], 1)
+    logger.info(f"Rapport de nettoyage '{film_name}': {rapport['lignes_initiales']} lignes -> {rapport['lignes_finales']} ({gardees:.1%} gardées)")
+    logger.info(f" review manquantes: {rapport['review_manquantes']}, vides: {rapport['review_vides']}, doublons: {rapport['doublons']}")
+    logger.info(f" user_id remplacés par anonyme: {rapport['user_id_anonymes']}, colonnes: {rapport['colonnes']}")
+#End log_cleaning_report
+
+def clean_critiques_stream(csv_path, film_name, output_path, chunksize=TAILLE_LOT_DEFAUT):
+    """
+    Nettoyage en streaming pour les gros exports: le csv est lu par lots de chunksize lignes,
+    chaque lot nettoyé est ajouté au fichier de sortie. La mémoire est bornée par la taille
+    d'un lot + les empreintes des textes gardés (16 octets chacun + l'ensemble python, ~100 octets
+    par critique), les doublons exacts sont supprimés entre tous les lots.
+
+    Args:
+        - csv_path: le chemin du fichier brute csv
+        - film_name: le titre du film
+        - output_path: le csv nettoyé (écrit dans un fichier temporaire puis renommé)
+        - chunksize: lignes par lot
+    return: rapport: le rapport d'avant et apres nettoyage (voir cleaning_report)
+    """
+    try:
+        csv_path = Path(csv_path)
+        if not csv_path.exists():
+            raise FileNotFoundError(f"Fichier introuvable -> {csv_path}")
+        #End if
+        if csv_path.stat().st_size == 0:
+            raise ValueError(f" fichier vide -> {csv_path}")
+        #End if
+
+        colonnes_csv = pd.read_csv(csv_path, nrows=0).columns # en-tête seulement
+        if 'review_content' not in colonnes_csv:
+            raise ValueError("colonne 'review_content' manquante")
+        #End if
+        colonnes_utiles = [col for col in ['id','review_content','user_id'] + COLONNES_SIGNAUX if col in colonnes_csv]
+        # types fixés: l'inférence lot par lot pourrait changer le type d'une colonne d'un lot à l'autre
+        types = {col: 'str' for col in ['id','review_content','user_id'] if col in colonnes_utiles}
+
+        logger.info(f" Traitement en streaming du fichier :{csv_path} (lots de {chunksize} lignes)")
+        output_path = Path(output_path)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = output_path.with_name(output_path.name + ".tmp")
+        vus = set()
+        compteurs_lots = []
+        lignes_initiales = 0
+        colonnes = []
+        try:
+            with open(tmp_path, 'w', encoding='utf-8', newline='') as sortie:
+                for lot in pd.read_csv(csv_path, usecols=colonnes_utiles, dtype=types, chunksize=chunksize):
+                    lignes_initiales += len(lot)
+                    lot_clean, compteurs = clean_chunk(lot, film_name, vus)
+                    compteurs_lots.append(compteurs)
+                    lot_clean.to_csv(sortie, index=False, header=len(colonnes) == 0)
+                    colonnes = colonnes or list(lot_clean.columns)
+                #End for
+            #End with
+
+            rapport = cleaning_report(lignes_initiales, compteurs_lots, colonnes)
+            if rapport['lignes_finales'] == 0:
+                raise ValueError("Aucune données restante")
+            #End if
+            os.replace(tmp_path, output_path)
+        finally:
+            tmp_path.unlink(missing_ok=True) # erreur en cours de lecture: pas de fichier partiel laissé
+        #End try
+        log_cleaning_report(rapport, film_name)
+        logger.info(f" {output_path}")
+        return rapport
+    except Exception as ex:
+        logger.error(f"Erreur lors du traitement en streaming du fichier {csv_path} -> {ex}")
+        raise
+#End clean_critiques_stream
+
+def convert_signal_columns(dataF):
+    """
+    Convertit les colonnes de signaux présentes en types compacts
+        - rating: float32 (NaN si manquante)
+        - review_date_creation: datetime64[s] (NaT si manquante ou invalide)
+        - review_hits, gen_review_like_count: int32 (0 si manquant)
+    Args:
+        - dataF: le dataset nettoyé
+    return: dataF avec les colonnes converties
+    """
+    dataF = dataF.copy()
+    if 'rating' in dataF.columns:
+        dataF['rating'] = pd.to_numeric(dataF['rating'], errors='coerce').astype('float32')
+    #End if
+    if 'review_date_creation' in dataF.columns:
+        dates = pd.to_datetime(dataF['review_date_creation'], format=FORMAT_DATE, errors='coerce')
+        dataF['review_date_creation'] = dates.astype('datetime64[s]')
+    #End if
+    for col in ['review_hits','gen_review_like_count']:
+        if col in dataF.columns:
+            dataF[col] = pd.to_numeric(dataF[col], errors='coerce').fillna(0).astype('int32')
+        #End if
+    #End for
+    return dataF
+#End convert_signal_columns
+
 def validate_cleaned_data(dataF,film_name):
     """
     Fonction de validation des données nettoyées 
@@ -160,6 +301,25 @@ def save_cleaned_data(dataF, film_name, output_dir = "../../data/processed"):
 #end save_cleaned_data
 
 if __name__ =="__main__":
+    # gros export: python data_cleaner.py export.csv nom_du_film [--output ...] [--chunksize 10000]
+    parser = argparse.ArgumentParser(description="nettoyage des critiques (sans argument: fightclub et interstellar en mémoire)")
+    parser.add_argument("csv", nargs="?", help="csv brut à nettoyer en streaming")
+    parser.add_argument("film", nargs="?", help="nom du film")
+    parser.add_argument("--output", help="csv nettoyé (defaut: ../../data/processed/<film>/cleaned_data.csv)")
+    parser.add_argument("--chunksize", type=int, default=TAILLE_LOT_DEFAUT)
+    args = parser.parse_args()
+    if args.csv:
+        try:
+            if not args.film:
+                parser.error("nom du film manquant")
+            #End if
+            output = args.output or Path("../../data/processed") / args.film / "cleaned_data.csv"
+            clean_critiques_stream(args.csv, args.film, output, chunksize=args.chunksize)
+            sys.exit(0)
+        except Exception as ex:
+            logger.error(f"erreur -> {ex}")
+            sys.exit(1)
+    #End if
     try:
         #Nettoyage 
         logger.info("Nettoyage ...")
@@ -10,8 +10,26 @@ import numpy as np
 import logging 
 from sentence_transformers import SentenceTransformer
 from pathlib import Path
+import os
 import sys
 
+sys.path.append(str(Path(__file__).parent.parent))
+from vector_store.snapshot import write_manifest
+from vector_store.neighbours import K_DEFAUT
+from vector_store.ann_index import TAILLE_MIN_ANN
+from vector_store.segments import append_segment, write_base
+
+try:
+    from .inference_backends import BACKENDS, prepare_model, encode
+    from .embedding_cache import EmbeddingCache, text_digests
+    from .token_batching import encode_bucketed
+    from .embedding_pool import EmbeddingPool
+except ImportError:
+    from inference_backends import BACKENDS, prepare_model, encode # execution directe du module
+    from embedding_cache import EmbeddingCache, text_digests
+    from token_batching import encode_bucketed
+    from embedding_pool import EmbeddingPool
+
 # configuration du logging
 
 logging.basicConfig(
@@ -32,21 +50,49 @@ class Embedding:
 
     """
 
-    def __init__(self,model_name='all-MiniLM-L6-v2'):
+    def __init__(self,model_name='all-MiniLM-L6-v2', backend="torch", cache_dir=None, token_budget=None, chunking=False,
+                 workers=None, threads_per_worker=1):
         """
         Initialisation du modèle d'embedding
         Args:
             model_name:nom du modèle sentence-transformers.
                 - all-MiniLM-L6-v2 : équilibré, rapide, bon pour le français et l'anglais
                 - dimensions: 384, bonne précision
+            backend: backend d'inférence (voir inference_backends.py)
+                - torch : float32 (reference)
+                - int8  : quantification dynamique des couches linéaires
+                - bf16  : calcul en bfloat16 (CPU avec AVX512-BF16 / AMX)
+            cache_dir: dossier du cache persistant des vecteurs (voir embedding_cache.py),
+                None -> tout est encodé à chaque appel de process_dataF
+            token_budget: lots triés par longueur limités à token_budget tokens (voir token_batching.py),
+                None -> lots fixes de batch_size textes
+            chunking: avec token_budget, critiques plus longues que le modèle découpées en fenetres
+                moyennées au lieu d'etre tronquées
+            workers: nombre de processus d'encodage (voir embedding_pool.py), None ou 1 -> dans ce processus,
+                0 -> un processus par coeur physique
+            threads_per_worker: threads torch de chaque processus d'encodage
 
         """
         try:
             """TODO: Analyse du model à faire """
+            if backend not in BACKENDS:
+                raise ValueError(f"backend inconnu: {backend} (choix: {BACKENDS})")
+            #end if
 
-            logger.info(f"Chargement du modèle:{model_name}")
-            self.model = SentenceTransformer(model_name) # charger le model
+            logger.info(f"Chargement du modèle:{model_name} (backend {backend})")
+            self.backend = backend
+            self.model = prepare_model(SentenceTransformer(model_name, device="cpu" if backend != "torch" else None), backend) # charger le model
             self.dim_embedding = self.model.get_sentence_embedding_dimension() # la dimenson des vecteurs
+            self.token_budget = token_budget
+            self.chunking = chunking
+            # le découpage change les vecteurs des critiques longues: clé de cache distincte
+            cle_cache = f"{model_name}|{backend}" + ("|chunking" if token_budget and chunking else "")
+            self.cache = EmbeddingCache(cache_dir, cle_cache) if cache_dir is not None else None
+            self.pool = None
+            if workers is not None and workers != 1:
+                self.pool = EmbeddingPool(model_name, workers=workers or None, threads_per_worker=threads_per_worker,
+                                          backend=backend, token_budget=token_budget, chunking=chunking)
+            #end if
             logger.info(f"model chargé - dimension des embeddings = {self.dim_embedding}")
 
         except Exception as ex:
@@ -74,14 +120,14 @@ class Embedding:
             #end if
             logger.info(f"generation des vecteurs pour {len(texts)} textes")
 
-            #encodage par lots (optimisation mémoire ou pas )
-            embeddings = self.model.encode(
-                texts,
-                batch_size=batch_size,
-                show_progress_bar = show_progress,
-                convert_to_tensor = False, # retourner au format numpy array pour utiliser FAISS(ou pas depend de la taille des données)
-                normalize_embeddings = True # pour la similarité cosinus
-            )
+            #encodage par lots (optimisation mémoire ou pas ), vecteurs normalisés pour la similarité cosinus
+            if self.pool is not None:
+                embeddings = self.pool.encode(texts, batch_size=batch_size)
+            elif self.token_budget:
+                embeddings = encode_bucketed(self.model, self.backend, texts, token_budget=self.token_budget, chunking=self.chunking)
+            else:
+                embeddings = encode(self.model, self.backend, texts, batch_size=batch_size, show_progress=show_progress)
+            #end if
             logger.info(f"Vecteurs générés: {embeddings.shape}")
             return embeddings
         
@@ -90,6 +136,13 @@ class Embedding:
             raise
     #end embeddings_generer
 
+    def close(self):
+        """arrete les processus d'encodage (mode multi-processus)"""
+        if self.pool is not None:
+            self.pool.close()
+        #end if
+    #end close
+
     def process_dataF(self,dataF, text_column='review_content'):
         """
         Traite le dataF et genere les vecteurs
@@ -99,7 +152,9 @@ class Embedding:
             text_column: colonne avec le texte à encoder ici : review_content
 
         Returns:
-            tuple:(DataFrame avec les vecteurs, matrices d'emeddings)
+            tuple:(DataFrame des métadonnées, matrices d'emeddings)
+            Remarque: les vecteurs ne sont plus copiés dans une colonne 'embedding',
+                la ligne i du DataFrame correspond à la ligne i de la matrice.
         """
         try:
             #verifier  la colonne texte
@@ -111,13 +166,16 @@ class Embedding:
             texts = dataF[text_column].tolist()
 
             logger.info(f"Traitement du dataF: {len(dataF)} lignes, colonne'{text_column}")
-            embeddings = self.embeddings_generer(texts=texts) # appel de la méthode embeddings_generer
+            if self.cache is None:
+                embeddings = self.embeddings_generer(texts=texts) # appel de la méthode embeddings_generer
+            else:
+                embeddings = self._embeddings_with_cache(texts)
+            #end if
             
-            # ajouter les vecteurs au dataF
-            dataF_embeddings = dataF.copy() # copie du dataF original
-            dataF_embeddings['embedding'] = list(embeddings) #ajouter une colonne 'embedding' au dataF
+            # métadonnées alignées sur la matrice (ligne i <-> vecteur i)
+            dataF_embeddings = dataF.reset_index(drop=True) # copie du dataF original
 
-            logger.info(f"dataF mis à jour(dataF -> dataF_embeddings) : {len(dataF_embeddings)} lignes avec les vecteurs")
+            logger.info(f"dataF mis à jour(dataF -> dataF_embeddings) : {len(dataF_embeddings)} lignes alignées sur les vecteurs")
             return dataF_embeddings,embeddings 
         except Exception as ex:
             logger.error(f"ereur du traitement du dataF: {ex}")
@@ -125,29 +183,54 @@ class Embedding:
 
     #end process_dataF
 
-    def save_embeddings(self,embeddings,dataF_metadata, film_name, output_dir = "../../data/processed"):
+    def _embeddings_with_cache(self,texts):
+        """
+        vecteurs des textes: lus dans le cache persistant, seuls les textes absents sont encodés
+        (une seule fois par texte normalisé) puis ajoutés au cache
+        """
+        empreintes = text_digests(texts)
+        trouve, vecteurs_caches = self.cache.lookup(empreintes)
+        embeddings = np.empty((len(texts), self.dim_embedding), dtype=np.float32)
+        if trouve.any():
+            embeddings[trouve] = vecteurs_caches
+        #end if
+
+        absents = np.flatnonzero(~trouve)
+        if len(absents) > 0:
+            # doublons entre les textes absents: encodés une fois
+            uniques, premiers, inverse = np.unique(empreintes[absents], return_index=True, return_inverse=True)
+            nouveaux = self.embeddings_generer(texts=[texts[i] for i in absents[premiers]])
+            embeddings[absents] = nouveaux[inverse]
+            self.cache.add(uniques, nouveaux)
+        #end if
+        logger.info(f"cache des vecteurs: {int(trouve.sum())}/{len(texts)} trouvés, {len(absents)} encodés")
+        return embeddings
+    #end _embeddings_with_cache
+
+    def save_embeddings(self,embeddings,dataF_metadata, film_name, output_dir = "../../data/processed",
+                        k_voisins=None, taille_min_ann=None):
         """
-        Sauvegarde les vecteurs et métadonnées dans le dossier du film
+        Sauvegarde les vecteurs et métadonnées dans une nouvelle base du film puis la publie
         Agrs:
             - embeddings: numpy array des embeddings
             - dataF_metadata: DataFrame des métadonnées
             - film_name : nom du film
             - output_dir: dossier de la sauvegarde
+            - k_voisins: voisins par critique de la table précalculée (None -> pas de table)
+            - taille_min_ann: critiques à partir desquelles l'index IVF est construit (None -> pas d'index)
+        Remarque: ingestion complète -> les segments delta et suppressions de l'ancienne base
+            sont abandonnés (leurs lignes ne correspondent plus à la nouvelle numérotation)
         """
         try:
-            # creation du dossier du film
             film_output_dir = Path(output_dir) / film_name
-            film_output_dir.mkdir(parents=True, exist_ok=True)
 
-            # sauvegarde
-            embeddings_path = film_output_dir / "embeddings.npy"
-            dataF_metadata_path = film_output_dir / "metadata.pkl"
-
-            np.save(embeddings_path,embeddings)
-            dataF_metadata.to_pickle(dataF_metadata_path)
+            # nouvelle base écrite à part puis publiée en une étape: l'api peut lire le film pendant la mise à jour
+            base = write_base(film_output_dir, embeddings, dataF_metadata, k_voisins=k_voisins, taille_min_ann=taille_min_ann)
+            embeddings_path = base / "embeddings.npy"
+            dataF_metadata_path = base / "metadata"
 
             logger.info(f"embeddings sauvegardé pour '{film_name}':")
-            logger.info(f"dossier : {film_output_dir}")
+            logger.info(f"dossier : {base}")
             logger.info(f"embeddings: {embeddings_path} ({len(embeddings)} vecteurs) ")
             logger.info(f"métadonnées: {dataF_metadata_path} ({len(dataF_metadata)} critiques )")
 
@@ -157,6 +240,30 @@ class Embedding:
             raise
     #end save_embeddings
 
+    def append_embeddings(self,dataF,film_name,output_dir = "../../data/processed"):
+        """
+        Ajout incrémental: encode seulement les nouvelles critiques et les écrit dans un segment delta
+        du film (la base n'est pas réécrite, voir vector_store/segments.py pour la compaction)
+        Args:
+            - dataF: DataFrame nettoyé des nouvelles critiques
+            - film_name : nom du film (déjà publié)
+            - output_dir: dossier des films traités
+        Returns:
+            Path: dossier du segment
+        Remarque: un serveur en cours d'exécution voit le segment apres rechargement
+            (VectorStore.add_critiques fait l'ajout et l'échange dans le meme processus)
+        """
+        try:
+            film_output_dir = Path(output_dir) / film_name
+            dataF_embeddings, embeddings = self.process_dataF(dataF)
+            segment = append_segment(film_output_dir, embeddings, dataF_embeddings)
+            write_manifest(film_output_dir) # nouvel instantané: base + segments
+            return segment
+        except Exception as ex:
+            logger.error(f"erreur ajout incrémental '{film_name}': {ex}")
+            raise
+    #end append_embeddings
+
 
 def main():
     try:
@@ -171,7 +278,17 @@ def main():
 
         # initialisation du model 
         logger.info("Initialisation du model")
-        embeddings_generer = Embedding() # appel de la classe Remrq:embeddings_generer nom de la variable. 
+        # SC_EMBEDDING_BACKEND : torch (defaut), int8 ou bf16 (voir inference_backends.py pour la dérive)
+        # SC_EMBEDDING_CACHE_DIR : cache persistant des vecteurs (seules les nouvelles critiques sont encodées)
+        # SC_TOKEN_BUDGET : lots à budget de tokens (ex 8192), SC_CHUNKING=1 : critiques longues découpées et moyennées
+        # SC_EMBEDDING_WORKERS : processus d'encodage (1 par defaut, 0 -> un par coeur physique), SC_EMBEDDING_THREADS : threads par processus
+        token_budget = os.environ.get("SC_TOKEN_BUDGET")
+        embeddings_generer = Embedding(backend=os.environ.get("SC_EMBEDDING_BACKEND", "torch"),
+                                       cache_dir=os.environ.get("SC_EMBEDDING_CACHE_DIR", "../../data/cache/embeddings"),
+                                       token_budget=int(token_budget) if token_budget else None,
+                                       chunking=os.environ.get("SC_CHUNKING", "0") == "1",
+                                       workers=int(os.environ.get("SC_EMBEDDING_WORKERS", "1")),
+                                       threads_per_worker=int(os.environ.get("SC_EMBEDDING_THREADS", "1"))) # appel de la classe Remrq:embeddings_generer nom de la variable. 
 
         #génération des vecteurs
         logger.info("génération des vecteurs")
@@ -184,12 +301,18 @@ def main():
         #sauvegarde
         logger.info("Sauvegarde des resultats")
 
+        # table des voisins précalculée (servie par RecommanderEngine.find_similar) et index
+        # approximatif (IVF, films volumineux seulement) construits dans la nouvelle base, publiée
+        # ensuite avec son manifest (l'api recharge à la nouvelle version)
+
         #fightclub
         embeddings_generer.save_embeddings(
             embeddings = emb_fightclub,
             dataF_metadata = dataF_fightclub_emb,
             film_name = "fightclub",
-            output_dir = "../../data/processed"
+            output_dir = "../../data/processed",
+            k_voisins = K_DEFAUT,
+            taille_min_ann = TAILLE_MIN_ANN
         )
 
         #interstellar
@@ -197,7 +320,9 @@ def main():
             embeddings = emb_interstellar,
             dataF_metadata = dataF_interstellar_emb,
             film_name = "interstellar",
-            output_dir = "../../data/processed"
+            output_dir = "../../data/processed",
+            k_voisins = K_DEFAUT,
+            taille_min_ann = TAILLE_MIN_ANN
         )
 
         """TODO: faire le RAPPORT FINAL"""
@@ -210,6 +335,7 @@ def main():
         ex_emb = emb_fightclub[0]
         logger.info(f" exemple des vecteurs: {ex_emb[:10]}...") # 10 premieres valeurs
 
+        embeddings_generer.close() # processus d'encodage
         logger.info("generation terminées")
         return dataF_fightclub_emb, dataF_interstellar_emb
     except Exception as ex:
@@ -0,0 +1,196 @@
+"""
+Ici, on gère le cache persistant des vecteurs de critiques (ré-indexation incrémentale)
+
+Format (un dossier par modèle + backend, dans data/cache/embeddings/):
+    - model.json                 : modèle et dimension du cache
+    - <NNNNNN>.keys.npy          : empreintes des textes (blake2b 16 octets, |S16)
+    - <NNNNNN>.vecs.npy          : vecteurs float32 alignés sur les empreintes
+
+Expl: la clé d'un vecteur est (modèle, empreinte du texte normalisé). Avant d'appeler
+    le modèle, Embedding.process_dataF cherche les empreintes dans le cache et n'encode
+    que les textes absents: une ré-indexation quotidienne coute le nombre de nouvelles
+    critiques, pas la taille du corpus. Chaque ajout écrit un nouveau fragment (ajout seul,
+    vecteurs puis empreintes: un fragment sans empreintes est ignoré), les empreintes
+    sont triées une fois au chargement, une recherche est un searchsorted.
+
+Auteur: Jo Kabonga
+Date: 18/10/2026
+"""
+
+import hashlib
+import json
+import logging
+import re
+import unicodedata
+import numpy as np
+from pathlib import Path
+
+from vector_store.storage import save_npy
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+logger = logging.getLogger(__name__)
+
+TAILLE_EMPREINTE = 16 # octets
+FRAGMENTS_MAX = 64 # au dela, compaction au prochain ajout
+
+def normalize_text(texte):
+    """texte normalisé avant l'empreinte: unicode NFC, espaces regroupés (la casse est gardée)"""
+    return " ".join(unicodedata.normalize("NFC", str(texte)).split())
+#end normalize_text
+
+def text_digests(textes):
+    """
+    empreintes des textes normalisés
+    Returns:
+        np.ndarray |S16 (n,)
+    """
+    return np.array([hashlib.blake2b(normalize_text(texte).encode("utf-8"), digest_size=TAILLE_EMPREINTE).digest()
+                     for texte in textes], dtype=f"S{TAILLE_EMPREINTE}")
+#end text_digests
+
+class EmbeddingCache:
+    """
+    Cache disque des vecteurs par empreinte de texte, pour un modèle donné
+    """
+
+    def __init__(self, dossier, model_key):
+        """
+        Args:
+            dossier: dossier racine des caches (un sous dossier par modèle)
+            model_key: identifiant du modèle (nom + backend), les vecteurs d'un autre modèle ne sont jamais servis
+        """
+        self.model_key = model_key
+        nom = re.sub(r"[^A-Za-z0-9._-]+", "_", model_key).strip("_")
+        self.dossier = Path(dossier) / f"{nom}-{hashlib.blake2b(model_key.encode(), digest_size=4).hexdigest()}"
+        self.dim = None
+        self._charger()
+    #end __init__
+
+    def _charger(self):
+        """lit les fragments complets et trie les empreintes"""
+        self._fragments = [] # vecteurs (mmap) par fragment
+        self._debuts = [] # premiere position globale de chaque fragment
+        cles = []
+        n = 0
+        if (self.dossier / "model.json").exists():
+            infos = json.loads((self.dossier / "model.json").read_text())
+            if infos['model_key'] != self.model_key:
+                raise ValueError(f"cache {self.dossier} d'un autre modèle: {infos['model_key']}")
+            #end if
+            self.dim = infos['dim']
+        #end if
+        for path_cles in sorted(self.dossier.glob("*.keys.npy")):
+            path_vecteurs = path_cles.with_name(path_cles.name.replace(".keys.npy", ".vecs.npy"))
+            if not path_vecteurs.exists():
+                continue
+            #end if
+            vecteurs = np.load(path_vecteurs, mmap_mode="r")
+            cles_fragment = np.load(path_cles)
+            if len(vecteurs) != len(cles_fragment):
+                logger.warning(f"fragment incomplet ignoré: {path_cles}")
+                continue
+            #end if
+            self._fragments.append(vecteurs)
+            self._debuts.append(n)
+            cles.append(cles_fragment)
+            n += len(cles_fragment)
+        #end for
+        self._cles = np.concatenate(cles) if cles else np.empty(0, dtype=f"S{TAILLE_EMPREINTE}")
+        self._ordre = np.argsort(self._cles, kind="stable")
+        self._cles_triees = self._cles[self._ordre]
+    #end _charger
+
+    def __len__(self):
+        return len(self._cles)
+    #end __len__
+
+    def lookup(self, empreintes):
+        """
+        cherche des empreintes dans le cache
+        Args:
+            empreintes: np.ndarray |S16 (m,)
+        Returns:
+            tuple:(masque bool (m,) des empreintes trouvées, vecteurs (trouvées, dim) dans l'ordre)
+        """
+        empreintes = np.asarray(empreintes, dtype=f"S{TAILLE_EMPREINTE}")
+        if len(self._cles_triees) == 0:
+            return np.zeros(len(empreintes), dtype=bool), np.empty((0, self.dim or 0), dtype=np.float32)
+        #end if
+        pos = np.minimum(np.searchsorted(self._cles_triees, empreintes), len(self._cles_triees) - 1)
+        trouve = self._cles_triees[pos] == empreintes
+        positions = self._ordre[pos[trouve]] # positions globales (fragments dans l'ordre)
+
+        vecteurs = np.empty((len(positions), self.dim), dtype=np.float32)
+        fragment = np.searchsorted(self._debuts, positions, side="right") - 1
+        for f in np.unique(fragment):
+            lignes = fragment == f
+            vecteurs[lignes] = self._fragments[f][positions[lignes] - self._debuts[f]]
+        #end for
+        return trouve, vecteurs
+    #end lookup
+
+    def add(self, empreintes, vecteurs):
+        """
+        ajoute des vecteurs (nouveau fragment, empreintes déjà présentes ignorées)
+        Returns:
+            int: nombre de vecteurs ajoutés
+        """
+        try:
+            empreintes = np.asarray(empreintes, dtype=f"S{TAILLE_EMPREINTE}")
+            vecteurs = np.ascontiguousarray(vecteurs, dtype=np.float32)
+            if len(empreintes) != len(vecteurs):
+                raise ValueError("Nombre de vecteurs diff d'empreintes(incompatible)")
+            #end if
+            if self.dim is not None and vecteurs.shape[1] != self.dim:
+                raise ValueError(f"dimension {vecteurs.shape[1]} différente du cache ({self.dim})")
+            #end if
+            # nouvelles empreintes uniquement (une seule fois chacune)
+            empreintes, premiers = np.unique(empreintes, return_index=True)
+            vecteurs = vecteurs[premiers]
+            nouveaux = ~self.lookup(empreintes)[0] if len(self) > 0 else np.ones(len(empreintes), dtype=bool)
+            empreintes, vecteurs = empreintes[nouveaux], vecteurs[nouveaux]
+            if len(empreintes) == 0:
+                return 0
+            #end if
+
+            self.dossier.mkdir(parents=True, exist_ok=True)
+            if self.dim is None:
+                self.dim = int(vecteurs.shape[1])
+                (self.dossier / "model.json").write_text(json.dumps({'model_key': self.model_key, 'dim': self.dim}))
+            #end if
+            fragments = sorted(self.dossier.glob("*.keys.npy"))
+            numero = int(fragments[-1].name.split(".")[0]) + 1 if fragments else 1
+            save_npy(self.dossier / f"{numero:06d}.vecs.npy", vecteurs) # vecteurs d'abord
+            save_npy(self.dossier / f"{numero:06d}.keys.npy", empreintes) # le fragment devient visible
+            self._charger()
+            if len(self._fragments) > FRAGMENTS_MAX:
+                self.compact()
+            #end if
+            return len(empreintes)
+        except Exception as ex:
+            logger.error(f"erreur ajout au cache des vecteurs {self.dossier}: {ex}")
+            raise
+    #end add
+
+    def compact(self):
+        """fusionne tous les fragments en un seul"""
+        if len(self._fragments) <= 1:
+            return
+        #end if
+        cles = sorted(self.dossier.glob("*.keys.npy"))
+        anciens = cles + sorted(self.dossier.glob("*.vecs.npy"))
+        _, vecteurs = self.lookup(self._cles_triees)
+        numero = int(cles[-1].name.split(".")[0]) + 1
+        save_npy(self.dossier / f"{numero:06d}.vecs.npy", vecteurs)
+        save_npy(self.dossier / f"{numero:06d}.keys.npy", self._cles_triees)
+        for path in anciens:
+            path.unlink(missing_ok=True)
+        #end for
+        self._charger()
+        logger.info(f"cache des vecteurs compacté: {len(self)} vecteurs ({self.dossier})")
+    #end compact
+#end EmbeddingCache
@@ -0,0 +1,172 @@
+"""
+Ici, on gère l'encodage des critiques sur plusieurs processus (ingestion sur tous les coeurs)
+
+Expl: un seul model.encode n'occupe bien qu'un ou deux coeurs (le parallélisme interne de
+    torch passe mal à l'échelle pour un petit modèle comme MiniLM). Le pool lance N
+    processus, chacun avec sa propre instance du modèle et un nombre de threads torch fixé
+    (threads_par_worker, 1 par defaut: N workers x 1 thread = N coeurs sans sur-réservation).
+    - les textes sont découpés en tranches de taille_tranche, envoyées aux workers;
+    - au plus 2 x N tranches sont en cours: la mémoire reste bornée meme pour un gros corpus;
+    - les vecteurs reviennent tranche par tranche dans l'ordre des textes (iter_encode),
+      encode les concatène.
+    Démarrage "spawn": chaque worker charge le modèle une fois (quelques secondes), le pool
+    est gardé d'un appel à l'autre jusqu'à close().
+
+Auteur: Jo Kabonga
+Date: 18/10/2026
+"""
+
+import logging
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import numpy as np
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+logger = logging.getLogger(__name__)
+
+TAILLE_TRANCHE_DEFAUT = 256 # textes par tache envoyée à un worker
+TACHES_PAR_WORKER = 2 # tranches en cours par worker (une calcule, une attend)
+
+_embedding_worker = None # instance d'Embedding du processus worker
+
+def physical_cores():
+    """
+    nombre de coeurs physiques utilisables par le processus (hyperthreads comptés une fois)
+    Returns:
+        int
+    """
+    try:
+        cpus = os.sched_getaffinity(0)
+    except AttributeError:
+        cpus = range(os.cpu_count() or 1) # pas d'affinité (macOS, windows)
+    #end try
+    coeurs = set()
+    for cpu in cpus:
+        topologie = Path(f"/sys/devices/system/cpu/cpu{cpu}/topology")
+        try:
+            coeurs.add(((topologie / "physical_package_id").read_text().strip(), (topologie / "core_id").read_text().strip()))
+        except OSError:
+            coeurs.add(("", str(cpu))) # topologie inconnue: un cpu = un coeur
+        #end try
+    #end for
+    return max(1, len(coeurs))
+#end physical_cores
+
+def _init_worker(model_name, backend, token_budget, chunking, threads):
+    """initialisation d'un worker: threads torch fixés puis chargement du modèle"""
+    global _embedding_worker
+    import torch
+    torch.set_num_threads(threads)
+    logging.getLogger().setLevel(logging.WARNING) # pas de log par tranche
+    try:
+        from .embedding import Embedding
+    except ImportError:
+        from embedding import Embedding # execution directe du module
+    _embedding_worker = Embedding(model_name, backend=backend, token_budget=token_budget, chunking=chunking)
+#end _init_worker
+
+def _encoder_tranche(texts, batch_size):
+    """vecteurs d'une tranche de textes (dans un worker)"""
+    return _embedding_worker.embeddings_generer(texts, batch_size=batch_size, show_progress=False)
+#end _encoder_tranche
+
+class EmbeddingPool:
+    """
+    Pool de processus d'encodage, chacun avec son modèle
+    """
+
+    def __init__(self, model_name, workers=None, threads_per_worker=1, backend="torch",
+                 token_budget=None, chunking=False, taille_tranche=TAILLE_TRANCHE_DEFAUT):
+        """
+        Args:
+            model_name: nom ou dossier du modèle sentence-transformers
+            workers: nombre de processus (None -> nombre de coeurs physiques)
+            threads_per_worker: threads torch par processus
+            backend, token_budget, chunking: options d'Embedding de chaque worker
+            taille_tranche: textes par tache
+        """
+        self.workers = workers or physical_cores()
+        self.threads_per_worker = threads_per_worker
+        self.taille_tranche = taille_tranche
+        self._args = (model_name, backend, token_budget, chunking, threads_per_worker)
+        self._executor = None
+    #end __init__
+
+    def _pool(self):
+        """pool démarré au premier encodage"""
+        if self._executor is None:
+            logger.info(f"démarrage du pool d'encodage: {self.workers} processus x {self.threads_per_worker} thread(s)")
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                                 initializer=_init_worker, initargs=self._args)
+        #end if
+        return self._executor
+    #end _pool
+
+    def iter_encode(self, texts, batch_size=32):
+        """
+        vecteurs par tranche, dans l'ordre des textes
+        Args:
+            texts: textes à encoder
+            batch_size: taille des lots dans chaque worker
+        Returns:
+            générateur de tuples (position du premier texte, np.ndarray float32 (taille tranche, dim))
+        """
+        executor = self._pool()
+        en_cours = deque()
+        debuts = iter(range(0, len(texts), self.taille_tranche))
+        try:
+            for debut in debuts:
+                en_cours.append((debut, executor.submit(_encoder_tranche, list(texts[debut:debut + self.taille_tranche]), batch_size)))
+                if len(en_cours) >= self.workers * TACHES_PAR_WORKER:
+                    premier, future = en_cours.popleft()
+                    yield premier, future.result() # la plus ancienne tranche: l'ordre est gardé
+                #end if
+            #end for
+            while en_cours:
+                premier, future = en_cours.popleft()
+                yield premier, future.result()
+            #end while
+        finally:
+            for _, future in en_cours:
+                future.cancel() # générateur abandonné ou erreur: on n'encode pas la suite
+            #end for
+        #end try
+    #end iter_encode
+
+    def encode(self, texts, batch_size=32):
+        """
+        vecteurs normalisés de tous les textes
+        Returns:
+            np.ndarray float32 (n, dim)
+        """
+        try:
+            tranches = [vecteurs for _, vecteurs in self.iter_encode(texts, batch_size=batch_size)]
+            return np.concatenate(tranches) if tranches else np.empty((0, 0), dtype=np.float32)
+        except Exception as ex:
+            logger.error(f"erreur de l'encodage multi-processus: {ex}")
+            raise
+    #end encode
+
+    def close(self):
+        """arrete les workers"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        #end if
+    #end close
+
+    def __enter__(self):
+        return self
+    #end __enter__
+
+    def __exit__(self, *exc):
+        self.close()
+    #end __exit__
+#end EmbeddingPool
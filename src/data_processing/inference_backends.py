@@ -0,0 +1,174 @@
+"""
+Ici, on gère les backends d'inférence du modèle d'embedding et la mesure de leur dérive
+
+Backends (Embedding(backend=...)):
+    - "torch" : SentenceTransformer float32 (reference)
+    - "int8"  : quantification dynamique int8 des couches linéaires (torch, poids quantifiés
+                une fois au chargement, activations quantifiées à la volée)
+    - "bf16"  : calcul en bfloat16 (torch.autocast), rapide sur les CPU avec AVX512-BF16 / AMX
+
+Expl: le ré-encodage de tout l'historique des critiques est dominé par les produits
+    matriciels du transformer. Un backend réduit la précision de ces calculs; la dérive
+    est mesurée sur un échantillon mis de coté (cosinus entre les vecteurs float32 et ceux
+    du backend, et accord des top-k voisins dans l'échantillon) avant de l'adopter.
+
+Usage: python src/data_processing/inference_backends.py --backend bf16 --csv data/processed/fightclub_cleaned.csv
+
+Auteur: Jo Kabonga
+Date: 18/10/2026
+"""
+
+import argparse
+import logging
+import time
+from contextlib import contextmanager, nullcontext
+import numpy as np
+import pandas as pd
+import torch
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("torch", "int8", "bf16")
+
+def prepare_model(model, backend):
+    """
+    adapte un SentenceTransformer chargé au backend
+    Returns:
+        le modèle à utiliser pour encoder (quantifié pour int8)
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"backend inconnu: {backend} (choix: {BACKENDS})")
+    #end if
+    if backend == "int8":
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    #end if
+    if backend == "bf16" and not torch.backends.mkldnn.is_available():
+        logger.warning("bf16 sans oneDNN: calcul lent sur ce CPU, préférer 'torch' ou 'int8'")
+    #end if
+    return model
+#end prepare_model
+
+@contextmanager
+def inference_context(backend):
+    """contexte des appels directs au modèle: sans gradient, bfloat16 pour le backend bf16"""
+    autocast = torch.autocast("cpu", dtype=torch.bfloat16) if backend == "bf16" else nullcontext()
+    with torch.inference_mode(), autocast:
+        yield
+    #end with
+#end inference_context
+
+def encode(model, backend, texts, batch_size=32, show_progress=False):
+    """
+    vecteurs normalisés des textes avec le backend
+    Returns:
+        np.ndarray float32 (n, dim)
+    """
+    if backend == "bf16":
+        with inference_context(backend):
+            embeddings = model.encode(texts, batch_size=batch_size, show_progress_bar=show_progress,
+                                      convert_to_tensor=True, normalize_embeddings=True)
+        #end with
+        return embeddings.float().cpu().numpy() # numpy ne connait pas bfloat16
+    #end if
+    embeddings = model.encode(texts, batch_size=batch_size, show_progress_bar=show_progress,
+                              convert_to_tensor=False, normalize_embeddings=True)
+    return np.asarray(embeddings, dtype=np.float32)
+#end encode
+
+def drift_report(reference, candidat, k=10):
+    """
+    dérive des vecteurs d'un backend par rapport à la reference float32 (memes textes, meme ordre)
+    Args:
+        reference: vecteurs normalisés float32 (n, dim)
+        candidat: vecteurs normalisés du backend (n, dim)
+        k: nombre de voisins comparés
+    Returns:
+        dict: {'n', 'cosinus_moyen', 'cosinus_min', 'cosinus_p01', 'accord_topk', 'k'}
+            accord_topk: part moyenne des k voisins (dans l'échantillon, hors soi) retrouvés
+    """
+    reference = np.asarray(reference, dtype=np.float32)
+    candidat = np.asarray(candidat, dtype=np.float32)
+    if reference.shape != candidat.shape:
+        raise ValueError(f"formes différentes: {reference.shape} vs {candidat.shape}")
+    #end if
+    n = len(reference)
+    k = min(k, n - 1)
+    cosinus = np.einsum("ij,ij->i", reference, candidat)
+
+    accord = float("nan")
+    if k > 0:
+        def voisins(vecteurs):
+            scores = vecteurs @ vecteurs.T
+            np.fill_diagonal(scores, -np.inf) # hors soi
+            return np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        #end voisins
+        voisins_ref, voisins_cand = voisins(reference), voisins(candidat)
+        communs = [len(np.intersect1d(a, b, assume_unique=True)) for a, b in zip(voisins_ref, voisins_cand)]
+        accord = float(np.mean(communs)) / k
+    #end if
+    return {
+        'n': n,
+        'cosinus_moyen': float(cosinus.mean()),
+        'cosinus_min': float(cosinus.min()),
+        'cosinus_p01': float(np.percentile(cosinus, 1)),
+        'accord_topk': accord,
+        'k': k
+    }
+#end drift_report
+
+def compare_backends(reference, candidat, texts, k=10, batch_size=32):
+    """
+    débit et dérive d'un backend candidat par rapport à la reference sur un échantillon
+    Args:
+        reference, candidat: instances d'Embedding (backend "torch" et backend évalué)
+        texts: échantillon mis de coté (textes des critiques)
+    Returns:
+        dict: rapport de dérive + 'debit_reference', 'debit', 'acceleration' (textes/s)
+    """
+    resultats = {}
+    for nom, embedding in (("reference", reference), ("candidat", candidat)):
+        embedding.embeddings_generer(texts[:batch_size], batch_size=batch_size, show_progress=False) # échauffement
+        debut = time.perf_counter()
+        vecteurs = embedding.embeddings_generer(texts, batch_size=batch_size, show_progress=False)
+        resultats[nom] = (vecteurs, len(texts) / (time.perf_counter() - debut))
+    #end for
+    rapport = drift_report(resultats["reference"][0], resultats["candidat"][0], k=k)
+    rapport['debit_reference'] = resultats["reference"][1]
+    rapport['debit'] = resultats["candidat"][1]
+    rapport['acceleration'] = rapport['debit'] / rapport['debit_reference']
+    return rapport
+#end compare_backends
+
+def main():
+    """rapport de dérive et de débit d'un backend sur un échantillon de critiques"""
+    try:
+        from embedding import Embedding
+
+        parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+        parser.add_argument("--model", default="all-MiniLM-L6-v2")
+        parser.add_argument("--backend", default="int8", choices=BACKENDS)
+        parser.add_argument("--csv", default="data/processed/fightclub_cleaned.csv", help="critiques nettoyées (review_content)")
+        parser.add_argument("--echantillon", type=int, default=500)
+        parser.add_argument("--k", type=int, default=10)
+        parser.add_argument("--seed", type=int, default=0)
+        args = parser.parse_args()
+
+        textes = pd.read_csv(args.csv, usecols=['review_content'])['review_content'].dropna().astype(str)
+        textes = textes.sample(n=min(args.echantillon, len(textes)), random_state=args.seed).tolist()
+        rapport = compare_backends(Embedding(args.model), Embedding(args.model, backend=args.backend), textes, k=args.k)
+        for cle, valeur in rapport.items():
+            print(f"{cle:>16}: {valeur:.4f}" if isinstance(valeur, float) else f"{cle:>16}: {valeur}")
+        #end for
+        return rapport
+    except Exception as ex:
+        logger.error(f"erreur comparaison des backends: {ex}")
+        raise
+#end main
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Ici, on gère l'encodage par lots à budget de tokens et le découpage des critiques longues
+
+Expl: les critiques vont d'une ligne à plusieurs milliers de mots. Avec des lots de 32
+    textes, un lot de critiques courtes fait 32 petits appels coûteux en frais fixes et
+    tout ce qui dépasse la longueur max du modèle (256 tokens pour MiniLM) est tronqué
+    sans le dire.
+    - les textes sont tokenisés une fois, triés par longueur, puis groupés en lots dont
+      la taille avec padding (nombre de textes x longueur du plus long) reste sous
+      token_budget: beaucoup de textes courts par lot, peu de textes longs;
+    - option chunking: une critique trop longue est découpée en fenetres de tokens qui se
+      chevauchent, chaque fenetre est encodée comme un texte, puis les vecteurs des
+      fenetres sont moyennés (pondérés par leur nombre de tokens) en un vecteur par critique;
+    - les vecteurs sont rendus dans l'ordre d'origine des textes.
+
+Auteur: Jo Kabonga
+Date: 18/10/2026
+"""
+
+import logging
+import numpy as np
+import torch
+
+try:
+    from .inference_backends import inference_context
+except ImportError:
+    from inference_backends import inference_context # execution directe du module
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+logger = logging.getLogger(__name__)
+
+BUDGET_TOKENS_DEFAUT = 8192 # tokens par lot, padding compris
+TAILLE_LOT_MAX = 256 # textes par lot
+CHEVAUCHEMENT_DEFAUT = 32 # tokens communs entre deux fenetres consécutives
+ECART_MAX_DEFAUT = 0.2 # un lot s'arrete au premier texte plus court de 20% que le plus long (padding borné)
+
+def split_windows(ids, longueur, chevauchement=CHEVAUCHEMENT_DEFAUT):
+    """
+    fenetres de tokens qui se chevauchent couvrant toute la séquence
+    Args:
+        ids: tokens du texte (sans tokens spéciaux)
+        longueur: taille max d'une fenetre
+        chevauchement: tokens communs entre deux fenetres consécutives
+    Returns:
+        list: fenetres (listes de tokens)
+    """
+    if len(ids) <= longueur:
+        return [ids]
+    #end if
+    pas = max(1, longueur - chevauchement)
+    fenetres = []
+    for debut in range(0, len(ids), pas):
+        fenetres.append(ids[debut:debut + longueur])
+        if debut + longueur >= len(ids):
+            break
+        #end if
+    #end for
+    return fenetres
+#end split_windows
+
+def token_budget_batches(longueurs, token_budget=BUDGET_TOKENS_DEFAUT, max_batch=TAILLE_LOT_MAX, ecart_max=ECART_MAX_DEFAUT):
+    """
+    lots de positions triées par longueur décroissante, taille avec padding <= token_budget
+    Args:
+        longueurs: nombre de tokens de chaque séquence
+        token_budget: nombre max de tokens par lot (textes x plus longue séquence du lot)
+        max_batch: nombre max de séquences par lot
+        ecart_max: écart relatif max de longueur avec le plus long du lot (None -> pas de limite)
+    Returns:
+        list: tableaux de positions (un par lot)
+    """
+    longueurs = np.asarray(longueurs, dtype=np.int64)
+    ordre = np.argsort(-longueurs, kind="stable")
+    triees = -longueurs[ordre] # croissant, pour searchsorted
+    lots = []
+    debut = 0
+    while debut < len(ordre):
+        plus_long = max(int(longueurs[ordre[debut]]), 1) # premier du lot = le plus long
+        fin = debut + max(1, min(max_batch, token_budget // plus_long))
+        if ecart_max is not None:
+            # premier texte trop court par rapport au plus long: le lot s'arrete avant
+            fin = min(fin, max(debut + 1, int(np.searchsorted(triees, -plus_long * (1.0 - ecart_max), side="right"))))
+        #end if
+        lots.append(ordre[debut:fin])
+        debut = fin
+    #end while
+    return lots
+#end token_budget_batches
+
+def encode_bucketed(model, backend, texts, token_budget=BUDGET_TOKENS_DEFAUT, max_batch=TAILLE_LOT_MAX,
+                    chunking=False, chevauchement=CHEVAUCHEMENT_DEFAUT, stats=None):
+    """
+    vecteurs normalisés des textes par lots à budget de tokens (ordre d'origine)
+    Args:
+        model: SentenceTransformer (éventuellement quantifié, voir inference_backends.py)
+        backend: backend d'inférence
+        texts: textes à encoder
+        token_budget: tokens max par lot (padding compris)
+        max_batch: textes max par lot
+        chunking: True -> critiques longues découpées en fenetres puis moyennées, sinon tronquées
+        chevauchement: tokens communs entre deux fenetres
+        stats: dict optionnel complété avec 'tokens' (utiles), 'tokens_padding', 'lots', 'fenetres', 'tronques'
+    Returns:
+        np.ndarray float32 (n, dim)
+    """
+    tokenizer = model.tokenizer
+    longueur_max = model.max_seq_length - tokenizer.num_special_tokens_to_add() # place des [CLS] / [SEP]
+    ids = tokenizer(list(texts), add_special_tokens=False, truncation=False, verbose=False)['input_ids']
+
+    # séquences à encoder: une par texte (tronquée) ou une par fenetre
+    sequences, proprietaires = [], []
+    tronques = 0
+    for i, tokens in enumerate(ids):
+        if chunking:
+            fenetres = split_windows(tokens, longueur_max, chevauchement)
+        else:
+            tronques += len(tokens) > longueur_max
+            fenetres = [tokens[:longueur_max]]
+        #end if
+        for fenetre in fenetres:
+            sequences.append(tokenizer.build_inputs_with_special_tokens(fenetre))
+            proprietaires.append(i)
+        #end for
+    #end for
+    proprietaires = np.asarray(proprietaires, dtype=np.int64)
+    longueurs = np.array([len(sequence) for sequence in sequences], dtype=np.int64)
+
+    vecteurs = None
+    lots = token_budget_batches(longueurs, token_budget, max_batch)
+    padding = 0
+    with inference_context(backend):
+        for lot in lots:
+            largeur = int(longueurs[lot].max())
+            input_ids = torch.full((len(lot), largeur), tokenizer.pad_token_id, dtype=torch.long)
+            attention_mask = torch.zeros((len(lot), largeur), dtype=torch.long)
+            for ligne, position in enumerate(lot):
+                input_ids[ligne, :longueurs[position]] = torch.as_tensor(sequences[position])
+                attention_mask[ligne, :longueurs[position]] = 1
+            #end for
+            features = {'input_ids': input_ids, 'attention_mask': attention_mask,
+                        'token_type_ids': torch.zeros_like(input_ids)}
+            sortie = model(features)['sentence_embedding'].float().cpu().numpy()
+            if vecteurs is None:
+                vecteurs = np.empty((len(sequences), sortie.shape[1]), dtype=np.float32)
+            #end if
+            vecteurs[lot] = sortie
+            padding += len(lot) * largeur - int(longueurs[lot].sum())
+        #end for
+    #end with
+
+    # un vecteur par texte: moyenne des fenetres pondérée par leurs tokens, puis normalisation
+    poids = longueurs.astype(np.float32)[:, None]
+    embeddings = np.zeros((len(ids), vecteurs.shape[1]), dtype=np.float32)
+    np.add.at(embeddings, proprietaires, vecteurs * poids)
+    embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+
+    if stats is not None:
+        stats.update({'tokens': int(longueurs.sum()), 'tokens_padding': padding, 'lots': len(lots),
+                      'fenetres': len(sequences), 'tronques': tronques})
+    #end if
+    if tronques > 0:
+        logger.info(f"{tronques} textes tronqués à {longueur_max} tokens (chunking désactivé)")
+    #end if
+    return embeddings
+#end encode_bucketed
@@ -0,0 +1,208 @@
+"""
+Ici, on gère le regroupement des encodages de requetes en lots (micro-batching)
+
+Expl: un appel au modèle par requete HTTP passe l'essentiel du temps CPU en frais fixes
+    (tokenisation, lancement des noyaux torch) sur des lots de 1. Les requetes concurrentes
+    sont mises dans une file, un thread de fond forme un lot et le lance quand il atteint
+    max_batch textes ou quand le plus ancien attend depuis max_wait secondes, puis donne
+    à chaque appelant son vecteur (Future). Appelable depuis des threads (encode) ou
+    depuis asyncio (encode_async) sans bloquer la boucle d'évènements.
+
+Auteur: Jo Kabonga
+Date: 18/10/2026
+"""
+
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+logger = logging.getLogger(__name__)
+
+TAILLE_LOT_DEFAUT = 32
+ATTENTE_MAX_DEFAUT = 0.005 # secondes
+
+class MicroBatcher:
+    """
+    File d'encodage: lots formés sur taille max ou attente max, un Future par texte
+    """
+
+    def __init__(self, encode_lot, max_batch=TAILLE_LOT_DEFAUT, max_wait=ATTENTE_MAX_DEFAUT, nom="micro-batch"):
+        """
+        Args:
+            encode_lot: fonction liste de textes -> matrice (n, dim) des vecteurs
+            max_batch: taille max d'un lot
+            max_wait: attente max (secondes) du plus ancien texte avant de lancer un lot incomplet
+            nom: nom du thread de fond
+        """
+        if max_batch < 1:
+            raise ValueError(f"max_batch doit etre >= 1, reçu {max_batch}")
+        #end if
+        self._encode_lot = encode_lot
+        self.max_batch = int(max_batch)
+        self.max_wait = float(max_wait)
+        self._nom = nom
+        self._file = queue.Queue()
+        self._thread = None
+        self._verrou = threading.Lock()
+        self._ferme = False
+        self.compteurs = {'textes': 0, 'lots': 0, 'erreurs': 0, 'taille_max': 0, 'attente_totale': 0.0, 'inference_totale': 0.0}
+        self.tailles_lots = {} # {taille: nombre de lots}
+    #end __init__
+
+    def submit(self, texte):
+        """
+        ajoute un texte à la file (thread de fond démarré au premier texte)
+        Expl: dépot sous le meme verrou que close(): aucun texte ne peut arriver derrière la sentinelle d'arret
+        Returns:
+            concurrent.futures.Future du vecteur (dim,)
+        """
+        futur = Future()
+        with self._verrou:
+            if self._ferme:
+                raise RuntimeError("MicroBatcher fermé")
+            #end if
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._boucle, daemon=True, name=self._nom)
+                self._thread.start()
+            #end if
+            self._file.put((texte, futur, time.monotonic()))
+        #end with
+        return futur
+    #end submit
+
+    def encode(self, texte, timeout=None):
+        """vecteur d'un texte (appelant threadé, bloque jusqu'au traitement de son lot)"""
+        return self.submit(texte).result(timeout)
+    #end encode
+
+    async def encode_async(self, texte):
+        """vecteur d'un texte (appelant asyncio, la boucle n'est pas bloquée)"""
+        return await asyncio.wrap_future(self.submit(texte))
+    #end encode_async
+
+    def _boucle(self):
+        """forme les lots: le premier texte ouvre la fenetre d'attente, max_batch ou max_wait la ferme"""
+        while True:
+            element = self._file.get()
+            if element is None:
+                return
+            #end if
+            lot = [element]
+            limite = element[2] + self.max_wait
+            arret = False
+            while len(lot) < self.max_batch:
+                try:
+                    element = self._file.get(timeout=max(0.0, limite - time.monotonic()))
+                except queue.Empty:
+                    break
+                #end try
+                if element is None:
+                    arret = True
+                    break
+                #end if
+                lot.append(element)
+            #end while
+            try:
+                self._traiter(lot)
+            except Exception as ex: # un lot en erreur ne doit pas arreter le thread (appelants suivants bloqués)
+                logger.error(f"erreur traitement d'un lot: {ex}")
+            #end try
+            if arret:
+                return
+            #end if
+        #end while
+    #end _boucle
+
+    def _traiter(self, lot):
+        """encode un lot et résout les Futures de ses appelants"""
+        lot = [(texte, futur, depose) for texte, futur, depose in lot if futur.set_running_or_notify_cancel()]
+        if not lot:
+            return
+        #end if
+        debut = time.monotonic()
+        try:
+            vecteurs = np.asarray(self._encode_lot([texte for texte, _, _ in lot]), dtype=np.float32)
+            if vecteurs.ndim != 2 or len(vecteurs) != len(lot):
+                raise ValueError(f"encode_lot a rendu {vecteurs.shape} pour {len(lot)} textes")
+            #end if
+            fin = time.monotonic()
+
+            self.compteurs['textes'] += len(lot)
+            self.compteurs['lots'] += 1
+            self.compteurs['taille_max'] = max(self.compteurs['taille_max'], len(lot))
+            self.compteurs['attente_totale'] += sum(debut - depose for _, _, depose in lot)
+            self.compteurs['inference_totale'] += fin - debut
+            self.tailles_lots[len(lot)] = self.tailles_lots.get(len(lot), 0) + 1
+            for i, (_, futur, _) in enumerate(lot):
+                futur.set_result(vecteurs[i])
+            #end for
+        except Exception as ex:
+            logger.error(f"erreur encodage d'un lot de {len(lot)} textes: {ex}")
+            self.compteurs['erreurs'] += 1
+            for _, futur, _ in lot:
+                if not futur.done(): # aucun appelant ne reste bloqué
+                    futur.set_exception(ex)
+                #end if
+            #end for
+        #end try
+    #end _traiter
+
+    def close(self, timeout=5.0):
+        """arrete le thread de fond apres les textes déjà en file, les textes restants (thread arreté avant) sont rejetés"""
+        with self._verrou:
+            if self._ferme:
+                return
+            #end if
+            self._ferme = True
+            thread = self._thread
+            if thread is not None:
+                self._file.put(None)
+            #end if
+        #end with
+        if thread is None:
+            return
+        #end if
+        thread.join(timeout)
+        while True:
+            try:
+                element = self._file.get_nowait()
+            except queue.Empty:
+                break
+            #end try
+            if element is not None and element[1].set_running_or_notify_cancel():
+                element[1].set_exception(RuntimeError("MicroBatcher fermé"))
+            #end if
+        #end while
+        if thread.is_alive():
+            self._file.put(None) # sentinelle retirée avec les textes: le thread s'arrete apres son lot en cours
+        #end if
+    #end close
+
+    def stats(self):
+        """profondeur de la file, nombre et taille des lots, attente et inférence moyennes"""
+        lots, textes = self.compteurs['lots'], self.compteurs['textes']
+        return {
+            'file': self._file.qsize(),
+            'textes': textes,
+            'lots': lots,
+            'erreurs': self.compteurs['erreurs'],
+            'taille_moyenne': textes / lots if lots else 0.0,
+            'taille_max': self.compteurs['taille_max'],
+            'tailles_lots': dict(sorted(self.tailles_lots.items())),
+            'attente_moyenne_ms': self.compteurs['attente_totale'] / textes * 1e3 if textes else 0.0,
+            'inference_moyenne_ms': self.compteurs['inference_totale'] / lots * 1e3 if lots else 0.0,
+            'max_batch': self.max_batch,
+            'max_wait_ms': self.max_wait * 1e3
+        }
+    #end stats
+#end MicroBatcher
@@ -0,0 +1,57 @@
+"""
+Ici, on gère la diversité des recommandations (re-classement MMR)
+
+Expl: le top-k brut contient souvent des critiques quasi identiques (copiées-collées,
+    modèles). La Maximal Marginal Relevance choisit les résultats un par un en maximisant
+        lambda * similarité_à_la_requete - (1 - lambda) * max(similarité aux critiques déjà choisies)
+    La matrice des similarités candidats x candidats est calculée en une fois (un produit
+    matriciel), chaque étape ne fait ensuite que des opérations vectorisées sur les candidats.
+
+Auteur: Jo Kabonga
+Date: 18/10/2026
+"""
+
+import numpy as np
+
+FACTEUR_CANDIDATS = 4 # candidats récupérés par résultat demandé
+CANDIDATS_MIN = 20
+
+def n_candidats(k):
+    """nombre de candidats à récupérer avant le re-classement pour k résultats"""
+    return max(k * FACTEUR_CANDIDATS, CANDIDATS_MIN)
+#end n_candidats
+
+def mmr_select(scores, vecteurs, k, mmr_lambda=0.7):
+    """
+    Sélection MMR de k candidats
+    Args:
+        scores: similarités des candidats à la critique de reference (c,)
+        vecteurs: vecteurs normalisés des candidats (c, dim)
+        k: nombre de résultats
+        mmr_lambda: 1 -> pertinence seule (ordre des scores), 0 -> diversité seule
+    Returns:
+        np.ndarray: positions des candidats choisis, dans l'ordre de sélection
+    """
+    scores = np.asarray(scores, dtype=np.float32)
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    #end if
+    vecteurs = np.asarray(vecteurs, dtype=np.float32)
+    similarites = vecteurs @ vecteurs.T # (c, c) en une fois
+
+    choisis = np.empty(k, dtype=np.int64)
+    disponible = np.ones(len(scores), dtype=bool)
+    max_sim = np.full(len(scores), -np.inf, dtype=np.float32) # similarité max aux choisis
+    for etape in range(k):
+        # premiere étape: pas encore de choisis, seule la pertinence compte
+        penalite = np.where(np.isinf(max_sim), 0.0, max_sim)
+        valeurs = mmr_lambda * scores - (1.0 - mmr_lambda) * penalite
+        valeurs[~disponible] = -np.inf
+        choix = int(np.argmax(valeurs))
+        choisis[etape] = choix
+        disponible[choix] = False
+        np.maximum(max_sim, similarites[choix], out=max_sim)
+    #end for
+    return choisis
+#end mmr_select
@@ -0,0 +1,150 @@
+"""
+Ici, on gère l'encodage des requetes texte libre (recherche "critiques comme ce texte")
+
+Expl: le modèle (classe Embedding) n'est chargé qu'à la premiere requete, une seule fois
+    meme si plusieurs requetes arrivent en meme temps. Les vecteurs des requetes sont gardés
+    dans un cache LRU (ResultCache sans expiration) avec comme clé le texte normalisé
+    (espaces regroupés, minuscules: le modèle par defaut ne distingue pas la casse),
+    les requetes répétées ou populaires (recherche pendant la frappe) évitent l'inférence.
+    La normalisation ne sert qu'à la clé: le modèle encode le texte d'origine.
+    Les requetes absentes du cache passent par un MicroBatcher (voir batch_scheduler.py):
+    les requetes concurrentes sont encodées en un seul appel au modèle.
+
+Auteur: Jo Kabonga
+Date: 18/10/2026
+"""
+
+import logging
+import sys
+import threading
+import numpy as np
+from pathlib import Path
+
+try:
+    from .result_cache import ResultCache
+    from .batch_scheduler import MicroBatcher, TAILLE_LOT_DEFAUT, ATTENTE_MAX_DEFAUT
+except ImportError:
+    from result_cache import ResultCache # execution directe du module
+    from batch_scheduler import MicroBatcher, TAILLE_LOT_DEFAUT, ATTENTE_MAX_DEFAUT
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+logger = logging.getLogger(__name__)
+
+MODELE_DEFAUT = 'all-MiniLM-L6-v2' # meme modèle que les vecteurs des critiques
+TAILLE_CACHE_DEFAUT = 4096 # requetes
+LONGUEUR_MAX = 2000 # caractères
+
+def normalize_query(texte):
+    """texte de requete normalisé (clé du cache): espaces regroupés, minuscules"""
+    return " ".join(str(texte).split()).lower()
+#end normalize_query
+
+def _charger_embedding(model_name, backend="torch"):
+    """charge la classe Embedding (sentence-transformers importé seulement ici)"""
+    sys.path.append(str(Path(__file__).parent.parent))
+    from data_processing.embedding import Embedding
+    return Embedding(model_name, backend=backend)
+#end _charger_embedding
+
+class QueryEncoder:
+    """
+    Encodeur de requetes texte: modèle chargé à la demande + cache LRU des vecteurs
+    """
+
+    def __init__(self, model_name=MODELE_DEFAUT, max_entries=TAILLE_CACHE_DEFAUT, fabrique=None,
+                 max_batch=TAILLE_LOT_DEFAUT, max_wait=ATTENTE_MAX_DEFAUT, backend="torch"):
+        """
+        Args:
+            model_name: modèle sentence-transformers (celui des vecteurs du film)
+            max_entries: nombre de vecteurs de requetes gardés (0 -> pas de cache)
+            max_batch: taille max des lots d'inférence (1 -> un appel au modèle par requete, sans file)
+            max_wait: attente max (secondes) avant de lancer un lot incomplet
+            backend: backend d'inférence de Embedding (torch, int8, bf16)
+            fabrique: fonction sans argument qui crée l'encodeur (méthode embeddings_generer),
+                par defaut Embedding(model_name) (remplaçable pour les tests)
+        """
+        self.model_name = model_name
+        self._fabrique = fabrique or (lambda: _charger_embedding(model_name, backend))
+        self._embedding = None
+        self._verrou = threading.Lock()
+        self.cache = ResultCache(max_entries=max_entries, ttl=None, max_bytes=None)
+        self.batcher = None
+        if max_batch > 1:
+            self.batcher = MicroBatcher(self._encoder_lot, max_batch=max_batch, max_wait=max_wait, nom="requetes-batch")
+        #end if
+    #end __init__
+
+    @property
+    def charge(self):
+        """le modèle est-il chargé"""
+        return self._embedding is not None
+    #end charge
+
+    def _modele(self):
+        """modèle chargé une seule fois (premier appel), partagé entre les threads"""
+        if self._embedding is None:
+            with self._verrou:
+                if self._embedding is None:
+                    logger.info(f"chargement du modèle des requetes: {self.model_name}")
+                    self._embedding = self._fabrique()
+                #end if
+            #end with
+        #end if
+        return self._embedding
+    #end _modele
+
+    def encode(self, texte):
+        """
+        vecteur normalisé d'un texte libre (cache LRU par texte normalisé, texte d'origine encodé)
+        Args:
+            texte: texte de la requete
+        Returns:
+            np.ndarray float32 (dim,) en lecture seule (partagé entre les requetes)
+        """
+        requete = normalize_query(texte)
+        if not requete:
+            raise ValueError("requete vide")
+        #end if
+        if len(requete) > LONGUEUR_MAX:
+            raise ValueError(f"requete trop longue ({len(requete)} > {LONGUEUR_MAX} caractères)")
+        #end if
+        return self.cache.get_or_compute((self.model_name, requete), lambda: self._encoder(str(texte)))
+    #end encode
+
+    def _encoder(self, requete):
+        """inférence du modèle pour une requete (dans un lot partagé si le micro-batching est actif)"""
+        if self.batcher is not None:
+            vecteur = self.batcher.encode(requete)
+        else:
+            vecteur = self._encoder_lot([requete])[0]
+        #end if
+        vecteur = np.array(vecteur, dtype=np.float32) # copie: la ligne ne garde pas tout le lot en mémoire
+        vecteur.flags.writeable = False
+        return vecteur
+    #end _encoder
+
+    def _encoder_lot(self, requetes):
+        """inférence du modèle pour un lot de requetes"""
+        return self._modele().embeddings_generer(requetes, batch_size=len(requetes), show_progress=False)
+    #end _encoder_lot
+
+    def close(self):
+        """arrete le thread du micro-batching"""
+        if self.batcher is not None:
+            self.batcher.close()
+        #end if
+    #end close
+
+    def stats(self):
+        """compteurs du cache des requetes et état du modèle"""
+        stats = {**self.cache.stats(), 'modele': self.model_name, 'modele_charge': self.charge}
+        if self.batcher is not None:
+            stats['lots'] = self.batcher.stats()
+        #end if
+        return stats
+    #end stats
+#end QueryEncoder
@@ -5,12 +5,22 @@ Date: 1/11/2025
 
 """
 
+import numpy as np
 import pandas as pd
 import logging
 import sys
 from typing import Optional
 from pathlib import Path
 
+try:
+    from .result_cache import ResultCache
+    from .diversity import mmr_select, n_candidats
+    from .scoring import HybridScorer
+except ImportError:
+    from result_cache import ResultCache # execution directe du module
+    from diversity import mmr_select, n_candidats
+    from scoring import HybridScorer
+
 #Config du logging
 logging.basicConfig(
     level=logging.INFO,
@@ -28,14 +38,25 @@ class RecommanderEngine:
         - filtrer et formater les resultats
         - Et si le temps le permet , optimisation
     """
-    def __init__(self, vector_store):
+    def __init__(self, vector_store, result_cache=None, scorer=None, query_encoder=None):
         """
         Initialisation avec la class VectorStore
         Args:
             vector_store: Instance de VectoreStore (module 2)
+            result_cache: ResultCache des résultats de find_similar (None -> pas de cache),
+                ses entrées d'un film sont purgées quand l'instantané du film change
+            scorer: HybridScorer pour re-classer les candidats avec la popularité et la récence
+                (voir scoring.py), None -> cosinus seul
+            query_encoder: QueryEncoder pour la recherche par texte libre (voir query_encoder.py)
         """
         try:
             self.vector_store = vector_store
+            self.result_cache = result_cache
+            self.scorer = scorer if scorer is not None and scorer.actif else None
+            self.query_encoder = query_encoder
+            if result_cache is not None:
+                vector_store.add_reload_listener(lambda film_id, ancienne, nouvelle: result_cache.invalidate(film_id))
+            #end if
             logger.info("RecommenderEngine initialisé...")
         except Exception as ex:
             logger.error(f"erreur initialisation: {ex}")
@@ -54,23 +75,12 @@ class RecommanderEngine:
         try:
             #normaliser le nom du film
             film_id_normalizer = film_id.lower().strip()
-            film_data = self.vector_store.load_film(film_id)
-            dataF_metadata = film_data['metadata']
-
-            #conversion de l'ID en int
-            try:
-                critique_id_int = int(critque_id)
-            except ValueError:
-                logger.error(f"ID de la critique invalide: {critque_id}")
-                return None
-            
-            #recherche la critique par ID
-            masque = dataF_metadata['id'] == critique_id_int
-            if not masque.any():
-                logger.error(f"critique ID {critque_id} non trouvée pour le film {film_id}")
+
+            # recherche par l'index ID -> ligne construit au chargement du film (VectorStore)
+            index_trouver = self.vector_store.get_index_with_id(film_id_normalizer,critque_id)
+            if index_trouver is None:
                 return None
             #end if
-            index_trouver = dataF_metadata[masque].index[0]
             logger.info(f"critique {critque_id} -> index {index_trouver}")
             return index_trouver
         except Exception as ex:
@@ -81,7 +91,8 @@ class RecommanderEngine:
 
 
 
-    def find_similar(self, critique_id:str, film_id:str, k:int ,scores_sim_min:float =0.8) -> pd.DataFrame:
+    def find_similar(self, critique_id:str, film_id:str, k:int ,scores_sim_min:float =0.8, mmr_lambda:Optional[float] =None,
+                     filtres:Optional[dict] =None) -> pd.DataFrame:
         """
         Trouver les critiques similaires à une critique donnée
 
@@ -90,9 +101,14 @@ class RecommanderEngine:
             film_id: film dans lequel rechercher
             k: nombre de résultats max
             scores_sim_min: seuil min de similarité 
+            mmr_lambda: re-classement MMR pour diversifier les résultats (voir diversity.py),
+                1 -> pertinence seule, 0 -> diversité seule, None -> pas de re-classement
+            filtres: filtres sur les métadonnées (voir vector_store/filters.py: rating_min, date_min,
+                hits_min, ...), plus 'exclude_same_user' pour exclure l'auteur de la critique de ref
 
         Returns:
-            DataFrame des critiques similaires avec des scores de similarité (à revoir)
+            DataFrame des critiques similaires avec des scores de similarité (à revoir),
+            plus 'hybrid_score' si le moteur a un score hybride (ordre des résultats)
 
         """
         try:
@@ -106,19 +122,74 @@ class RecommanderEngine:
             #end if
 
 
-            # Trouver l'index de la critique de ref
-            index_ref = self._get_index_with_id(film_id_normalizer,critique_id)
-            if index_ref is None:
-                raise ValueError(f"critique {critique_id} inexistante pour le film {film_id}")
+            # meme instantané du film pour toute la requete (rechargement à chaud)
+            with self.vector_store.snapshot(film_id_normalizer):
+                filtres = self._resolve_filters(film_id_normalizer, critique_id, filtres)
+                if self.result_cache is None:
+                    return self._find_similar(critique_id, film_id_normalizer, k, scores_sim_min, mmr_lambda, filtres)
+                #end if
+                # clé avec la version de l'instantané épinglé: jamais de résultat d'une ancienne version
+                version = self.vector_store.load_film(film_id_normalizer)['version']
+                cle = (film_id_normalizer, version, str(critique_id), int(k), float(scores_sim_min),
+                       None if mmr_lambda is None else float(mmr_lambda),
+                       tuple(sorted((cle, str(valeur)) for cle, valeur in (filtres or {}).items())),
+                       None if self.scorer is None else self.scorer.cle())
+                resultat = self.result_cache.get_or_compute(
+                    cle, lambda: self._find_similar(critique_id, film_id_normalizer, k, scores_sim_min, mmr_lambda, filtres)
+                )
+                return resultat.copy() # le résultat en cache est partagé
+            #end with
+        except Exception as ex:
+            logger.error(f"erreur recherche de similarités: {ex}")
+            raise
+    #end find_similar
+
+    def _resolve_filters(self, film_id_normalizer:str, critique_id, filtres:Optional[dict]) -> Optional[dict]:
+        """
+        filtres sans valeurs vides, 'exclude_same_user' remplacé par l'auteur de la critique de ref
+        """
+        filtres = {cle: valeur for cle, valeur in (filtres or {}).items() if valeur is not None}
+        if filtres.pop('exclude_same_user', False):
+            critique_ref = self.vector_store.get_critique_by_id(film_id_normalizer,critique_id)
+            if critique_ref is not None:
+                filtres['exclude_user_id'] = critique_ref['user_id']
             #end if
+        #end if
+        return filtres or None
+    #end _resolve_filters
 
-            film_data = self.vector_store.load_film(film_id_normalizer)
-            vecteur_ref = film_data['embeddings'][index_ref]
+    def _find_similar(self, critique_id, film_id_normalizer:str, k:int, scores_sim_min:float, mmr_lambda:Optional[float] =None,
+                      filtres:Optional[dict] =None) -> pd.DataFrame:
+        """
+        recherche effective de find_similar (film normalisé, instantané déjà épinglé, filtres résolus)
+        """
+        # Trouver l'index de la critique de ref
+        index_ref = self._get_index_with_id(film_id_normalizer,critique_id)
+        if index_ref is None:
+            raise ValueError(f"critique {critique_id} inexistante pour le film {film_id_normalizer}")
+        #end if
+
+        # MMR / score hybride: plus de candidats que de résultats, re-classés apres le seuil
+        n_recherche = k if mmr_lambda is None and self.scorer is None else n_candidats(k)
+
+        # filtres: masque appliqué pendant la sélection du top-k (pas apres, sinon moins de k résultats)
+        masque = self.vector_store.filter_mask(film_id_normalizer,filtres)
+
+        # table des voisins précalculée (hors ligne) si disponible: simple lecture de ligne
+        voisins = None
+        if masque is None:
+            voisins = self.vector_store.get_precomputed_neighbours(film_id_normalizer,index_ref,n_recherche)
+        #end if
+        if voisins is not None:
+            scores_filtres, indices_filtres = voisins # auto recommandation déjà exclue
+            logger.info(f"{len(scores_filtres)} voisins précalculés lus")
+        else:
+            vecteur_ref = self.vector_store.get_vectors(film_id_normalizer,index_ref)
 
             logger.info(f"vecteur de ref recupérer (index {index_ref})")
 
             #rechercher les critiques similaires 
-            scores, indices = self.vector_store.search_similar_vectors(film_id_normalizer,vecteur_ref,k+1)
+            scores, indices = self.vector_store.search_similar_vectors(film_id_normalizer,vecteur_ref,n_recherche+1,masque=masque)
             logger.info(f"{len(scores)} similarités trouvées ...")
 
             # filtrer auto recommandation critique_ref
@@ -130,38 +201,244 @@ class RecommanderEngine:
             if len(scores_filtres) < len(scores):
                 logger.info("auto recommandation reussi")
             #end if
+        #end if
 
-            # Filtre par seuil de similarité 
-            masque_seuil = scores_filtres >= scores_sim_min
-            scores_finals = scores_filtres[masque_seuil]
-            indices_finales = indices_filtres[masque_seuil] # que les indices dans le seuil de similarité
+        return self._rank_candidates(film_id_normalizer, scores_filtres, indices_filtres, k, scores_sim_min, mmr_lambda)
+    #end _find_similar
+
+    def _rank_candidates(self, film_id_normalizer:str, scores_filtres, indices_filtres, k:int, scores_sim_min:float,
+                         mmr_lambda:Optional[float] =None) -> pd.DataFrame:
+        """
+        seuil, score hybride, MMR et limite à k sur les candidats triés par similarité, puis métadonnées
+        Args:
+            film_id_normalizer: film (instantané déjà épinglé)
+            scores_filtres: similarités des candidats (triées, décroissantes)
+            indices_filtres: lignes des candidats
+        Returns:
+            DataFrame des critiques avec 'similarity_score' (+ 'hybrid_score')
+        """
+        # Filtre par seuil de similarité 
+        masque_seuil = scores_filtres >= scores_sim_min
+        scores_finals = scores_filtres[masque_seuil]
+        indices_finales = indices_filtres[masque_seuil] # que les indices dans le seuil de similarité
+
+        # verifier le nombre apres le filtre
+        nb_filtre_seuil = len(scores_filtres) - len(scores_finals)
+        if nb_filtre_seuil > 0:
+            logger.info(f"{nb_filtre_seuil} results filtrés pour le seuil {scores_sim_min}")
+        #end if
+
+        # score hybride: une expression vectorisée sur les candidats, signaux lus par lignes
+        pertinences = scores_finals
+        if self.scorer is not None:
+            pertinences = self.scorer.score(scores_finals, *self.vector_store.get_features(film_id_normalizer,indices_finales))
+            ordre = np.argsort(-pertinences, kind='stable')
+            pertinences, scores_finals, indices_finales = pertinences[ordre], scores_finals[ordre], indices_finales[ordre]
+        #end if
+
+        # Limiter au nombre demandé ou revoir vector_store 
+        if mmr_lambda is not None:
+            choisis = mmr_select(pertinences, self.vector_store.get_vectors(film_id_normalizer,indices_finales), k, mmr_lambda)
+        else:
+            choisis = slice(0, k)
+        #end if
+        scores_final = scores_finals[choisis]
+        indices_finale = indices_finales[choisis]
+        if len(scores_final) == 0:
+            logger.warning("pas de critiques similaires trouvee apres le filtre")
+            return pd.DataFrame()
+        #end if
+
+        # recuperer les metadata
+        critiques_similaires = self.vector_store.get_critique_metadata(film_id_normalizer,indices_finale)
+
+        # ajout des scores de similarités au dataF
+        critiques_similaires['similarity_score'] = scores_final
+        if self.scorer is not None:
+            critiques_similaires['hybrid_score'] = pertinences[choisis]
+        #end if
+        logger.info(f"{len(critiques_similaires)} critiques similaires trouvées")
+
+        return critiques_similaires
+    #end _rank_candidates
+
+    def search_text(self, texte:str, film_id:str, k:int, scores_sim_min:float =0.0, mmr_lambda:Optional[float] =None,
+                    filtres:Optional[dict] =None) -> pd.DataFrame:
+        """
+        Trouver les critiques d'un film proches d'un texte libre (recherche pendant la frappe)
+        Expl: le texte est encodé par le QueryEncoder (modèle chargé à la demande, cache LRU des
+            vecteurs de requetes) puis cherché comme le vecteur d'une critique.
+
+        Args:
+            texte: texte de la requete
+            film_id: film dans lequel rechercher
+            k: nombre de résultats max
+            scores_sim_min: seuil min de similarité (plus bas que critique/critique: requetes courtes)
+            mmr_lambda: re-classement MMR (voir find_similar)
+            filtres: filtres sur les métadonnées (voir vector_store/filters.py)
+
+        Returns:
+            DataFrame des critiques avec 'similarity_score' (+ 'hybrid_score')
+        """
+        try:
+            if self.query_encoder is None:
+                raise RuntimeError("pas d'encodeur de requetes configuré (query_encoder)")
+            #end if
+            #normaliser le nom du film
+            film_id_normalizer = film_id.lower().strip()
+            logger.info(f"recherche texte : film={film_id_normalizer}, k={k}")
 
-            # verifier le nombre apres le filtre
-            nb_filtre_seuil = len(scores_filtres) - len(scores_finals)
-            if nb_filtre_seuil > 0:
-                logger.info(f"{nb_filtre_seuil} results filtrés pour le seuil {scores_sim_min}")
+            #verifier que le film existe
+            if not self.vector_store.film_exists(film_id_normalizer):
+                raise ValueError(f"film '{film_id}' non dispo")
             #end if
 
-            # Limiter au nombre demandé ou revoir vector_store 
-            scores_final = scores_finals[:k] 
-            indices_finale = indices_finales[:k]
-            if len(scores_final) == 0:
-                logger.warning("pas de critiques similaires trouvee apres le filtre")
-                return pd.DataFrame()
+            vecteur = self.query_encoder.encode(texte) # avant l'instantané: l'inférence peut etre longue
+
+            # meme instantané du film pour toute la requete (rechargement à chaud)
+            with self.vector_store.snapshot(film_id_normalizer):
+                filtres = {cle: valeur for cle, valeur in (filtres or {}).items() if valeur is not None} or None
+                masque = self.vector_store.filter_mask(film_id_normalizer,filtres)
+                n_recherche = k if mmr_lambda is None and self.scorer is None else n_candidats(k)
+                scores, indices = self.vector_store.search_similar_vectors(film_id_normalizer,vecteur,n_recherche,masque=masque)
+                return self._rank_candidates(film_id_normalizer, scores, indices, k, scores_sim_min, mmr_lambda)
+            #end with
+        except Exception as ex:
+            logger.error(f"erreur recherche texte: {ex}")
+            raise
+    #end search_text
+
+    def find_above_threshold(self, critique_id:str, film_id:str, scores_sim_min:float =0.8, limite:Optional[int] =None) -> pd.DataFrame:
+        """
+        Trouver toutes les critiques dont la similarité avec une critique donnée dépasse un seuil
+        (modération, détection de doublons)
+        Expl: lecture de la table des voisins précalculée quand elle couvre le seuil,
+            sinon parcours exact par blocs du film.
+
+        Args:
+            critique_id: ID de la critique de reference
+            film_id: film dans lequel rechercher
+            scores_sim_min: seuil min de similarité
+            limite: nombre max de résultats (les plus similaires), None -> tous
+
+        Returns:
+            DataFrame des critiques au dessus du seuil avec 'similarity_score', triées par score décroissant
+        """
+        try:
+            #normaliser le nom du film
+            film_id_normalizer = film_id.lower().strip()
+            logger.info(f"recherche par seuil : critique={critique_id}, film={film_id_normalizer}, seuil={scores_sim_min}")
+
+            #verifier que le film existe
+            if not self.vector_store.film_exists(film_id_normalizer):
+                raise ValueError(f"film '{film_id}' non dispo")
             #end if
 
-            # recuperer les metadata
-            critiques_similaires = self.vector_store.get_critique_metadata(film_id_normalizer,indices_finale)
+            # meme instantané du film pour toute la requete (rechargement à chaud)
+            with self.vector_store.snapshot(film_id_normalizer):
+                index_ref = self._get_index_with_id(film_id_normalizer,critique_id)
+                if index_ref is None:
+                    raise ValueError(f"critique {critique_id} inexistante pour le film {film_id}")
+                #end if
+
+                resultats = self.vector_store.get_precomputed_range(film_id_normalizer,index_ref,scores_sim_min,limite)
+                if resultats is not None:
+                    scores, indices = resultats # auto recommandation déjà exclue
+                else:
+                    vecteur_ref = self.vector_store.get_vectors(film_id_normalizer,index_ref)
+                    scores, indices = self.vector_store.range_search_vectors(
+                        film_id_normalizer, vecteur_ref, scores_sim_min, None if limite is None else limite + 1
+                    )
+                    masque_auto = indices != index_ref # auto recommandation exclue
+                    scores, indices = scores[masque_auto][:limite], indices[masque_auto][:limite]
+                #end if
+
+                if len(scores) == 0:
+                    logger.warning(f"aucune critique au dessus du seuil {scores_sim_min}")
+                    return pd.DataFrame()
+                #end if
+                critiques_similaires = self.vector_store.get_critique_metadata(film_id_normalizer,indices)
+                critiques_similaires['similarity_score'] = scores
+                logger.info(f"{len(critiques_similaires)} critiques au dessus du seuil {scores_sim_min}")
+                return critiques_similaires
+            #end with
+        except Exception as ex:
+            logger.error(f"erreur recherche par seuil: {ex}")
+            raise
+    #end find_above_threshold
+
+    def find_similar_many(self, critique_ids, film_id:str, k:int, scores_sim_min:float =0.8) -> pd.DataFrame:
+        """
+        Trouver les critiques similaires pour plusieurs critiques d'un meme film (traitements en masse)
+        Expl: une seule recherche groupée (GEMM) pour toutes les critiques, puis exclusion de
+            l'auto-recommandation, seuil et limite à k appliqués sur la matrice des résultats.
+            Meme top-k cosinus que find_similar pour chaque critique, mais sans score hybride
+            (scorer), filtres, MMR ni cache des résultats: à utiliser quand seule la similarité compte.
+
+        Args:
+            critique_ids: IDs des critiques de reference
+            film_id: film dans lequel rechercher
+            k: nombre de résultats max par critique
+            scores_sim_min: seuil min de similarité
+
+        Returns:
+            DataFrame des critiques similaires avec 'critique_ref_id' et 'similarity_score'
+            (les IDs inconnus sont ignorés)
+        """
+        try:
+            #normaliser le nom du film
+            film_id_normalizer = film_id.lower().strip()
+            logger.info(f"recherche groupée : {len(critique_ids)} critiques, film={film_id_normalizer}")
 
-            # ajout des scores de similarités au dataF
-            critiques_similaires['similarity_score'] = scores_final
-            logger.info(f"{len(critiques_similaires)} critiques similaires trouvées")
+            #verifier que le film existe
+            if not self.vector_store.film_exists(film_id_normalizer):
+                raise ValueError(f"film '{film_id}' non dispo")
+            #end if
 
-            return critiques_similaires
+            # meme instantané du film pour toute la requete (rechargement à chaud)
+            with self.vector_store.snapshot(film_id_normalizer):
+                # index des critiques de ref (IDs inconnus ignorés)
+                refs = [(str(c), self.vector_store.get_index_with_id(film_id_normalizer,c)) for c in critique_ids]
+                refs = [(c, index) for c, index in refs if index is not None]
+                if len(refs) == 0:
+                    logger.warning("aucune critique de reference trouvée")
+                    return pd.DataFrame()
+                #end if
+                ids_ref = np.array([c for c, _ in refs], dtype=object)
+                index_ref = np.array([index for _, index in refs], dtype=np.int64)
+
+                # table précalculée (auto-recommandation déjà exclue) ou recherche groupée
+                voisins = self.vector_store.get_precomputed_neighbours(film_id_normalizer,index_ref,k)
+                if voisins is not None:
+                    scores, indices = voisins
+                    valide = indices >= 0
+                else:
+                    requetes = self.vector_store.get_vectors(film_id_normalizer,index_ref)
+                    scores, indices = self.vector_store.search_similar_vectors_batch(film_id_normalizer,requetes,k+1)
+                    valide = (indices != index_ref[:, None]) & (indices >= 0) # auto recommandation exclue
+                #end if
+
+                # seuil puis les k premiers valides de chaque ligne (résultats déjà triés)
+                valide &= scores >= scores_sim_min
+                valide &= np.cumsum(valide, axis=1) <= k
+                lignes, colonnes = np.nonzero(valide)
+                if len(lignes) == 0:
+                    logger.warning("pas de critiques similaires trouvee apres le filtre")
+                    return pd.DataFrame()
+                #end if
+
+                # recuperer les metadata en une fois
+                critiques_similaires = self.vector_store.get_critique_metadata(film_id_normalizer,indices[lignes, colonnes])
+                critiques_similaires.insert(0, 'critique_ref_id', ids_ref[lignes])
+                critiques_similaires['similarity_score'] = scores[lignes, colonnes]
+                logger.info(f"{len(critiques_similaires)} critiques similaires trouvées pour {len(refs)} critiques")
+
+                return critiques_similaires
+            #end with
         except Exception as ex:
-            logger.error(f"erreur recherche de similarités: {ex}")
+            logger.error(f"erreur recherche groupée de similarités: {ex}")
             raise
-    #end find_similar
+    #end find_similar_many
 
 # main
 def main():
@@ -193,7 +470,8 @@ def main():
         critique_id_test = str(dataF_metadata['id'].iloc[132])
 
         print(f"Test avec critique ID: {critique_id_test}")
-        print(f"\n La critique de ref: {dataF_metadata['review_content'].iloc[132][:300]}... ")
+        critique_ref = vector_store.get_critique_metadata(film_test,[132]).iloc[0]
+        print(f"\n La critique de ref: {critique_ref['review_content'][:300]}... ")
         print("\n")
 
         # la recherche
@@ -0,0 +1,196 @@
+"""
+Ici, on gère le cache des résultats de recommandation
+
+Expl: les critiques populaires sont demandées en boucle, or le résultat pour
+    (film, version du film, critique, k, seuil) ne change pas tant que l'instantané
+    du film est le meme. On garde les derniers résultats (LRU) avec une durée de vie (TTL)
+    et des limites en nombre d'entrées et en octets.
+    Les requetes identiques en cours sont regroupées: un seul calcul, les autres attendent
+    son résultat (pas de rafale de recherches sur une clé chaude qui vient d'expirer).
+    La version du film fait partie de la clé, et le rechargement d'un film purge ses entrées.
+
+Auteur: Jo Kabonga
+Date: 18/10/2026
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+logger = logging.getLogger(__name__)
+
+TAILLE_MAX_DEFAUT = 1024 # entrées
+TTL_DEFAUT = 300.0 # secondes
+OCTETS_MAX_DEFAUT = 64 * 1024 * 1024
+
+def taille_resultat(resultat):
+    """taille mémoire approximative d'un résultat (DataFrame ou tableau numpy) en octets"""
+    if hasattr(resultat, "memory_usage"):
+        return int(resultat.memory_usage(index=True, deep=True).sum())
+    #end if
+    if hasattr(resultat, "nbytes"):
+        return int(resultat.nbytes)
+    #end if
+    return 0
+#end taille_resultat
+
+class ResultCache:
+    """
+    Cache LRU + TTL thread-safe des résultats, avec regroupement des requetes en cours
+    (clé: tuple dont le premier élément est le film)
+    """
+
+    def __init__(self, max_entries=TAILLE_MAX_DEFAUT, ttl=TTL_DEFAUT, max_bytes=OCTETS_MAX_DEFAUT, horloge=time.monotonic):
+        """
+        Args:
+            max_entries: nombre max d'entrées
+            ttl: durée de vie d'une entrée en secondes (None -> pas d'expiration)
+            max_bytes: taille max des résultats en octets (None -> illimitée)
+            horloge: source de temps (remplaçable pour les tests)
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._horloge = horloge
+        self._entrees = OrderedDict() # {clé: (expiration, octets, résultat)} ordre LRU
+        self._en_cours = {} # {clé: Future} calculs en cours
+        self._octets = 0
+        self._verrou = threading.Lock()
+        self.compteurs = {'hits': 0, 'misses': 0, 'coalesced': 0, 'expirations': 0, 'evictions': 0, 'invalidations': 0}
+    #end __init__
+
+    def __len__(self):
+        return len(self._entrees)
+    #end __len__
+
+    def get_or_compute(self, cle, calcul):
+        """
+        résultat en cache pour la clé, sinon calcul (une seule fois pour les requetes simultanées)
+        Args:
+            cle: clé du résultat (film en premier)
+            calcul: fonction sans argument qui calcule le résultat
+        Returns:
+            le résultat (partagé entre les appelants, ne pas le modifier)
+        """
+        with self._verrou:
+            entree = self._entrees.get(cle)
+            if entree is not None:
+                if entree[0] is None or entree[0] > self._horloge():
+                    self._entrees.move_to_end(cle)
+                    self.compteurs['hits'] += 1
+                    return entree[2]
+                #end if
+                self._retirer(cle)
+                self.compteurs['expirations'] += 1
+            #end if
+            futur = self._en_cours.get(cle)
+            if futur is not None:
+                self.compteurs['coalesced'] += 1
+                meneur = False
+            else:
+                futur = Future()
+                self._en_cours[cle] = futur
+                self.compteurs['misses'] += 1
+                meneur = True
+            #end if
+        #end with
+
+        if not meneur:
+            return futur.result() # meme résultat (ou meme erreur) que le calcul en cours
+        #end if
+
+        resultat, erreur = None, None
+        try:
+            resultat = calcul()
+        except BaseException as ex:
+            erreur = ex # les erreurs ne sont pas mises en cache
+            raise
+        finally:
+            with self._verrou:
+                # clé invalidée (ou reprise par un autre meneur) pendant le calcul -> résultat rendu mais pas gardé
+                if self._en_cours.get(cle) is futur:
+                    del self._en_cours[cle]
+                    if erreur is None:
+                        self._ajouter(cle, resultat)
+                    #end if
+                #end if
+            #end with
+            # les appelants en attente sont toujours libérés, meme resultat ou meme erreur
+            if erreur is None:
+                futur.set_result(resultat)
+            else:
+                futur.set_exception(erreur)
+            #end if
+        #end try
+        return resultat
+    #end get_or_compute
+
+    def _ajouter(self, cle, resultat):
+        """ajoute une entrée puis évince les plus anciennes au dela des limites (sous verrou)"""
+        if self.max_entries <= 0:
+            return
+        #end if
+        octets = taille_resultat(resultat)
+        if self.max_bytes is not None and octets > self.max_bytes:
+            return
+        #end if
+        expiration = None if self.ttl is None else self._horloge() + self.ttl
+        self._entrees[cle] = (expiration, octets, resultat)
+        self._octets += octets
+        while len(self._entrees) > self.max_entries or (self.max_bytes is not None and self._octets > self.max_bytes):
+            self._retirer(next(iter(self._entrees)))
+            self.compteurs['evictions'] += 1
+        #end while
+    #end _ajouter
+
+    def _retirer(self, cle):
+        """retire une entrée (sous verrou)"""
+        _, octets, _ = self._entrees.pop(cle)
+        self._octets -= octets
+    #end _retirer
+
+    def invalidate(self, film_id=None):
+        """
+        purge les entrées d'un film (toutes si film_id est None), calculs en cours compris
+        Returns:
+            int: nombre d'entrées retirées
+        """
+        with self._verrou:
+            cles = [cle for cle in self._entrees if film_id is None or cle[0] == film_id]
+            for cle in cles:
+                self._retirer(cle)
+            #end for
+            for cle in [cle for cle in self._en_cours if film_id is None or cle[0] == film_id]:
+                del self._en_cours[cle] # le résultat sera rendu à ses appelants mais pas gardé
+            #end for
+            self.compteurs['invalidations'] += len(cles)
+        #end with
+        if cles:
+            logger.info(f"cache des résultats: {len(cles)} entrées invalidées ({film_id or 'tous les films'})")
+        #end if
+        return len(cles)
+    #end invalidate
+
+    def stats(self):
+        """compteurs du cache, taux de hits et occupation"""
+        with self._verrou:
+            demandes = self.compteurs['hits'] + self.compteurs['misses'] + self.compteurs['coalesced']
+            return {
+                **self.compteurs,
+                'hit_ratio': (self.compteurs['hits'] + self.compteurs['coalesced']) / demandes if demandes else 0.0,
+                'entrees': len(self._entrees),
+                'max_entrees': self.max_entries,
+                'octets_utilises': self._octets,
+                'max_octets': self.max_bytes,
+                'ttl': self.ttl
+            }
+        #end with
+    #end stats
+#end ResultCache
@@ -0,0 +1,74 @@
+"""
+Ici, on gère le score hybride des recommandations (similarité + popularité + récence)
+
+Expl: le cosinus seul ignore l'utilité d'une critique (vues, likes) et son age.
+    Les candidats (déjà au dessus du seuil de similarité) sont re-classés par
+        poids_similarite * cosinus + poids_popularite * popularité + poids_recence * 2^(-age / demi_vie)
+    en une seule expression vectorisée sur les candidats. Les signaux sont précalculés
+    à l'ingestion (vector_store/features.py): popularité = log(1 + vues + 10 * likes)
+    normalisée par le max du film, récence = 1 aujourd'hui, 0.5 apres une demi-vie,
+    0 si la date est inconnue.
+
+Auteur: Jo Kabonga
+Date: 18/10/2026
+"""
+
+import time
+import numpy as np
+
+SECONDES_PAR_JOUR = 86400.0
+DEMI_VIE_DEFAUT = 365.0 # jours
+
+class HybridScorer:
+    """
+    Score hybride configurable (poids à 0 -> signal ignoré)
+    """
+
+    def __init__(self, poids_similarite=1.0, poids_popularite=0.0, poids_recence=0.0, demi_vie_jours=DEMI_VIE_DEFAUT,
+                 horloge=time.time):
+        """
+        Args:
+            poids_similarite: poids du cosinus
+            poids_popularite: poids de la popularité normalisée (0..1)
+            poids_recence: poids de la récence (0..1)
+            demi_vie_jours: age (jours) auquel la récence vaut 0.5
+            horloge: source de temps en secondes depuis 1970 (remplaçable pour les tests)
+        """
+        if demi_vie_jours <= 0:
+            raise ValueError(f"demi_vie_jours doit etre > 0, reçu {demi_vie_jours}")
+        #end if
+        self.poids_similarite = float(poids_similarite)
+        self.poids_popularite = float(poids_popularite)
+        self.poids_recence = float(poids_recence)
+        self.demi_vie_jours = float(demi_vie_jours)
+        self._horloge = horloge
+    #end __init__
+
+    @property
+    def actif(self):
+        """le score change-t-il l'ordre du cosinus seul"""
+        return self.poids_popularite != 0.0 or self.poids_recence != 0.0
+    #end actif
+
+    def cle(self):
+        """paramètres du score (clé du cache des résultats)"""
+        return (self.poids_similarite, self.poids_popularite, self.poids_recence, self.demi_vie_jours)
+    #end cle
+
+    def score(self, similarites, popularite, jours):
+        """
+        score hybride des candidats
+        Args:
+            similarites: cosinus des candidats (c,)
+            popularite: popularité normalisée des candidats (c,)
+            jours: date des candidats en jours depuis 1970, -inf si inconnue (c,)
+        Returns:
+            np.ndarray float32 (c,)
+        """
+        aujourd_hui = np.float32(self._horloge() / SECONDES_PAR_JOUR)
+        age = np.maximum(aujourd_hui - np.asarray(jours, dtype=np.float32), 0) # date future -> age 0
+        return (self.poids_similarite * np.asarray(similarites, dtype=np.float32)
+                + self.poids_popularite * np.asarray(popularite, dtype=np.float32)
+                + self.poids_recence * np.exp2(-age / self.demi_vie_jours)).astype(np.float32, copy=False)
+    #end score
+#end HybridScorer
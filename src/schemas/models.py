@@ -8,6 +8,17 @@ Date: 2/11/2025
 
 from pydantic import BaseModel, Field # param field generer par ia
 from typing import List, Optional
+from datetime import date
+
+class FiltresRecherche(BaseModel):
+    """filtres sur les critiques recommandées (appliqués pendant la recherche)"""
+    rating_min: Optional[float] = Field(default=None, ge=0, le=10)
+    rating_max: Optional[float] = Field(default=None, ge=0, le=10)
+    date_min: Optional[date] = None
+    date_max: Optional[date] = None
+    hits_min: Optional[int] = Field(default=None, ge=0)
+    likes_min: Optional[int] = Field(default=None, ge=0)
+    exclude_same_user: bool = Field(default=False, description="exclure les critiques de l'auteur de la critique de ref")
 
 class RecommandationRequest(BaseModel):
     """
@@ -17,6 +28,16 @@ class RecommandationRequest(BaseModel):
     critique_id:str
     film_id:str
     k:int = Field(default=5, ge=1, le=10,description="nombre de resultats entre 1-10") #description generer par ia
+    mmr_lambda: Optional[float] = Field(default=None, ge=0, le=1, description="diversité MMR: 1 pertinence seule, 0 diversité seule, absent pas de re-classement")
+    filtres: Optional[FiltresRecherche] = None
+
+class RechercheTexteRequest(BaseModel):
+    """modele pour la recherche de critiques proches d'un texte libre"""
+    texte: str = Field(min_length=1, max_length=2000, description="texte de la requete")
+    film_id: str
+    k: int = Field(default=5, ge=1, le=10, description="nombre de resultats entre 1-10")
+    mmr_lambda: Optional[float] = Field(default=None, ge=0, le=1)
+    filtres: Optional[FiltresRecherche] = None
 
 class CritiqueReference(BaseModel):
     """modele pour la critique de ref"""
@@ -29,6 +50,7 @@ class CritiqueResponse(BaseModel):
     id: str
     user_id:str
     score_similarity:float
+    score_hybride: Optional[float] = None # score hybride si activé (ordre des résultats)
     review_content:str
 
 class RecommendationResponse(BaseModel):
@@ -37,4 +59,8 @@ class RecommendationResponse(BaseModel):
     recommendations: List[CritiqueResponse]
     metadata: dict
 
-
+class RechercheTexteResponse(BaseModel):
+    """modele pour la reponse de la recherche par texte"""
+    requete: str
+    recommendations: List[CritiqueResponse]
+    metadata: dict
@@ -0,0 +1,243 @@
+"""
+Ici, on gère l'index approximatif (ANN) de type IVF pour les films volumineux
+
+Expl: la recherche exacte est linéaire Θ(n·d). Pour les films avec beaucoup de critiques,
+    on partitionne les vecteurs en n_listes groupes (k-means sphérique, similarité cosinus).
+    A la recherche, on ne parcourt que les nprobe groupes dont le centroïde est le plus
+    proche de la requete: Θ(n_listes·d + nprobe·n/n_listes·d).
+    nprobe est le réglage rappel/latence (plus grand -> meilleur rappel, plus lent).
+
+Fichiers par film (à coté de embeddings.npy):
+    - ivf_centroids.npy : float32 (n_listes, dim)
+    - ivf_offsets.npy   : int64 (n_listes + 1,) début de chaque liste dans ivf_rows
+    - ivf_rows.npy      : int32 (n,) lignes des vecteurs regroupées par liste
+
+Auteur: Jo Kabonga
+Date: 18/10/2026
+"""
+
+import logging
+import time
+import numpy as np
+from pathlib import Path
+
+try:
+    from .search import normaliser, topk_scores, topk_dot
+    from .storage import save_npy, write_stamp, stamp_matches
+except ImportError:
+    from search import normaliser, topk_scores, topk_dot # execution directe du module
+    from storage import save_npy, write_stamp, stamp_matches
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+logger = logging.getLogger(__name__)
+
+FICHIER_CENTROIDES = "ivf_centroids.npy"
+FICHIER_OFFSETS = "ivf_offsets.npy"
+FICHIER_LIGNES = "ivf_rows.npy"
+FICHIER_SOURCE = "ivf_source.txt" # signature des vecteurs indexés (voir storage.source_signature)
+TAILLE_MIN_ANN = 50_000 # en dessous, la recherche exacte reste rapide
+NPROBE_DEFAUT = 8
+TAILLE_BLOC = 65536 # lignes par bloc pour l'affectation aux centroïdes
+
+def _affecter(embeddings, centroides):
+    """affecte chaque vecteur à son centroïde le plus proche (par blocs)"""
+    affectations = np.empty(len(embeddings), dtype=np.int64)
+    for debut in range(0, len(embeddings), TAILLE_BLOC):
+        bloc = np.asarray(embeddings[debut:debut + TAILLE_BLOC], dtype=np.float32)
+        affectations[debut:debut + len(bloc)] = np.argmax(bloc @ centroides.T, axis=1)
+    #end for
+    return affectations
+#end _affecter
+
+class IVFIndex:
+    """
+    Index IVF (inverted file) en NumPy pur
+    Expl: listes inversées stockées en un seul tableau de lignes + offsets (CSR),
+        la recherche concatène les listes sondées et fait un produit scalaire exact dessus.
+    """
+
+    def __init__(self, centroides, offsets, lignes, nprobe=NPROBE_DEFAUT):
+        self.centroides = centroides
+        self.offsets = offsets
+        self.lignes = lignes
+        self.nprobe = nprobe
+    #end __init__
+
+    @property
+    def n_listes(self):
+        return len(self.centroides)
+    #end n_listes
+
+    @classmethod
+    def build(cls, embeddings, n_listes=None, n_iter=10, taille_echantillon=None, seed=0, nprobe=NPROBE_DEFAUT):
+        """
+        Construit l'index: k-means sphérique sur un échantillon puis affectation de tous les vecteurs
+        Args:
+            embeddings: matrice (n, dim) des vecteurs normalisés
+            n_listes: nombre de groupes (par defaut 4·sqrt(n))
+            n_iter: itérations du k-means
+            taille_echantillon: nombre de vecteurs pour l'entrainement (par defaut 64 par liste)
+            seed: graine aléatoire
+            nprobe: nombre de listes sondées par defaut
+        Returns:
+            IVFIndex
+        """
+        try:
+            n = len(embeddings)
+            if n == 0:
+                raise ValueError("impossible de construire un index sur un film vide")
+            #end if
+            if n_listes is None:
+                n_listes = int(4 * np.sqrt(n))
+            #end if
+            n_listes = max(1, min(n_listes, n))
+            if taille_echantillon is None:
+                taille_echantillon = 64 * n_listes
+            #end if
+
+            rng = np.random.default_rng(seed)
+            echantillon = np.sort(rng.choice(n, size=min(n, taille_echantillon), replace=False))
+            donnees = np.asarray(embeddings[echantillon], dtype=np.float32)
+
+            # k-means sphérique (cosinus): centroïdes normalisés
+            centroides = donnees[rng.choice(len(donnees), size=n_listes, replace=False)].copy()
+            for _ in range(n_iter):
+                affectations = _affecter(donnees, centroides)
+                comptes = np.bincount(affectations, minlength=n_listes)
+                vides = comptes == 0
+
+                # somme par groupe: tri par groupe puis reduceat sur les débuts de groupes
+                ordre = np.argsort(affectations, kind="stable")
+                debuts = (np.cumsum(comptes) - comptes)[~vides]
+                sommes = np.zeros_like(centroides)
+                sommes[~vides] = np.add.reduceat(donnees[ordre], debuts, axis=0)
+                if vides.any(): # groupe vide -> réinitialisé sur un vecteur au hasard
+                    sommes[vides] = donnees[rng.choice(len(donnees), size=int(vides.sum()))]
+                #end if
+                centroides = normaliser(sommes)
+            #end for
+
+            # listes inversées (format CSR)
+            affectations = _affecter(embeddings, centroides)
+            lignes = np.argsort(affectations, kind="stable").astype(np.int32)
+            offsets = np.zeros(n_listes + 1, dtype=np.int64)
+            np.cumsum(np.bincount(affectations, minlength=n_listes), out=offsets[1:])
+
+            logger.info(f"index IVF construit: {n} vecteurs, {n_listes} listes")
+            return cls(centroides.astype(np.float32), offsets, lignes, nprobe=nprobe)
+        except Exception as ex:
+            logger.error(f"erreur construction index IVF: {ex}")
+            raise
+    #end build
+
+    def candidats(self, vecteur_ref, nprobe=None):
+        """lignes des vecteurs des nprobe listes les plus proches de la requete"""
+        nprobe = min(nprobe or self.nprobe, self.n_listes)
+        _, listes = topk_scores(self.centroides @ vecteur_ref, nprobe)
+        return np.concatenate([self.lignes[self.offsets[l]:self.offsets[l + 1]] for l in listes])
+    #end candidats
+
+    def search(self, embeddings, vecteur_ref, k, nprobe=None, masque=None):
+        """
+        Recherche approximative des k vecteurs les plus similaires
+        Args:
+            embeddings: matrice des vecteurs du film (celle indexée)
+            vecteur_ref: vecteur de la requete
+            k: nombre de resultats
+            nprobe: nombre de listes sondées (défaut: self.nprobe)
+            masque: lignes autorisées (bool (n,)), candidats filtrés avant le calcul des scores
+        Returns:
+            tuple:(scores_k, indices_k)
+        """
+        vecteur_ref = normaliser(vecteur_ref).ravel()
+        lignes = np.sort(self.candidats(vecteur_ref, nprobe)) # accès mémoire croissant (mmap)
+        if masque is not None:
+            lignes = lignes[masque[lignes]]
+        #end if
+        scores = np.asarray(embeddings[lignes], dtype=np.float32) @ vecteur_ref
+        scores_k, positions = topk_scores(scores, k)
+        return np.clip(scores_k, -1.0, 1.0), lignes[positions].astype(np.int64)
+    #end search
+
+    def save(self, film_path):
+        """sauvegarde l'index dans le dossier du film"""
+        film_path = Path(film_path)
+        save_npy(film_path / FICHIER_CENTROIDES, self.centroides)
+        save_npy(film_path / FICHIER_OFFSETS, self.offsets)
+        save_npy(film_path / FICHIER_LIGNES, self.lignes)
+        write_stamp(film_path / FICHIER_SOURCE, film_path)
+        logger.info(f"index IVF sauvegardé: {film_path}")
+    #end save
+
+    @classmethod
+    def load(cls, film_path, mmap=False, nprobe=NPROBE_DEFAUT):
+        """charge l'index d'un film, None s'il n'existe pas ou s'il indexe d'autres vecteurs"""
+        film_path = Path(film_path)
+        chemins = [film_path / f for f in (FICHIER_CENTROIDES, FICHIER_OFFSETS, FICHIER_LIGNES)]
+        if not all(chemin.exists() for chemin in chemins):
+            return None
+        #end if
+        if not stamp_matches(film_path / FICHIER_SOURCE, film_path):
+            logger.warning(f"index IVF calculé sur d'autres vecteurs, ignoré: {film_path}")
+            return None
+        #end if
+        centroides, offsets, lignes = (np.load(c, mmap_mode="r" if mmap else None) for c in chemins)
+        return cls(np.asarray(centroides), np.asarray(offsets), lignes, nprobe=nprobe)
+    #end load
+#end IVFIndex
+
+def build_film_ann_index(film_path, taille_min=TAILLE_MIN_ANN, **kwargs):
+    """
+    étape du pipeline (ingestion): construit l'index IVF d'un film s'il est assez grand
+    Returns:
+        IVFIndex ou None si le film est sous le seuil
+    """
+    film_path = Path(film_path)
+    embeddings = np.load(film_path / "embeddings.npy", mmap_mode="r")
+    if len(embeddings) < taille_min:
+        logger.info(f"{film_path.name}: {len(embeddings)} critiques < {taille_min}, recherche exacte")
+        return None
+    #end if
+    index = IVFIndex.build(embeddings, **kwargs)
+    index.save(film_path)
+    return index
+#end build_film_ann_index
+
+def evaluate_recall(embeddings, index, k=10, nprobes=(1, 2, 4, 8, 16, 32), n_requetes=200, seed=0):
+    """
+    Evalue le rappel@k de l'index IVF par rapport à la recherche exacte
+    Args:
+        embeddings: matrice des vecteurs indexés
+        index: IVFIndex
+        k: nombre de voisins
+        nprobes: valeurs de nprobe à évaluer
+        n_requetes: nombre de critiques tirées au hasard comme requetes
+    Returns:
+        list[dict]: {nprobe, recall, latence_ms, latence_exacte_ms} par valeur de nprobe
+    """
+    rng = np.random.default_rng(seed)
+    requetes = np.asarray(embeddings[rng.choice(len(embeddings), size=min(n_requetes, len(embeddings)), replace=False)])
+
+    debut = time.perf_counter()
+    verites = [set(topk_dot(embeddings, q, k)[1].tolist()) for q in requetes]
+    latence_exacte = (time.perf_counter() - debut) / len(requetes)
+
+    rapport = []
+    for nprobe in nprobes:
+        debut = time.perf_counter()
+        resultats = [index.search(embeddings, q, k, nprobe=nprobe)[1] for q in requetes]
+        latence = (time.perf_counter() - debut) / len(requetes)
+        rappel = np.mean([len(verite.intersection(r.tolist())) / len(verite) for verite, r in zip(verites, resultats)])
+        rapport.append({
+            "nprobe": nprobe,
+            "recall": float(rappel),
+            "latence_ms": latence * 1e3,
+            "latence_exacte_ms": latence_exacte * 1e3
+        })
+    #end for
+    return rapport
+#end evaluate_recall
@@ -0,0 +1,230 @@
+"""
+Ici, on gère le format colonnes des métadonnées d'un film (remplace metadata.pkl)
+
+Format du dossier 'metadata/' (version 1):
+    - schema.json          : version, nombre de lignes, type de chaque colonne
+    - <col>.npy            : colonne numérique / date (tableau NumPy typé)
+    - <col>.utf8           : colonne texte, toutes les valeurs UTF-8 bout à bout
+    - <col>.offsets.npy    : int64 (n+1,) début de chaque valeur dans <col>.utf8 (octets)
+    - <col>.null.npy       : bool (n,) valeurs manquantes d'une colonne texte (si besoin)
+
+Expl: pas de colonne 'embedding' (les vecteurs sont déjà dans embeddings.npy), pas d'objets
+    Python par vecteur, et pas de pickle à désérialiser (aucun code exécuté au chargement).
+
+Auteur: Jo Kabonga
+Date: 18/10/2026
+"""
+
+import json
+import logging
+import shutil
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+try:
+    from .storage import save_npy
+    from .snapshot import base_dir, refresh_manifest
+except ImportError:
+    from storage import save_npy # execution directe du module
+    from snapshot import base_dir, refresh_manifest
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+logger = logging.getLogger(__name__)
+
+NOM_DOSSIER = "metadata"
+NOM_SCHEMA = "schema.json"
+VERSION = 1
+COLONNES_EXCLUES = ("embedding",) # doublon de embeddings.npy
+
+def write_string_column(dossier, nom, valeurs):
+    """
+    écrit une colonne texte: blob UTF-8 contigu + offsets (+ masque des manquants)
+    Returns:
+        dict: description de la colonne pour le schéma
+    """
+    valeurs = pd.Series(valeurs)
+    manquants = valeurs.isna().to_numpy()
+    encodes = [b"" if manque else str(v).encode("utf-8") for v, manque in zip(valeurs, manquants)]
+    offsets = np.zeros(len(encodes) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encodes], out=offsets[1:])
+
+    (Path(dossier) / f"{nom}.utf8").write_bytes(b"".join(encodes))
+    save_npy(Path(dossier) / f"{nom}.offsets.npy", offsets)
+    if manquants.any():
+        save_npy(Path(dossier) / f"{nom}.null.npy", manquants)
+    #end if
+    return {"type": "string", "nulls": bool(manquants.any())}
+#end write_string_column
+
+def read_string_column(dossier, nom, description):
+    """relit une colonne texte en tableau d'objets str (None pour les manquants)"""
+    blob = (Path(dossier) / f"{nom}.utf8").read_bytes()
+    offsets = np.load(Path(dossier) / f"{nom}.offsets.npy")
+    valeurs = np.empty(len(offsets) - 1, dtype=object)
+    debuts, fins = offsets[:-1].tolist(), offsets[1:].tolist()
+    valeurs[:] = [blob[a:b].decode("utf-8") for a, b in zip(debuts, fins)]
+    if description.get("nulls"):
+        valeurs[np.load(Path(dossier) / f"{nom}.null.npy")] = None
+    #end if
+    return valeurs
+#end read_string_column
+
+class TextStore:
+    """
+    Accès paresseux à une colonne texte: blob UTF-8 mappé en mémoire + offsets
+    Expl: seules les lignes demandées (les k résultats d'une requete) sont décodées,
+        la mémoire du serveur ne dépend plus du volume de texte du corpus.
+    """
+
+    def __init__(self, dossier, nom, description):
+        dossier = Path(dossier)
+        self.offsets = np.load(dossier / f"{nom}.offsets.npy")
+        blob_path = dossier / f"{nom}.utf8"
+        # np.memmap refuse un fichier vide
+        self.blob = np.memmap(blob_path, dtype=np.uint8, mode="r") if blob_path.stat().st_size > 0 else np.empty(0, dtype=np.uint8)
+        self.manquants = np.load(dossier / f"{nom}.null.npy") if description.get("nulls") else None
+    #end __init__
+
+    def __len__(self):
+        return len(self.offsets) - 1
+    #end __len__
+
+    def get(self, lignes):
+        """
+        textes des lignes demandées
+        Args:
+            lignes: positions des critiques
+        Returns:
+            list: textes (None pour les manquants)
+        """
+        lignes = np.atleast_1d(np.asarray(lignes, dtype=np.int64))
+        textes = [self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8") for i in lignes]
+        if self.manquants is not None:
+            textes = [None if self.manquants[i] else texte for i, texte in zip(lignes, textes)]
+        #end if
+        return textes
+    #end get
+
+    @property
+    def nbytes(self):
+        """mémoire privée (les offsets), le blob est dans le page cache"""
+        return self.offsets.nbytes
+    #end nbytes
+#end TextStore
+
+def write_columnar(film_path, dataF, exclure=COLONNES_EXCLUES):
+    """
+    écrit les métadonnées d'un film au format colonnes (dossier metadata/)
+    Args:
+        film_path: dossier du film
+        dataF: DataFrame des métadonnées
+        exclure: colonnes non sauvegardées
+    Returns:
+        Path: dossier écrit
+    """
+    try:
+        film_path = Path(film_path)
+        dossier_tmp = film_path / (NOM_DOSSIER + ".tmp")
+        shutil.rmtree(dossier_tmp, ignore_errors=True)
+        dossier_tmp.mkdir(parents=True)
+
+        colonnes = {}
+        for nom in dataF.columns:
+            if nom in exclure:
+                continue
+            #end if
+            serie = dataF[nom]
+            if serie.dtype == object or pd.api.types.is_string_dtype(serie.dtype):
+                colonnes[nom] = write_string_column(dossier_tmp, nom, serie)
+            else:
+                tableau = serie.to_numpy()
+                save_npy(dossier_tmp / f"{nom}.npy", tableau)
+                colonnes[nom] = {"type": "numeric", "dtype": tableau.dtype.str}
+            #end if
+        #end for
+
+        schema = {"version": VERSION, "n": len(dataF), "colonnes": colonnes}
+        (dossier_tmp / NOM_SCHEMA).write_text(json.dumps(schema, indent=2), encoding="utf-8")
+
+        # remplacement du dossier précédent
+        dossier = film_path / NOM_DOSSIER
+        dossier_ancien = film_path / (NOM_DOSSIER + ".old")
+        shutil.rmtree(dossier_ancien, ignore_errors=True)
+        if dossier.exists():
+            dossier.rename(dossier_ancien)
+        #end if
+        dossier_tmp.rename(dossier)
+        shutil.rmtree(dossier_ancien, ignore_errors=True)
+
+        logger.info(f"métadonnées écrites (colonnes): {dossier} ({len(dataF)} lignes, {len(colonnes)} colonnes)")
+        return dossier
+    except Exception as ex:
+        logger.error(f"erreur écriture métadonnées {film_path}: {ex}")
+        raise
+#end write_columnar
+
+def read_columnar(film_path, mmap=False, colonnes_paresseuses=()):
+    """
+    charge les métadonnées d'un film au format colonnes
+    Args:
+        film_path: dossier du film
+        mmap: colonnes numériques mappées en lecture seule
+        colonnes_paresseuses: colonnes texte non chargées dans le DataFrame (voir TextStore)
+    Returns:
+        tuple:(DataFrame des métadonnées, {colonne: TextStore})
+    """
+    dossier = Path(film_path) / NOM_DOSSIER
+    schema = json.loads((dossier / NOM_SCHEMA).read_text(encoding="utf-8"))
+    if schema.get("version") != VERSION:
+        raise ValueError(f"version du format métadonnées non supportée ({schema.get('version')}): {dossier}")
+    #end if
+
+    colonnes = {}
+    textes = {}
+    for nom, description in schema["colonnes"].items():
+        if description["type"] == "string" and nom in colonnes_paresseuses:
+            textes[nom] = TextStore(dossier, nom, description)
+            if len(textes[nom]) != schema["n"]:
+                raise ValueError(f"colonne '{nom}' incohérente dans {dossier}")
+            #end if
+            continue
+        elif description["type"] == "string":
+            colonnes[nom] = read_string_column(dossier, nom, description)
+        else:
+            colonnes[nom] = np.load(dossier / f"{nom}.npy", mmap_mode="r" if mmap else None)
+        #end if
+        if len(colonnes[nom]) != schema["n"]:
+            raise ValueError(f"colonne '{nom}' incohérente dans {dossier}")
+        #end if
+    #end for
+    return pd.DataFrame(colonnes, index=pd.RangeIndex(schema["n"]), copy=False), textes
+#end read_columnar
+
+def has_columnar(film_path):
+    """le film a-t-il des métadonnées au format colonnes"""
+    return (Path(film_path) / NOM_DOSSIER / NOM_SCHEMA).exists()
+#end has_columnar
+
+def main():
+    """convertit les metadata.pkl existants (base courante de data/processed/<film>) au format colonnes"""
+    try:
+        data_path = Path(__file__).parent.parent.parent / "data" / "processed"
+        for film_path in sorted(p for p in data_path.iterdir() if p.is_dir()):
+            pkl_path = base_dir(film_path) / "metadata.pkl"
+            if pkl_path.exists():
+                write_columnar(pkl_path.parent, pd.read_pickle(pkl_path)) # fichiers de confiance uniquement
+                refresh_manifest(film_path)
+            #end if
+        #end for
+    except Exception as ex:
+        logger.error(f"erreur conversion métadonnées: {ex}")
+        raise
+#end main
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Ici, on gère les signaux des critiques utilisés par le score hybride (popularité, récence)
+
+Format (dans le dossier du film, à coté de embeddings.npy + metadata/):
+    - features/popularity.npy : float32 log(1 + vues + POIDS_LIKES * likes) par critique
+    - features/days.npy       : float32 date de la critique en jours depuis 1970 (-inf si inconnue)
+
+Expl: les signaux sont calculés une fois à l'ingestion (meme ordre que les vecteurs), la
+    recommandation n'a plus qu'à lire les lignes des candidats et faire une expression
+    vectorisée (voir recommandation/scoring.py). Une date inconnue vaut -inf jours:
+    sa récence exp2(-age / demi_vie) vaut 0 sans cas particulier.
+    Les films sans fichiers (anciens formats, segments delta) les calculent au chargement.
+
+Auteur: Jo Kabonga
+Date: 18/10/2026
+"""
+
+import logging
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+try:
+    from .storage import save_npy
+    from .columnar import read_columnar, has_columnar
+    from .snapshot import base_dir, refresh_manifest
+except ImportError:
+    from storage import save_npy # execution directe du module
+    from columnar import read_columnar, has_columnar
+    from snapshot import base_dir, refresh_manifest
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+logger = logging.getLogger(__name__)
+
+NOM_DOSSIER = "features"
+FICHIER_POPULARITE = "popularity.npy"
+FICHIER_JOURS = "days.npy"
+POIDS_LIKES = 10.0 # un like compte plus qu'une vue
+SECONDES_PAR_JOUR = 86400.0
+
+def compute_features(dataF):
+    """
+    signaux des critiques à partir des métadonnées (colonnes absentes -> 0 / date inconnue)
+    Args:
+        dataF: métadonnées (review_hits, gen_review_like_count, review_date_creation)
+    Returns:
+        dict: {'popularite': float32 (n,), 'jours': float32 (n,)}
+    """
+    n = len(dataF)
+    vues = np.zeros(n, dtype=np.float64)
+    likes = np.zeros(n, dtype=np.float64)
+    if 'review_hits' in dataF.columns:
+        vues = pd.to_numeric(dataF['review_hits'], errors='coerce').fillna(0).clip(lower=0).to_numpy(dtype=np.float64)
+    #end if
+    if 'gen_review_like_count' in dataF.columns:
+        likes = pd.to_numeric(dataF['gen_review_like_count'], errors='coerce').fillna(0).clip(lower=0).to_numpy(dtype=np.float64)
+    #end if
+    popularite = np.log1p(vues + POIDS_LIKES * likes).astype(np.float32)
+
+    jours = np.full(n, -np.inf, dtype=np.float32)
+    if 'review_date_creation' in dataF.columns:
+        dates = pd.to_datetime(dataF['review_date_creation'], errors='coerce').to_numpy(dtype="datetime64[s]")
+        connue = ~np.isnat(dates)
+        jours[connue] = dates[connue].astype(np.int64) / SECONDES_PAR_JOUR
+    #end if
+    return {'popularite': popularite, 'jours': jours}
+#end compute_features
+
+def write_features(film_path, dataF):
+    """
+    calcule et écrit les signaux d'un film (écritures atomiques)
+    Returns:
+        Path: dossier des signaux
+    """
+    try:
+        dossier = Path(film_path) / NOM_DOSSIER
+        dossier.mkdir(parents=True, exist_ok=True)
+        features = compute_features(dataF)
+        save_npy(dossier / FICHIER_POPULARITE, features['popularite'])
+        save_npy(dossier / FICHIER_JOURS, features['jours'])
+        return dossier
+    except Exception as ex:
+        logger.error(f"erreur écriture des signaux {film_path}: {ex}")
+        raise
+#end write_features
+
+def read_features(film_path, dataF):
+    """
+    signaux d'un film: fichiers écrits à l'ingestion, sinon calculés depuis les métadonnées
+    Args:
+        film_path: dossier du film
+        dataF: métadonnées de la base (repli et vérification de la taille)
+    Returns:
+        dict: {'popularite', 'jours'}
+    """
+    dossier = Path(film_path) / NOM_DOSSIER
+    if (dossier / FICHIER_POPULARITE).exists() and (dossier / FICHIER_JOURS).exists():
+        features = {'popularite': np.load(dossier / FICHIER_POPULARITE), 'jours': np.load(dossier / FICHIER_JOURS)}
+        if all(len(tableau) == len(dataF) for tableau in features.values()):
+            return features
+        #end if
+        logger.warning(f"signaux obsolètes pour '{Path(film_path).name}', recalculés")
+    #end if
+    return compute_features(dataF)
+#end read_features
+
+def main():
+    """écrit les signaux de tous les films de data/processed (format colonnes)"""
+    try:
+        data_path = Path(__file__).parent.parent.parent / "data" / "processed"
+        for film_path in sorted(p for p in data_path.iterdir() if p.is_dir()):
+            base = base_dir(film_path)
+            if has_columnar(base):
+                write_features(base, read_columnar(base)[0])
+                refresh_manifest(film_path)
+                logger.info(f"signaux écrits pour '{film_path.name}'")
+            #end if
+        #end for
+    except Exception as ex:
+        logger.error(f"erreur écriture des signaux: {ex}")
+        raise
+#end main
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Ici, on gère les filtres de recherche sur les métadonnées d'un film (note, date, vues, likes, auteur)
+
+Expl: pour chaque colonne filtrée, un index trié (ordre des lignes + valeurs triées) est
+    construit une fois par instantané du film. Un filtre par intervalle ou par égalité devient
+    deux recherches dichotomiques et donne un masque booléen (bitmap) des lignes autorisées.
+    Le masque est appliqué pendant la sélection du top-k (scores des lignes exclues à -inf),
+    pas apres: on obtient toujours k résultats s'il existe k critiques qui passent le filtre.
+
+Filtres (dict, clés optionnelles):
+    - rating_min / rating_max : note
+    - date_min / date_max     : date de la critique (str ISO ou datetime)
+    - hits_min / likes_min    : vues / likes minimum
+    - exclude_user_id         : exclure les critiques d'un auteur
+
+Auteur: Jo Kabonga
+Date: 18/10/2026
+"""
+
+import numpy as np
+import pandas as pd
+
+# filtre -> (colonne, borne)
+FILTRES_INTERVALLE = {
+    'rating_min': ('rating', 'min'),
+    'rating_max': ('rating', 'max'),
+    'date_min': ('review_date_creation', 'min'),
+    'date_max': ('review_date_creation', 'max'),
+    'hits_min': ('review_hits', 'min'),
+    'likes_min': ('gen_review_like_count', 'min'),
+}
+FILTRE_AUTEUR = 'exclude_user_id'
+
+class SortedIndex:
+    """
+    Index trié d'une colonne: lignes dans l'ordre des valeurs (manquantes à la fin)
+    """
+
+    def __init__(self, valeurs):
+        valeurs = np.asarray(valeurs)
+        self.ordre = np.argsort(valeurs, kind="stable")
+        self.valeurs_triees = valeurs[self.ordre]
+        self.n = len(valeurs)
+        # NaN / NaT triés à la fin: jamais dans un intervalle
+        if self.valeurs_triees.dtype.kind == "f":
+            self.n_valides = int(self.n - np.isnan(self.valeurs_triees).sum())
+        elif self.valeurs_triees.dtype.kind == "M":
+            self.n_valides = int(self.n - np.isnat(self.valeurs_triees).sum())
+        else:
+            self.n_valides = self.n
+        #end if
+    #end __init__
+
+    def _convertir(self, valeur):
+        """valeur de filtre dans le type de la colonne"""
+        if self.valeurs_triees.dtype.kind == "M":
+            return np.datetime64(pd.Timestamp(valeur).to_datetime64(), "s")
+        #end if
+        if self.valeurs_triees.dtype.kind in "iu":
+            return int(valeur)
+        #end if
+        if self.valeurs_triees.dtype.kind == "f":
+            return float(valeur)
+        #end if
+        return str(valeur)
+    #end _convertir
+
+    def between(self, bas=None, haut=None):
+        """lignes dont la valeur est dans [bas, haut] (bornes optionnelles)"""
+        valides = self.valeurs_triees[:self.n_valides]
+        debut = 0 if bas is None else int(np.searchsorted(valides, self._convertir(bas), side="left"))
+        fin = self.n_valides if haut is None else int(np.searchsorted(valides, self._convertir(haut), side="right"))
+        return self.ordre[debut:max(debut, fin)]
+    #end between
+
+    def equal(self, valeur):
+        """lignes dont la valeur est égale à valeur"""
+        return self.between(valeur, valeur)
+    #end equal
+
+    @property
+    def nbytes(self):
+        return self.ordre.nbytes + self.valeurs_triees.nbytes
+    #end nbytes
+#end SortedIndex
+
+def normalize_filters(filtres):
+    """
+    filtres sans valeurs None, sous forme de tuple trié (clé de cache)
+    Returns:
+        tuple ou None si aucun filtre
+    """
+    if not filtres:
+        return None
+    #end if
+    inconnus = set(filtres) - set(FILTRES_INTERVALLE) - {FILTRE_AUTEUR}
+    if inconnus:
+        raise ValueError(f"filtres inconnus: {sorted(inconnus)}")
+    #end if
+    actifs = tuple(sorted((cle, str(valeur)) for cle, valeur in filtres.items() if valeur is not None))
+    return actifs or None
+#end normalize_filters
+
+def build_mask(n, filtres, index_colonne):
+    """
+    masque des lignes autorisées par les filtres
+    Args:
+        n: nombre de lignes du film
+        filtres: dict des filtres (voir en-tête)
+        index_colonne: fonction colonne -> SortedIndex (ou None si la colonne n'existe pas)
+    Returns:
+        np.ndarray bool (n,)
+    """
+    masque = np.ones(n, dtype=bool)
+    bornes = {}
+    for cle, valeur in filtres.items():
+        if valeur is None or cle == FILTRE_AUTEUR:
+            continue
+        #end if
+        colonne, cote = FILTRES_INTERVALLE[cle]
+        bornes.setdefault(colonne, {})[cote] = valeur
+    #end for
+    for colonne, intervalle in bornes.items():
+        index = index_colonne(colonne)
+        if index is None:
+            raise ValueError(f"filtre impossible: colonne '{colonne}' absente des métadonnées du film")
+        #end if
+        autorise = np.zeros(n, dtype=bool)
+        autorise[index.between(intervalle.get('min'), intervalle.get('max'))] = True
+        masque &= autorise
+    #end for
+    if filtres.get(FILTRE_AUTEUR) is not None:
+        index = index_colonne('user_id')
+        if index is None:
+            raise ValueError("filtre impossible: colonne 'user_id' absente des métadonnées du film")
+        #end if
+        masque[index.equal(filtres[FILTRE_AUTEUR])] = False
+    #end if
+    return masque
+#end build_mask
@@ -0,0 +1,155 @@
+"""
+Ici, on précalcule la table des k plus proches voisins de chaque critique d'un film
+
+Expl: pour un corpus figé, la réponse pour (film, critique) ne change pas entre deux
+    requetes. On calcule hors ligne, par blocs de lignes (produit matriciel bloc x n),
+    les K voisins de chaque critique (auto-recommandation exclue) et on les stocke
+    à coté de embeddings.npy:
+        - neighbours_idx.npy    : int32 (n, K) indices des voisins, triés par score décroissant
+        - neighbours_scores.npy : float32 (n, K) scores de similarité (meme précision que la recherche
+                                  directe: meme réponse au seuil près, table présente ou non)
+        - neighbours_source.txt : signature des vecteurs de calcul (voir storage.source_signature),
+                                  une table périmée est ignorée au chargement
+    Le service d'une requete devient une simple lecture de ligne.
+
+Auteur: Jo Kabonga
+Date: 18/10/2026
+"""
+
+import logging
+import numpy as np
+from pathlib import Path
+
+try:
+    from .storage import save_npy, write_stamp, stamp_matches
+    from .snapshot import base_dir, refresh_manifest
+except ImportError:
+    from storage import save_npy, write_stamp, stamp_matches # execution directe du module
+    from snapshot import base_dir, refresh_manifest
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+logger = logging.getLogger(__name__)
+
+FICHIER_INDICES = "neighbours_idx.npy"
+FICHIER_SCORES = "neighbours_scores.npy"
+FICHIER_SOURCE = "neighbours_source.txt"
+K_DEFAUT = 50 # couvre k<=10 de l'API avec de la marge pour le seuil
+MEMOIRE_BLOC = 256 * 1024 * 1024 # octets max pour la matrice de scores d'un bloc
+
+def build_neighbour_table(embeddings, k=K_DEFAUT, block_size=None):
+    """
+    Calcule les k voisins de chaque vecteur par multiplication matricielle par blocs
+    Args:
+        embeddings: matrice (n, dim) des vecteurs normalisés
+        k: nombre de voisins par critique (borné à n-1)
+        block_size: nombre de lignes par bloc (par defaut selon MEMOIRE_BLOC)
+    Returns:
+        tuple:(indices int32 (n, k), scores float32 (n, k))
+    """
+    try:
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        n = len(embeddings)
+        k = max(0, min(k, n - 1))
+        if block_size is None:
+            block_size = max(1, min(1024, MEMOIRE_BLOC // max(1, n * 4)))
+        #end if
+
+        indices = np.empty((n, k), dtype=np.int32)
+        scores = np.empty((n, k), dtype=np.float32)
+        if k == 0:
+            return indices, scores
+        #end if
+
+        for debut in range(0, n, block_size):
+            fin = min(debut + block_size, n)
+            scores_bloc = embeddings[debut:fin] @ embeddings.T # (bloc, n)
+            lignes = np.arange(fin - debut)
+            scores_bloc[lignes, debut + lignes] = -np.inf # auto-recommandation exclue
+
+            # top-k par ligne puis tri des k seulement
+            indices_bloc = np.argpartition(scores_bloc, -k, axis=1)[:, -k:]
+            scores_k = np.take_along_axis(scores_bloc, indices_bloc, axis=1)
+            ordre = np.argsort(-scores_k, axis=1, kind="stable")
+
+            indices[debut:fin] = np.take_along_axis(indices_bloc, ordre, axis=1)
+            scores[debut:fin] = np.clip(np.take_along_axis(scores_k, ordre, axis=1), -1.0, 1.0)
+        #end for
+
+        logger.info(f"table des voisins calculée: {n} critiques x {k} voisins")
+        return indices, scores
+    except Exception as ex:
+        logger.error(f"erreur calcul table des voisins: {ex}")
+        raise
+#end build_neighbour_table
+
+def save_neighbour_table(film_path, indices, scores):
+    """sauvegarde la table des voisins dans le dossier du film"""
+    film_path = Path(film_path)
+    save_npy(film_path / FICHIER_INDICES, indices.astype(np.int32, copy=False))
+    save_npy(film_path / FICHIER_SCORES, scores.astype(np.float32, copy=False))
+    write_stamp(film_path / FICHIER_SOURCE, film_path) # en dernier: la table est complète
+    logger.info(f"table des voisins sauvegardée: {film_path}")
+    return film_path / FICHIER_INDICES, film_path / FICHIER_SCORES
+#end save_neighbour_table
+
+def load_neighbour_table(film_path, mmap=False):
+    """
+    Charge la table des voisins d'un film si elle existe
+    Returns:
+        tuple:(indices, scores) ou None si pas de table ou table calculée sur d'autres vecteurs
+    """
+    film_path = Path(film_path)
+    indices_path = film_path / FICHIER_INDICES
+    scores_path = film_path / FICHIER_SCORES
+    if not (indices_path.exists() and scores_path.exists()):
+        return None
+    #end if
+    if not stamp_matches(film_path / FICHIER_SOURCE, film_path):
+        logger.warning(f"table des voisins calculée sur d'autres vecteurs, ignorée: {film_path}")
+        return None
+    #end if
+    mmap_mode = "r" if mmap else None
+    indices = np.load(indices_path, mmap_mode=mmap_mode)
+    scores = np.load(scores_path, mmap_mode=mmap_mode)
+    if indices.shape != scores.shape:
+        raise ValueError(f"table des voisins incohérente: {film_path}")
+    #end if
+    if scores.dtype != np.float32:
+        # ancien format float16: scores arrondis, réponses différentes de la recherche directe près du seuil
+        logger.warning(f"table des voisins en {scores.dtype}, ignorée (à recalculer: python src/vector_store/neighbours.py): {film_path}")
+        return None
+    #end if
+    return indices, scores
+#end load_neighbour_table
+
+def build_film_neighbours(film_path, k=K_DEFAUT):
+    """
+    calcule et sauvegarde la table d'une base de film (appelée par segments.write_base)
+    """
+    film_path = Path(film_path)
+    embeddings = np.load(film_path / "embeddings.npy")
+    indices, scores = build_neighbour_table(embeddings, k=k)
+    return save_neighbour_table(film_path, indices, scores)
+#end build_film_neighbours
+
+def main():
+    """calcule la table des voisins de tous les films de data/processed"""
+    try:
+        data_path = Path(__file__).parent.parent.parent / "data" / "processed"
+        for film_path in sorted(p for p in data_path.iterdir() if p.is_dir()):
+            if (base_dir(film_path) / "embeddings.npy").exists():
+                build_film_neighbours(base_dir(film_path))
+                refresh_manifest(film_path)
+            #end if
+        #end for
+    except Exception as ex:
+        logger.error(f"erreur table des voisins: {ex}")
+        raise
+#end main
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Ici, on a les noyaux de recherche en NumPy pur (sans torch)
+
+Expl: les vecteurs sont déjà normalisés par Embedding.embeddings_generer
+    (normalize_embeddings=True), la similarité cosinus est donc un simple
+    produit scalaire float32 matrice x vecteur, suivi d'une sélection top-k
+    par np.argpartition (O(n)) puis d'un tri des k résultats seulement.
+
+Auteur: Jo Kabonga
+Date: 18/10/2026
+"""
+
+import numpy as np
+
+def normaliser(vecteur):
+    """normalise un vecteur (ou des lignes) en float32, norme nulle laissée telle quelle"""
+    vecteur = np.asarray(vecteur, dtype=np.float32)
+    norme = np.linalg.norm(vecteur, axis=-1, keepdims=True)
+    return vecteur / np.where(norme == 0, 1, norme)
+#end normaliser
+
+def topk_scores(scores, k):
+    """
+    Sélection des k meilleurs scores, triés par ordre décroissant
+    Args:
+        scores: vecteur des similarités (n,)
+        k: nombre de resultats
+    Returns:
+        tuple:(scores_k, indices_k)
+    """
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+    #end if
+    if k < len(scores):
+        indices = np.argpartition(scores, -k)[-k:]
+    else:
+        indices = np.arange(len(scores))
+    #end if
+    ordre = np.argsort(-scores[indices], kind="stable")
+    indices = indices[ordre]
+    return scores[indices], indices
+#end topk_scores
+
+def topk_dot(embeddings, vecteur_ref, k, masque=None):
+    """
+    Recherche exacte des k vecteurs les plus similaires (produit scalaire)
+    Args:
+        embeddings: matrice (n, dim) des vecteurs normalisés (ndarray ou memmap)
+        vecteur_ref: vecteur de la critique de reference
+        k: nombre de resultats
+        masque: lignes autorisées (bool (n,)), appliqué avant la sélection du top-k
+    Returns:
+        tuple:(scores_k, indices_k)
+    """
+    vecteur_ref = normaliser(vecteur_ref).ravel()
+    if masque is not None:
+        lignes = np.flatnonzero(masque)
+        if len(lignes) * 2 < len(embeddings):
+            # filtre sélectif: produit scalaire sur les seules lignes autorisées
+            scores_k, positions = topk_scores(np.asarray(embeddings[lignes]) @ vecteur_ref, k)
+            return np.clip(scores_k, -1.0, 1.0), lignes[positions]
+        #end if
+        scores = embeddings @ vecteur_ref
+        scores[~masque] = -np.inf
+        scores_k, indices_k = topk_scores(scores, min(k, len(lignes)))
+        return np.clip(scores_k, -1.0, 1.0), indices_k
+    #end if
+    scores = embeddings @ vecteur_ref
+    scores_k, indices_k = topk_scores(scores, k)
+    return np.clip(scores_k, -1.0, 1.0), indices_k # arrondi float32 (ex: 1.0000001 pour la critique elle-meme)
+#end topk_dot
+
+MEMOIRE_BLOC = 256 * 1024 * 1024 # octets max pour la matrice de scores d'un bloc de requetes
+
+def topk_dot_batch(embeddings, requetes, k, block_size=None):
+    """
+    Recherche exacte des k vecteurs les plus similaires pour plusieurs requetes
+    Expl: un produit matriciel (GEMM) par bloc de requetes au lieu d'une boucle
+        de produits matrice x vecteur, top-k par ligne avec argpartition.
+    Args:
+        embeddings: matrice (n, dim) des vecteurs normalisés
+        requetes: matrice (m, dim) des vecteurs de requete
+        k: nombre de resultats par requete
+        block_size: requetes par bloc (par defaut selon MEMOIRE_BLOC)
+    Returns:
+        tuple:(scores (m, k), indices (m, k)) triés par score décroissant
+    """
+    requetes = normaliser(np.atleast_2d(requetes))
+    n, m = len(embeddings), len(requetes)
+    k = min(k, n)
+    if block_size is None:
+        block_size = max(1, min(4096, MEMOIRE_BLOC // max(1, n * 4)))
+    #end if
+
+    scores_k = np.empty((m, k), dtype=np.float32)
+    indices_k = np.empty((m, k), dtype=np.int64)
+    if k <= 0:
+        return scores_k, indices_k
+    #end if
+
+    for debut in range(0, m, block_size):
+        fin = min(debut + block_size, m)
+        scores = requetes[debut:fin] @ embeddings.T # (bloc, n)
+        if k < n:
+            indices = np.argpartition(scores, -k, axis=1)[:, -k:]
+        else:
+            indices = np.broadcast_to(np.arange(n), scores.shape)
+        #end if
+        scores_bloc = np.take_along_axis(scores, indices, axis=1)
+        ordre = np.argsort(-scores_bloc, axis=1, kind="stable")
+        scores_k[debut:fin] = np.clip(np.take_along_axis(scores_bloc, ordre, axis=1), -1.0, 1.0)
+        indices_k[debut:fin] = np.take_along_axis(indices, ordre, axis=1)
+    #end for
+    return scores_k, indices_k
+#end topk_dot_batch
+
+TAILLE_BLOC_RANGE = 65536 # lignes par bloc pour la recherche par seuil
+
+def range_dot(embeddings, vecteur_ref, seuil, limite=None, block_size=TAILLE_BLOC_RANGE):
+    """
+    Recherche exacte de tous les vecteurs dont la similarité est >= seuil
+    Expl: parcours par blocs de lignes (mémoire bornée, accès séquentiel pour le mmap),
+        seuls les candidats au dessus du seuil sont gardés puis triés.
+    Args:
+        embeddings: matrice (n, dim) des vecteurs normalisés
+        vecteur_ref: vecteur de la requete
+        seuil: similarité minimale
+        limite: nombre max de resultats (les meilleurs), None -> tous
+        block_size: lignes par bloc
+    Returns:
+        tuple:(scores, indices) triés par score décroissant
+    """
+    vecteur_ref = normaliser(vecteur_ref).ravel()
+    scores_trouves, indices_trouves = [], []
+    for debut in range(0, len(embeddings), block_size):
+        scores = np.asarray(embeddings[debut:debut + block_size], dtype=np.float32) @ vecteur_ref
+        positions = np.flatnonzero(scores >= seuil)
+        scores_trouves.append(scores[positions])
+        indices_trouves.append(positions + debut)
+    #end for
+    if not scores_trouves:
+        return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+    #end if
+    scores = np.concatenate(scores_trouves)
+    indices = np.concatenate(indices_trouves).astype(np.int64)
+    scores, positions = topk_scores(scores, len(scores) if limite is None else limite)
+    return np.clip(scores, -1.0, 1.0), indices[positions]
+#end range_dot
+
+def shard_bounds(n, n_shards):
+    """bornes (debut, fin) de n_shards tranches de lignes contiguës de tailles égales (à une ligne pres)"""
+    n_shards = max(1, min(n_shards, n))
+    bornes = np.linspace(0, n, n_shards + 1).astype(np.int64)
+    return list(zip(bornes[:-1].tolist(), bornes[1:].tolist()))
+#end shard_bounds
+
+def topk_dot_sharded(embeddings, vecteur_ref, k, executor, n_shards):
+    """
+    Recherche exacte des k meilleurs vecteurs, répartie sur plusieurs coeurs
+    Expl: la matrice est découpée en tranches de lignes (vues, sans copie: meme mémoire,
+        page cache partagé si mmap). Chaque tranche fait son produit matrice x vecteur et son
+        top-k dans un thread du pool (NumPy relache le GIL), puis les top-k des tranches
+        (déjà triés) sont fusionnés: n_shards·k candidats au lieu de n.
+    Args:
+        embeddings: matrice (n, dim) des vecteurs normalisés
+        vecteur_ref: vecteur de la requete
+        k: nombre de resultats
+        executor: pool de threads (concurrent.futures)
+        n_shards: nombre de tranches
+    Returns:
+        tuple:(scores_k, indices_k)
+    """
+    vecteur_ref = normaliser(vecteur_ref).ravel()
+    def chercher(debut, fin):
+        scores_k, indices_k = topk_scores(embeddings[debut:fin] @ vecteur_ref, k)
+        return scores_k, indices_k + debut
+    #end chercher
+    resultats = list(executor.map(lambda bornes: chercher(*bornes), shard_bounds(len(embeddings), n_shards)))
+    if not resultats:
+        return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+    #end if
+    scores = np.concatenate([scores_k for scores_k, _ in resultats])
+    indices = np.concatenate([indices_k for _, indices_k in resultats])
+    scores_k, positions = topk_scores(scores, k) # fusion des top-k des tranches
+    return np.clip(scores_k, -1.0, 1.0), indices[positions]
+#end topk_dot_sharded
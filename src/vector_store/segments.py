@@ -0,0 +1,234 @@
+"""
+Ici, on gère l'ingestion incrémentale d'un film: segments delta en ajout seul + suppressions
+
+Format (dans le dossier de la base du film, à coté de embeddings.npy + metadata/, voir snapshot.py):
+    - segments/<NNNNNN>/embeddings.npy : vecteurs des critiques ajoutées (float32)
+    - segments/<NNNNNN>/metadata/      : métadonnées au format colonnes (voir columnar.py)
+    - tombstones-<NNNNNN>.npy          : int64 lignes supprimées (numérotation globale), un nouveau
+                                         fichier par suppression (tombstones.npy dans l'ancien format)
+
+Expl: les lignes sont numérotées dans l'ordre base puis segments (ordre des noms), un ajout
+    ne modifie donc jamais les lignes existantes. Une suppression (ou le remplacement d'une
+    critique) ajoute sa ligne aux tombstones, filtrées à la recherche.
+    Segments et tombstones appartiennent à leur base: une nouvelle base (write_base, utilisée
+    par la compaction et par l'ingestion complète) est écrite dans un nouveau dossier, sans
+    segments ni tombstones, reconstruit la table des voisins / l'index IVF demandés, puis
+    est publiée en une étape (snapshot.publish_base).
+
+Auteur: Jo Kabonga
+Date: 18/10/2026
+"""
+
+import logging
+import shutil
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+try:
+    from .storage import save_npy, write_vectors, NOM_FICHIER
+    from .columnar import write_columnar, read_columnar, has_columnar
+    from .neighbours import FICHIER_INDICES, build_film_neighbours
+    from .ann_index import FICHIER_CENTROIDES, build_film_ann_index
+    from .snapshot import (base_dir, new_base_dir, publish_base, read_snapshot,
+                           list_segment_dirs, latest_tombstones, DOSSIER_SEGMENTS, PREFIXE_TOMBSTONES, _numero)
+    from .features import write_features
+except ImportError:
+    from storage import save_npy, write_vectors, NOM_FICHIER # execution directe du module
+    from columnar import write_columnar, read_columnar, has_columnar
+    from neighbours import FICHIER_INDICES, build_film_neighbours
+    from ann_index import FICHIER_CENTROIDES, build_film_ann_index
+    from snapshot import (base_dir, new_base_dir, publish_base, read_snapshot,
+                          list_segment_dirs, latest_tombstones, DOSSIER_SEGMENTS, PREFIXE_TOMBSTONES, _numero)
+    from features import write_features
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+logger = logging.getLogger(__name__)
+
+NOM_DOSSIER = DOSSIER_SEGMENTS
+
+def list_segments(film_path):
+    """dossiers des segments delta de la base courante d'un film, dans l'ordre d'ajout (hors temporaires)"""
+    return list_segment_dirs(base_dir(film_path))
+#end list_segments
+
+def write_base(film_path, embeddings, dataF, vecteurs_mmap=True, k_voisins=None, taille_min_ann=None):
+    """
+    écrit et publie une nouvelle base complète du film (sans segments ni tombstones)
+    Args:
+        film_path: dossier du film
+        embeddings: matrice (n, dim) des vecteurs
+        dataF: métadonnées alignées sur les vecteurs
+        vecteurs_mmap: écrire aussi embeddings.vec (voir storage.py)
+        k_voisins: voisins par critique de la table précalculée (None -> pas de table)
+        taille_min_ann: critiques à partir desquelles l'index IVF est construit (None -> pas d'index)
+    Returns:
+        Path: dossier de la base publiée
+    """
+    try:
+        dossier = new_base_dir(film_path)
+        save_npy(dossier / "embeddings.npy", np.asarray(embeddings, dtype=np.float32))
+        if vecteurs_mmap:
+            write_vectors(dossier / NOM_FICHIER, embeddings) # format page-aligné pour le mmap
+        #end if
+        write_columnar(dossier, dataF) # métadonnées en colonnes (sans pickle)
+        write_features(dossier, dataF) # signaux popularité / récence du score hybride
+        if k_voisins:
+            build_film_neighbours(dossier, k=k_voisins)
+        #end if
+        if taille_min_ann is not None:
+            build_film_ann_index(dossier, taille_min=taille_min_ann)
+        #end if
+        manifest = publish_base(film_path, dossier) # la base devient visible ici seulement
+        return Path(film_path) / manifest['base']
+    except Exception as ex:
+        logger.error(f"erreur écriture de la base {film_path}: {ex}")
+        raise
+#end write_base
+
+def append_segment(film_path, embeddings, dataF):
+    """
+    écrit un nouveau segment delta (dossier temporaire puis renommage)
+    Args:
+        film_path: dossier du film
+        embeddings: matrice (m, dim) des vecteurs ajoutés
+        dataF: métadonnées alignées sur les vecteurs (colonne 'id' obligatoire)
+    Returns:
+        Path: dossier du segment
+    """
+    try:
+        if len(embeddings) != len(dataF):
+            raise ValueError("Nombre de vecteurs diff de metadonnées(incompatible)")
+        #end if
+        if 'id' not in dataF.columns:
+            raise ValueError("colonne 'id' manquante")
+        #end if
+        segments = list_segments(film_path)
+        numero = int(segments[-1].name) + 1 if segments else 1
+        segment = base_dir(film_path) / NOM_DOSSIER / f"{numero:06d}"
+        segment_tmp = segment.with_name(segment.name + ".tmp")
+        shutil.rmtree(segment_tmp, ignore_errors=True)
+        segment_tmp.mkdir(parents=True)
+
+        save_npy(segment_tmp / "embeddings.npy", np.asarray(embeddings, dtype=np.float32))
+        write_columnar(segment_tmp, dataF.reset_index(drop=True))
+        segment_tmp.rename(segment)
+        logger.info(f"segment ajouté: {segment} ({len(dataF)} critiques)")
+        return segment
+    except Exception as ex:
+        logger.error(f"erreur ajout segment {film_path}: {ex}")
+        raise
+#end append_segment
+
+def read_segments(segments):
+    """
+    charge des segments delta (petits, texte compris)
+    Args:
+        segments: dossiers des segments (ceux de l'instantané, voir snapshot.read_snapshot)
+    Returns:
+        tuple:(vecteurs (m, dim), DataFrame) ou (None, None) sans segment
+    """
+    if not segments:
+        return None, None
+    #end if
+    vecteurs = [np.load(segment / "embeddings.npy") for segment in segments]
+    metadata = [read_columnar(segment)[0] for segment in segments]
+    return np.concatenate(vecteurs).astype(np.float32, copy=False), pd.concat(metadata, ignore_index=True)
+#end read_segments
+
+def read_tombstones(path):
+    """lignes supprimées (int64 trié, vide si aucune)
+    Args:
+        path: fichier de tombstones de l'instantané (None si aucune suppression)
+    """
+    if path is None or not Path(path).exists():
+        return np.empty(0, dtype=np.int64)
+    #end if
+    return np.load(path)
+#end read_tombstones
+
+def add_tombstones(film_path, lignes):
+    """
+    ajoute des lignes supprimées dans un nouveau fichier de la base courante (les fichiers
+    publiés ne sont jamais réécrits), les fichiers plus anciens que le précédent sont supprimés
+    """
+    base = base_dir(film_path)
+    precedent = latest_tombstones(base)
+    lignes = np.union1d(read_tombstones(precedent), np.asarray(lignes, dtype=np.int64))
+    numero = _numero(precedent.name, PREFIXE_TOMBSTONES) + 1 if precedent is not None else 1
+    save_npy(base / f"{PREFIXE_TOMBSTONES}-{numero:06d}.npy", lignes)
+    for ancien in base.glob(PREFIXE_TOMBSTONES + "*.npy"):
+        if precedent is not None and ancien.name not in (precedent.name, f"{PREFIXE_TOMBSTONES}-{numero:06d}.npy"):
+            ancien.unlink(missing_ok=True)
+        #end if
+    #end for
+    return lignes
+#end add_tombstones
+
+def has_pending(film_path):
+    """le film a-t-il des segments ou des suppressions à compacter"""
+    etat = read_snapshot(film_path)
+    return bool(etat['segments']) or etat['tombstones'] is not None
+#end has_pending
+
+def compact_film(film_path):
+    """
+    fusionne base + segments sans les lignes supprimées en une nouvelle base puis publie l'instantané
+    Returns:
+        dict: {'critiques', 'segments', 'supprimees'}
+    """
+    try:
+        film_path = Path(film_path)
+        etat = read_snapshot(film_path)
+        base, segments = etat['base'], etat['segments']
+        tombstones = read_tombstones(etat['tombstones'])
+
+        embeddings = np.load(base / "embeddings.npy")
+        if has_columnar(base):
+            metadata, _ = read_columnar(base)
+        else:
+            metadata = pd.read_pickle(base / "metadata.pkl").drop(columns=['embedding'], errors='ignore') # fichiers de confiance uniquement
+        #end if
+        embeddings_delta, metadata_delta = read_segments(segments)
+        if embeddings_delta is not None:
+            embeddings = np.concatenate([embeddings, embeddings_delta])
+            metadata = pd.concat([metadata, metadata_delta], ignore_index=True)
+        #end if
+        garder = np.ones(len(embeddings), dtype=bool)
+        garder[tombstones[tombstones < len(garder)]] = False
+        embeddings, metadata = embeddings[garder], metadata[garder].reset_index(drop=True)
+
+        # nouvelle base dans un nouveau dossier (tables dérivées comprises si le film en avait),
+        # publiée en une étape: les lecteurs voient l'ancienne base + segments ou la nouvelle seule
+        k_voisins = np.load(base / FICHIER_INDICES, mmap_mode="r").shape[1] if (base / FICHIER_INDICES).exists() else None
+        write_base(film_path, embeddings, metadata, vecteurs_mmap=(base / NOM_FICHIER).exists(),
+                   k_voisins=k_voisins, taille_min_ann=0 if (base / FICHIER_CENTROIDES).exists() else None)
+
+        rapport = {'critiques': len(embeddings), 'segments': len(segments), 'supprimees': int((~garder).sum())}
+        logger.info(f"film '{film_path.name}' compacté: {rapport}")
+        return rapport
+    except Exception as ex:
+        logger.error(f"erreur compaction {film_path}: {ex}")
+        raise
+#end compact_film
+
+def main():
+    """compacte tous les films de data/processed qui ont des segments ou des suppressions"""
+    try:
+        data_path = Path(__file__).parent.parent.parent / "data" / "processed"
+        for film_path in sorted(p for p in data_path.iterdir() if p.is_dir()):
+            if has_pending(film_path):
+                compact_film(film_path)
+            #end if
+        #end for
+    except Exception as ex:
+        logger.error(f"erreur compaction: {ex}")
+        raise
+#end main
+
+if __name__ == "__main__":
+    main()
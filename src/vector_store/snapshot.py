@@ -0,0 +1,295 @@
+"""
+Ici, on gère les instantanés versionnés des films (manifest.json)
+
+Expl: publier un nouvel instantané d'un film = écrire ses fichiers (renommages atomiques,
+    voir storage.save_npy) puis, en dernier, le manifest avec une version incrémentée et
+    l'empreinte des fichiers. Le serveur compare la version sur disque à la version chargée
+    pour recharger le film en arrière-plan puis l'échanger atomiquement (VectorStore.reload_film).
+
+Bases versionnées: une nouvelle base (ingestion complète, compaction) est écrite entièrement
+    dans un dossier base-<NNNNNN>.tmp (vecteurs, métadonnées, signaux, tables dérivées), renommé
+    puis désigné par le manifest ("base"). Les segments delta et les tombstones vivent dans le
+    dossier de leur base, le manifest liste ceux de l'instantané ("segments", "tombstones") et
+    les fichiers de tombstones ne sont jamais réécrits (nouveau nom à chaque suppression):
+    un lecteur qui suit le manifest ne voit jamais une base neuve avec des segments périmés.
+    La base précédente est gardée pour les lectures en cours, les plus anciennes sont supprimées.
+    Sans "base" dans le manifest (ancien format), les fichiers sont à la racine du film; la
+    taille, la date et l'inode de chaque fichier publié ("stats") permettent au lecteur de rejeter un
+    mélange de fichiers publiés et non publiés.
+
+Auteur: Jo Kabonga
+Date: 18/10/2026
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from pathlib import Path
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+logger = logging.getLogger(__name__)
+
+NOM_MANIFEST = "manifest.json"
+TAILLE_LECTURE = 1024 * 1024
+PREFIXE_BASE = "base-" # dossiers des bases versionnées
+DOSSIER_SEGMENTS = "segments" # voir segments.py
+PREFIXE_TOMBSTONES = "tombstones"
+# fichiers dont la taille / date est vérifiée à la lecture (les tables dérivées portent la signature de leur base)
+FICHIERS_VERIFIES = ("embeddings.", "metadata/", "metadata.pkl", DOSSIER_SEGMENTS + "/", PREFIXE_TOMBSTONES)
+
+def _fichiers_film(film_path):
+    """fichiers de données d'un film, sous-dossiers compris (hors manifest, fichiers temporaires et autres bases)"""
+    film_path = Path(film_path)
+    return sorted(
+        p for p in film_path.rglob("*")
+        if p.is_file() and p.name != NOM_MANIFEST
+        and not any(partie.endswith((".tmp", ".old")) or partie.startswith(PREFIXE_BASE) for partie in p.relative_to(film_path).parts)
+    )
+#end _fichiers_film
+
+def _stat(path):
+    """taille, date et inode d'un fichier (un fichier remplacé par renommage change d'inode)"""
+    info = Path(path).stat()
+    return [info.st_size, info.st_mtime_ns, info.st_ino]
+#end _stat
+
+def _numero(nom, prefixe):
+    """numéro d'un dossier / fichier versionné (base-000003 -> 3, tombstones-000002.npy -> 2), 0 sinon"""
+    suffixe = nom[len(prefixe):].lstrip("-").split(".")[0]
+    return int(suffixe) if nom.startswith(prefixe) and suffixe.isdigit() else 0
+#end _numero
+
+def base_dir(film_path, manifest=None):
+    """dossier de la base courante: celui désigné par le manifest, sinon le dossier du film (ancien format)"""
+    film_path = Path(film_path)
+    manifest = read_manifest(film_path) if manifest is None else manifest
+    if manifest is not None and manifest.get("base"):
+        return film_path / manifest["base"]
+    #end if
+    return film_path
+#end base_dir
+
+def list_segment_dirs(base):
+    """segments delta d'une base, dans l'ordre d'ajout (hors temporaires)"""
+    dossier = Path(base) / DOSSIER_SEGMENTS
+    if not dossier.exists():
+        return []
+    #end if
+    return sorted(p for p in dossier.iterdir() if p.is_dir() and not p.name.endswith(".tmp"))
+#end list_segment_dirs
+
+def latest_tombstones(base):
+    """fichier de tombstones le plus récent d'une base (None si aucune suppression)"""
+    fichiers = [p for p in Path(base).glob(PREFIXE_TOMBSTONES + "*.npy")]
+    return max(fichiers, key=lambda p: _numero(p.name, PREFIXE_TOMBSTONES)) if fichiers else None
+#end latest_tombstones
+
+def checksum_file(path):
+    """empreinte sha256 d'un fichier (lecture par blocs)"""
+    empreinte = hashlib.sha256()
+    with open(path, "rb") as fichier:
+        for bloc in iter(lambda: fichier.read(TAILLE_LECTURE), b""):
+            empreinte.update(bloc)
+        #end for
+    #end with
+    return empreinte.hexdigest()
+#end checksum_file
+
+def read_manifest(film_path):
+    """manifest d'un film ou None s'il n'a pas encore été publié"""
+    path = Path(film_path) / NOM_MANIFEST
+    if not path.exists():
+        return None
+    #end if
+    return json.loads(path.read_text(encoding="utf-8"))
+#end read_manifest
+
+def write_manifest(film_path, base=None):
+    """
+    publie un nouvel instantané du film: version précédente + 1 et empreinte des fichiers
+    (à appeler apres l'écriture de tous les fichiers du film)
+    Args:
+        film_path: dossier du film
+        base: nom du dossier de la nouvelle base (None -> base du manifest précédent)
+    Returns:
+        dict: le manifest écrit
+    """
+    try:
+        film_path = Path(film_path)
+        precedent = read_manifest(film_path)
+        if base is None and precedent is not None:
+            base = precedent.get("base")
+        #end if
+        dossier = film_path / base if base else film_path
+        chemins = _fichiers_film(dossier)
+        fichiers = {p.relative_to(film_path).as_posix(): checksum_file(p) for p in chemins}
+        tombstones = latest_tombstones(dossier)
+        manifest = {
+            "version": (precedent["version"] + 1) if precedent else 1,
+            "base": base,
+            "segments": [p.name for p in list_segment_dirs(dossier)],
+            "tombstones": tombstones.name if tombstones is not None else None,
+            "checksum": hashlib.sha256(json.dumps(fichiers, sort_keys=True).encode()).hexdigest(),
+            "fichiers": fichiers,
+            "stats": {p.relative_to(film_path).as_posix(): _stat(p) for p in chemins},
+            "publie_le": time.strftime("%Y-%m-%dT%H:%M:%S")
+        }
+
+        path_tmp = film_path / (NOM_MANIFEST + ".tmp")
+        path_tmp.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+        os.replace(path_tmp, film_path / NOM_MANIFEST)
+        logger.info(f"instantané publié: {film_path.name} version {manifest['version']}")
+        return manifest
+    except Exception as ex:
+        logger.error(f"erreur publication instantané {film_path}: {ex}")
+        raise
+#end write_manifest
+
+def refresh_manifest(film_path):
+    """
+    republie le manifest d'un film déjà publié apres une conversion en place de fichiers de sa base
+    (sans manifest: rien à faire, les lecteurs ne vérifient pas les fichiers)
+    """
+    if read_manifest(film_path) is not None:
+        write_manifest(film_path)
+    #end if
+#end refresh_manifest
+
+def new_base_dir(film_path):
+    """
+    dossier temporaire d'une nouvelle base (numéro suivant), à publier avec publish_base
+    Returns:
+        Path: film_path/base-<NNNNNN>.tmp (vide)
+    """
+    film_path = Path(film_path)
+    film_path.mkdir(parents=True, exist_ok=True)
+    numero = max([_numero(p.name, PREFIXE_BASE) for p in film_path.glob(PREFIXE_BASE + "*")], default=0) + 1
+    dossier = film_path / f"{PREFIXE_BASE}{numero:06d}.tmp"
+    shutil.rmtree(dossier, ignore_errors=True)
+    dossier.mkdir()
+    return dossier
+#end new_base_dir
+
+def publish_base(film_path, dossier_tmp):
+    """
+    publie une base complète: renommage du dossier puis manifest (une seule étape visible),
+    suppression des bases plus anciennes que la précédente et des fichiers de l'ancien format
+    Returns:
+        dict: le manifest écrit
+    """
+    try:
+        film_path = Path(film_path)
+        precedent = read_manifest(film_path)
+        dossier = Path(dossier_tmp).with_name(Path(dossier_tmp).name[:-len(".tmp")])
+        Path(dossier_tmp).rename(dossier)
+        manifest = write_manifest(film_path, base=dossier.name)
+
+        # la base précédente reste lisible pour les chargements en cours
+        garder = {dossier.name, (precedent or {}).get("base")}
+        for ancienne in film_path.glob(PREFIXE_BASE + "*"):
+            if ancienne.is_dir() and ancienne.name not in garder:
+                shutil.rmtree(ancienne, ignore_errors=True)
+            #end if
+        #end for
+        for chemin in _fichiers_film(film_path): # ancien format: base à la racine du film
+            if chemin.parent != film_path or chemin.suffix != ".csv":
+                chemin.unlink(missing_ok=True)
+            #end if
+        #end for
+        for vide in sorted((p for p in film_path.iterdir() if p.is_dir() and not p.name.startswith(PREFIXE_BASE)), reverse=True):
+            shutil.rmtree(vide, ignore_errors=True) # metadata/, segments/, features/ de l'ancien format
+        #end for
+        return manifest
+    except Exception as ex:
+        logger.error(f"erreur publication base {dossier_tmp}: {ex}")
+        raise
+#end publish_base
+
+def read_snapshot(film_path):
+    """
+    fichiers de l'instantané publié d'un film (ce que le lecteur doit lire, et seulement ça)
+    Returns:
+        dict: {'version', 'base' (Path), 'segments' (list[Path]), 'tombstones' (Path ou None),
+            'stats' ({chemin relatif: [taille, mtime_ns, inode]} ou None sans manifest)}
+    """
+    film_path = Path(film_path)
+    manifest = read_manifest(film_path)
+    base = base_dir(film_path, manifest)
+    if manifest is None or "segments" not in manifest: # pas de manifest, ou manifest de l'ancien format
+        segments, tombstones = list_segment_dirs(base), latest_tombstones(base)
+    else:
+        segments = [base / DOSSIER_SEGMENTS / nom for nom in manifest["segments"]]
+        tombstones = base / manifest["tombstones"] if manifest["tombstones"] else None
+    #end if
+    return {
+        'version': disk_version(film_path, manifest),
+        'base': base,
+        'segments': segments,
+        'tombstones': tombstones,
+        'stats': manifest.get("stats") if manifest is not None else None
+    }
+#end read_snapshot
+
+def snapshot_matches(film_path, etat):
+    """
+    les fichiers vérifiés de l'instantané sont-ils ceux publiés (meme taille, date et inode) ?
+    Expl: les écrivains publient le manifest en dernier; un fichier réécrit et pas encore
+        publié n'a plus la signature du manifest, le lecteur recommence.
+    """
+    if etat['stats'] is None:
+        return True
+    #end if
+    film_path = Path(film_path)
+    base = etat['base'].relative_to(film_path).as_posix()
+    for chemin, signature in etat['stats'].items():
+        relatif = chemin[len(base) + 1:] if base != "." else chemin
+        if not relatif.startswith(FICHIERS_VERIFIES):
+            continue
+        #end if
+        try:
+            if _stat(film_path / chemin) != signature:
+                return False
+            #end if
+        except FileNotFoundError:
+            return False
+        #end try
+    #end for
+    return True
+#end snapshot_matches
+
+def disk_version(film_path, manifest=None):
+    """
+    version du film sur disque: celle du manifest, sinon une signature (nom, taille, mtime)
+    des fichiers pour les films publiés sans manifest
+    Returns:
+        str: version
+    """
+    manifest = read_manifest(film_path) if manifest is None else manifest
+    if manifest is not None:
+        return f"v{manifest['version']}-{manifest['checksum'][:12]}"
+    #end if
+    signature = [(p.relative_to(film_path).as_posix(), p.stat().st_size, p.stat().st_mtime_ns) for p in _fichiers_film(film_path)]
+    return "fs-" + hashlib.sha1(repr(signature).encode()).hexdigest()[:12]
+#end disk_version
+
+def main():
+    """publie un instantané pour tous les films de data/processed"""
+    try:
+        data_path = Path(__file__).parent.parent.parent / "data" / "processed"
+        for film_path in sorted(p for p in data_path.iterdir() if p.is_dir()):
+            write_manifest(film_path)
+        #end for
+    except Exception as ex:
+        logger.error(f"erreur publication: {ex}")
+        raise
+#end main
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+Ici, on gère le format disque des vecteurs pour le chargement en mémoire partagée (mmap)
+
+Format 'embeddings.vec' (version 1):
+    - en-tête de 4096 octets (une page): magic, version, n, dim, dtype
+    - données float32 contiguës (ordre C) à partir de l'octet 4096
+
+Expl: les données commencent sur une frontière de page, un np.memmap en lecture seule
+    partage donc le page cache entre tous les workers uvicorn (une seule copie par film),
+    le démarrage est quasi instantané et un film plus grand que la RAM reste cherchable.
+
+Auteur: Jo Kabonga
+Date: 18/10/2026
+"""
+
+import os
+import struct
+import logging
+import numpy as np
+from pathlib import Path
+
+try:
+    from .snapshot import base_dir, refresh_manifest
+except ImportError:
+    from snapshot import base_dir, refresh_manifest # execution directe du module
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"SCVEC\x00"
+VERSION = 1
+TAILLE_PAGE = 4096 # taille de l'en-tête, les données sont alignées sur une page
+FORMAT_ENTETE = "<6sHQQ16s" # magic, version, n, dim, dtype
+NOM_FICHIER = "embeddings.vec"
+
+def write_vectors(path, embeddings):
+    """
+    Ecrit une matrice de vecteurs au format page-aligné versionné
+    Args:
+        path: chemin du fichier .vec
+        embeddings: matrice (n, dim) des vecteurs
+    Returns:
+        Path: chemin du fichier écrit
+    """
+    try:
+        path = Path(path)
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if embeddings.ndim != 2:
+            raise ValueError(f"matrice 2D attendue, reçu {embeddings.shape}")
+        #end if
+
+        n, dim = embeddings.shape
+        entete = struct.pack(FORMAT_ENTETE, MAGIC, VERSION, n, dim, embeddings.dtype.str.encode())
+        entete = entete.ljust(TAILLE_PAGE, b"\x00")
+
+        # écriture dans un fichier temporaire puis renommage (atomique)
+        path_tmp = path.with_name(path.name + ".tmp")
+        with open(path_tmp, "wb") as fichier:
+            fichier.write(entete)
+            embeddings.tofile(fichier)
+        #end with
+        os.replace(path_tmp, path)
+
+        logger.info(f"vecteurs écrits: {path} ({n} x {dim})")
+        return path
+    except Exception as ex:
+        logger.error(f"erreur écriture vecteurs {path}: {ex}")
+        raise
+#end write_vectors
+
+def save_npy(path, tableau):
+    """
+    np.save atomique: écriture dans un fichier temporaire puis renommage
+    Expl: un processus qui a déjà ouvert/mappé l'ancien fichier garde l'ancien inode,
+        il ne voit jamais un fichier à moitié écrit (publication d'un nouvel instantané).
+    """
+    path = Path(path)
+    path_tmp = path.with_name(path.name + ".tmp")
+    with open(path_tmp, "wb") as fichier:
+        np.save(fichier, tableau)
+    #end with
+    os.replace(path_tmp, path)
+    return path
+#end save_npy
+
+def source_signature(film_path):
+    """
+    signature des vecteurs d'un film (inode, taille et date de embeddings.npy, sinon de embeddings.vec)
+    Expl: les tables dérivées (voisins, index IVF) la gardent à coté d'elles (write_stamp), une
+        table calculée sur d'autres vecteurs est rejetée au chargement, meme à nombre de lignes égal.
+    """
+    film_path = Path(film_path)
+    source = film_path / "embeddings.npy"
+    if not source.exists():
+        source = film_path / NOM_FICHIER
+    #end if
+    info = source.stat()
+    return f"{source.name}:{info.st_ino}:{info.st_size}:{info.st_mtime_ns}" # inode: save_npy crée toujours un nouveau fichier
+#end source_signature
+
+def write_stamp(path, film_path):
+    """écrit la signature des vecteurs du film dans le fichier path (écriture atomique)"""
+    path = Path(path)
+    path_tmp = path.with_name(path.name + ".tmp")
+    path_tmp.write_text(source_signature(film_path), encoding="utf-8")
+    os.replace(path_tmp, path)
+    return path
+#end write_stamp
+
+def stamp_matches(path, film_path):
+    """la table a-t-elle été calculée sur les vecteurs actuels du film ? (pas de signature: oui, ancien format)"""
+    path = Path(path)
+    if not path.exists():
+        return True
+    #end if
+    try:
+        return path.read_text(encoding="utf-8").strip() == source_signature(film_path)
+    except FileNotFoundError:
+        return False
+    #end try
+#end stamp_matches
+
+def read_header(path):
+    """
+    Lit et valide l'en-tête d'un fichier .vec
+    Returns:
+        tuple: (n, dim, dtype)
+    """
+    with open(path, "rb") as fichier:
+        entete = fichier.read(struct.calcsize(FORMAT_ENTETE))
+    #end with
+    if len(entete) < struct.calcsize(FORMAT_ENTETE):
+        raise ValueError(f"en-tête tronqué: {path}")
+    #end if
+
+    magic, version, n, dim, dtype = struct.unpack(FORMAT_ENTETE, entete)
+    if magic != MAGIC:
+        raise ValueError(f"fichier de vecteurs invalide (magic): {path}")
+    #end if
+    if version != VERSION:
+        raise ValueError(f"version de format non supportée ({version}): {path}")
+    #end if
+    return n, dim, np.dtype(dtype.rstrip(b"\x00").decode())
+#end read_header
+
+def read_vectors(path, mmap=True):
+    """
+    Charge une matrice de vecteurs depuis un fichier .vec
+    Args:
+        path: chemin du fichier .vec
+        mmap: True -> np.memmap en lecture seule (page cache partagé), False -> copie en mémoire
+    Returns:
+        np.ndarray (ou np.memmap) de forme (n, dim)
+    """
+    try:
+        n, dim, dtype = read_header(path)
+        taille_attendue = TAILLE_PAGE + n * dim * dtype.itemsize
+        if os.path.getsize(path) != taille_attendue:
+            raise ValueError(f"taille de fichier incohérente: {path}")
+        #end if
+
+        if mmap:
+            if n == 0:
+                return np.empty((0, dim), dtype=dtype)
+            #end if
+            return np.memmap(path, dtype=dtype, mode="r", offset=TAILLE_PAGE, shape=(n, dim))
+        #end if
+        with open(path, "rb") as fichier:
+            fichier.seek(TAILLE_PAGE)
+            return np.fromfile(fichier, dtype=dtype, count=n * dim).reshape(n, dim)
+        #end with
+    except Exception as ex:
+        logger.error(f"erreur lecture vecteurs {path}: {ex}")
+        raise
+#end read_vectors
+
+def load_embeddings(film_path, mmap=False):
+    """
+    Charge les vecteurs d'un film en choisissant le meilleur fichier disponible
+    Args:
+        film_path: dossier du film (data/processed/<film>)
+        mmap: chargement mappé en mémoire (lecture seule) ou chargement complet
+    Returns:
+        matrice des vecteurs
+    """
+    film_path = Path(film_path)
+    vec_path = film_path / NOM_FICHIER
+    npy_path = film_path / "embeddings.npy"
+
+    if mmap and vec_path.exists():
+        return read_vectors(vec_path, mmap=True)
+    #end if
+    if not npy_path.exists():
+        raise ValueError(f"fichier embeddings manquant :{npy_path}")
+    #end if
+    if mmap:
+        # repli: l'en-tête .npy est aligné sur 64 octets, mmap possible mais pas aligné sur une page
+        return np.load(npy_path, mmap_mode="r")
+    #end if
+    return np.load(npy_path)
+#end load_embeddings
+
+def main():
+    """
+    convertit les embeddings.npy existants au format .vec (base courante de data/processed/<film>)
+    """
+    try:
+        data_path = Path(__file__).parent.parent.parent / "data" / "processed"
+        for film_path in sorted(p for p in data_path.iterdir() if p.is_dir()):
+            npy_path = base_dir(film_path) / "embeddings.npy"
+            if npy_path.exists():
+                write_vectors(npy_path.with_name(NOM_FICHIER), np.load(npy_path))
+                refresh_manifest(film_path)
+            #end if
+        #end for
+    except Exception as ex:
+        logger.error(f"erreur conversion: {ex}")
+        raise
+#end main
+
+if __name__ == "__main__":
+    main()
@@ -8,9 +8,36 @@ Date: 31/10/2025
 
 import numpy as np
 import pandas as pd
+import json
 import logging
-from sentence_transformers import util # pour le calcul du cosinus de simularité
+import threading
+import time
+from collections import OrderedDict, Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path 
+from typing import Optional
+
+try:
+    from .storage import load_embeddings
+    from .search import topk_scores, topk_dot, topk_dot_batch, range_dot, topk_dot_sharded
+    from .neighbours import load_neighbour_table
+    from .ann_index import IVFIndex, TAILLE_MIN_ANN, NPROBE_DEFAUT
+    from .snapshot import disk_version, write_manifest, read_snapshot, snapshot_matches
+    from .columnar import read_columnar, has_columnar
+    from .segments import append_segment, read_segments, read_tombstones, add_tombstones, has_pending, compact_film
+    from .filters import SortedIndex, build_mask, normalize_filters
+    from .features import compute_features, read_features
+except ImportError:
+    from storage import load_embeddings # execution directe du module
+    from search import topk_scores, topk_dot, topk_dot_batch, range_dot, topk_dot_sharded
+    from neighbours import load_neighbour_table
+    from ann_index import IVFIndex, TAILLE_MIN_ANN, NPROBE_DEFAUT
+    from snapshot import disk_version, write_manifest, read_snapshot, snapshot_matches
+    from columnar import read_columnar, has_columnar
+    from segments import append_segment, read_segments, read_tombstones, add_tombstones, has_pending, compact_film
+    from filters import SortedIndex, build_mask, normalize_filters
+    from features import compute_features, read_features
 
 #Configuration du logging
 
@@ -28,9 +55,55 @@ class VectorStore:
         les critiques similaires .
     """
 
-    def __init__(self,data_path=None):
+    BACKENDS = ("numpy", "torch")
+
+    COLONNES_TEXTE = ('review_content',) # lues à la demande (TextStore) pour les lignes retournées
+    TAILLE_MIN_SHARDS = 500_000 # en dessous, le découpage coute plus qu'il ne rapporte
+    MASQUES_MAX = 64 # masques de filtres gardés par film (filtres fréquents)
+    MARGE_TABLE = 1e-5 # écart max entre score de la table des voisins (GEMM par blocs) et produit scalaire direct
+
+    def __init__(self,data_path=None, mmap=False, backend="numpy", ann_min_size=TAILLE_MIN_ANN, nprobe=NPROBE_DEFAUT,
+                 memory_budget=None, lazy_text=True, shards=None, shard_min_size=TAILLE_MIN_SHARDS):
+        """
+        Args:
+            data_path: dossier des films traités (data/processed par defaut)
+            mmap: charger les vecteurs en lecture seule mappée en mémoire (page cache
+                partagé entre les workers) au lieu d'une copie complète par processus
+            backend: noyau de recherche
+                - "numpy": produit scalaire float32 + argpartition (pas d'import de torch)
+                - "torch": sentence_transformers.util.cos_sim + topk (historique)
+            ann_min_size: nombre de critiques à partir duquel l'index IVF du film est utilisé
+                (None -> toujours la recherche exacte)
+            nprobe: nombre de listes IVF sondées (réglage rappel/latence)
+            memory_budget: budget mémoire des films chargés en octets (None -> illimité),
+                éviction LRU de films entiers (vecteurs + métadonnées)
+            lazy_text: texte des critiques (review_content) laissé sur disque (mmap) et lu
+                seulement pour les lignes retournées, au lieu d'etre chargé dans le DataFrame
+            shards: recherche exacte (backend numpy) répartie sur ce nombre de threads pour les
+                films d'au moins shard_min_size critiques (None ou 1 -> un seul coeur)
+        """
         try:
-            self.loaded_films = {} # {film_id: {"embeddings:..., "metadata":...}}
+            if backend not in self.BACKENDS:
+                raise ValueError(f"backend '{backend}' inconnu, choix: {self.BACKENDS}")
+            #end if
+            self.loaded_films = OrderedDict() # {film_id: {"embeddings:..., "metadata":...}} ordre LRU
+            self.memory_budget = memory_budget
+            self._tailles_films = {} # {film_id: octets}
+            self.cache_compteurs = {'hits': 0, 'misses': 0, 'evictions': 0}
+            self.acces_films = Counter() # trafic par film (préchargement des films les plus demandés)
+            self._verrou = threading.RLock()
+            self._local = threading.local() # instantanés épinglés par requete (thread)
+            self._arret_surveillance = threading.Event()
+            self._abonnes_rechargement = [] # callbacks appelés au remplacement d'un film (caches de résultats)
+            self._verrou_ecriture = threading.Lock() # ajouts / suppressions / compaction (un écrivain à la fois)
+            self.mmap = mmap
+            self.backend = backend
+            self.ann_min_size = ann_min_size
+            self.nprobe = nprobe
+            self.lazy_text = lazy_text
+            self.shards = shards
+            self.shard_min_size = shard_min_size
+            self._pool_shards = None # créé à la premiere recherche répartie
             if data_path is None:
                 self.data_path = Path(__file__).parent.parent.parent / "data" / "processed"
             else:
@@ -52,59 +125,497 @@ class VectorStore:
     def load_film(self,film_id:str):
         """
         Méthode qui charge un film s'il n'est pas déjà chargé
-
+        Expl: cache LRU des films chargés, les films les moins récemment utilisés sont
+            évincés quand le budget mémoire (memory_budget) est dépassé.
         """
         try:
             #Normaloisation du nom de films 
             film_id_normaliser = film_id.lower().strip()
 
-            if film_id_normaliser not in self.loaded_films:
-                film_path = self.data_path / film_id
+            # instantané épinglé par la requete en cours (voir snapshot)
+            epingle = getattr(self._local, 'epingles', {}).get(film_id_normaliser)
+            if epingle is not None:
+                return epingle
+            #end if
 
-                #verifier si le film existe
-                if not film_path.exists():
-                    raise ValueError(f"film '{film_id}' non trouvé dans {film_path}")
+            with self._verrou:
+                if not getattr(self._local, 'sans_trafic', False):
+                    self.acces_films[film_id_normaliser] += 1
                 #end if
+                film_data = self.loaded_films.get(film_id_normaliser)
+                if film_data is not None:
+                    self.loaded_films.move_to_end(film_id_normaliser) # plus récemment utilisé
+                    self.cache_compteurs['hits'] += 1
+                    return film_data
+                #end if
+                self.cache_compteurs['misses'] += 1
+            #end with
 
-                #chemin
-                embeddings_path = film_path /"embeddings.npy"
-                dataF_metadata_path = film_path / "metadata.pkl"
+            # lecture disque hors verrou (chargements de films différents en parallèle)
+            film_data = self._read_film(film_id_normaliser)
+            return self._store_film(film_id_normaliser,film_data)
+        except Exception as ex:
+            logger.error(f"erreur chargement film '{film_id}' : {ex}")
+            raise
+    #end load_film
 
-                # verifier les fichiers chargés
-                if not embeddings_path.exists():
-                    raise ValueError(f"fichier embeddings manquant :{embeddings_path}")
-                #end if
-                if not dataF_metadata_path.exists():
-                    raise ValueError(f"fichier metadata manquant: {dataF_metadata_path}")
-                #end if
+    def _read_film(self,film_id_normaliser,tentatives=3):
+        """
+        lecture de l'instantané courant d'un film (data/processed/<film>)
+        Expl: seuls les fichiers désignés par le manifest sont lus (base, segments, tombstones,
+            voir snapshot.read_snapshot). La version et la taille / date des fichiers publiés sont
+            vérifiées avant et apres la lecture: si un écrivain a publié ou réécrit un fichier
+            pendant la lecture (ou supprimé une ancienne base), on recommence.
+        Returns:
+            dict: entrée du film (voir _build_film_data)
+        """
+        film_path = self.data_path / film_id_normaliser
 
-                #chargement
-                embeddings = np.load(embeddings_path)
-                dataF_metadata = pd.read_pickle(dataF_metadata_path)
+        #verifier si le film existe
+        if not film_path.exists():
+            raise ValueError(f"film '{film_id_normaliser}' non trouvé dans {film_path}")
+        #end if
 
-                #verifier la cohérence des fichiers chargés
-                if len(embeddings) != len(dataF_metadata):
-                    raise ValueError("incoherence de données...")
-                #end if
+        for tentative in range(tentatives):
+            if tentative > 0:
+                logger.warning(f"instantané de '{film_id_normaliser}' modifié pendant le chargement, nouvel essai")
+                time.sleep(0.05 * tentative) # laisser l'écrivain publier son manifest
+            #end if
+            etat = read_snapshot(film_path)
+            if not snapshot_matches(film_path, etat):
+                continue # fichiers réécrits, manifest pas encore publié
+            #end if
+            try:
+                film_data = self._read_film_files(etat,film_id_normaliser)
+            except FileNotFoundError:
+                continue # base remplacée puis supprimée pendant la lecture
+            #end try
+            if read_snapshot(film_path)['version'] == etat['version'] and snapshot_matches(film_path, etat):
+                film_data['version'] = etat['version']
+                return film_data
+            #end if
+        #end for
+        raise RuntimeError(f"instantané de '{film_id_normaliser}' instable, chargement abandonné")
+    #end _read_film
+
+    def _read_film_files(self,etat,film_id_normaliser):
+        """
+        lecture des fichiers d'un instantané: vecteurs, métadonnées, table des voisins, index IVF, segments
+        Args:
+            etat: instantané à lire (voir snapshot.read_snapshot), la base est le dossier du film dans l'ancien format
+        """
+        base = etat['base']
+
+        #chemin
+        dataF_metadata_path = base / "metadata.pkl" # ancien format (pickle)
+
+        # verifier les fichiers chargés
+        if not has_columnar(base) and not dataF_metadata_path.exists():
+            raise ValueError(f"fichier metadata manquant: {base / 'metadata'}")
+        #end if
+
+        #chargement (embeddings.vec mappé si mmap, sinon embeddings.npy)
+        embeddings = load_embeddings(base, mmap=self.mmap)
+        textes = {}
+        if has_columnar(base):
+            paresseuses = self.COLONNES_TEXTE if self.lazy_text else ()
+            dataF_metadata, textes = read_columnar(base, mmap=self.mmap, colonnes_paresseuses=paresseuses)
+        else:
+            logger.warning(f"'{film_id_normaliser}': ancien format metadata.pkl (voir columnar.py pour la conversion)")
+            dataF_metadata = pd.read_pickle(dataF_metadata_path)
+            dataF_metadata = dataF_metadata.drop(columns=['embedding'], errors='ignore') # doublon des vecteurs
+        #end if
+
+        #verifier la cohérence des fichiers chargés
+        if len(embeddings) != len(dataF_metadata):
+            raise ValueError("incoherence de données...")
+        #end if
+
+        # table des voisins précalculée (optionnelle, voir neighbours.py), rejetée si calculée sur d'autres vecteurs
+        voisins = load_neighbour_table(base, mmap=self.mmap)
+        if voisins is not None and len(voisins[0]) != len(embeddings): # table sans signature (ancien format)
+            logger.warning(f"table des voisins obsolète pour '{film_id_normaliser}', recherche directe")
+            voisins = None
+        #end if
+
+        # index approximatif (IVF) pour les films volumineux
+        index_ann = None
+        if self.ann_min_size is not None and len(embeddings) >= self.ann_min_size:
+            index_ann = IVFIndex.load(base, mmap=self.mmap, nprobe=self.nprobe)
+            if index_ann is None:
+                logger.warning(f"pas d'index IVF pour '{film_id_normaliser}' ({len(embeddings)} critiques), recherche exacte")
+            #end if
+        #end if
+
+        logger.info(f"film '{film_id_normaliser}' chargé et comporte {len(embeddings)} critiques")
+        film_data = self._build_film_data(embeddings,dataF_metadata,voisins,index_ann,textes,
+                                          segments=read_segments(etat['segments']),supprimes=read_tombstones(etat['tombstones']),
+                                          features=read_features(base,dataF_metadata))
+        film_data['base'] = base
+        return film_data
+    #end _read_film_files
+
+    def _store_film(self,film_id_normaliser,film_data,remplacer=False):
+        """
+        ajoute un film au cache puis évince les films LRU si le budget mémoire est dépassé
+        Args:
+            film_id_normaliser: clé du film
+            film_data: entrée du film
+            remplacer: True -> remplace l'entrée existante (sinon garde celle d'un autre thread)
+        Returns:
+            l'entrée du film en cache
+        """
+        with self._verrou:
+            ancien = self.loaded_films.get(film_id_normaliser) if remplacer else None
+            if remplacer or film_id_normaliser not in self.loaded_films:
+                self.loaded_films[film_id_normaliser] = film_data
+                self._tailles_films[film_id_normaliser] = self._taille_film(film_data)
+            #end if
+            self.loaded_films.move_to_end(film_id_normaliser)
+            self._evict(garder=film_id_normaliser)
+            film_data = self.loaded_films[film_id_normaliser]
+            abonnes = list(self._abonnes_rechargement)
+        #end with
+        # instantané remplacé -> prévenir les caches qui dépendent du film (hors verrou)
+        if ancien is not None and ancien is not film_data:
+            for callback in abonnes:
+                try:
+                    callback(film_id_normaliser, ancien['version'], film_data['version'])
+                except Exception as ex:
+                    logger.error(f"erreur notification rechargement '{film_id_normaliser}': {ex}")
+                #end try
+            #end for
+        #end if
+        return film_data
+    #end _store_film
+
+    def add_reload_listener(self,callback):
+        """
+        enregistre une fonction appelée quand l'instantané chargé d'un film est remplacé
+        Args:
+            callback: fonction (film_id, ancienne_version, nouvelle_version)
+        """
+        with self._verrou:
+            self._abonnes_rechargement.append(callback)
+        #end with
+    #end add_reload_listener
+
+    @staticmethod
+    def _taille_film(film_data):
+        """taille mémoire d'un film en octets: vecteurs, métadonnées, index et tables"""
+        taille = film_data['embeddings'].nbytes # mmap compté aussi (pages du page cache)
+        taille += int(film_data['metadata'].memory_usage(index=True, deep=True).sum())
+        taille += film_data['ids_tries'].nbytes + film_data['positions_ids'].nbytes
+        if film_data['voisins'] is not None:
+            taille += sum(tableau.nbytes for tableau in film_data['voisins'])
+        #end if
+        if film_data['ann'] is not None:
+            ann = film_data['ann']
+            taille += ann.centroides.nbytes + ann.offsets.nbytes + ann.lignes.nbytes
+        #end if
+        taille += sum(texte.nbytes for texte in film_data['textes'].values())
+        taille += sum(tableau.nbytes for tableau in film_data['features'].values())
+        if film_data['delta'] is not None:
+            taille += film_data['delta'].nbytes
+        #end if
+        return taille
+    #end _taille_film
+
+    def _evict(self,garder=None):
+        """évince les films les moins récemment utilisés tant que le budget est dépassé (sous verrou)"""
+        if self.memory_budget is None:
+            return
+        #end if
+        while sum(self._tailles_films.values()) > self.memory_budget and len(self.loaded_films) > 1:
+            film_lru = next(iter(self.loaded_films))
+            if film_lru == garder:
+                break
+            #end if
+            del self.loaded_films[film_lru]
+            taille = self._tailles_films.pop(film_lru)
+            self.cache_compteurs['evictions'] += 1
+            logger.info(f"film '{film_lru}' évincé du cache ({taille / 1e6:.1f} MB)")
+        #end while
+        if sum(self._tailles_films.values()) > self.memory_budget:
+            logger.warning(f"budget mémoire dépassé par le film '{garder}' seul")
+        #end if
+    #end _evict
+
+    @contextmanager
+    def snapshot(self,film_id:str):
+        """
+        épingle l'instantané courant d'un film pour la durée d'une requete (thread courant)
+        Expl: tous les appels load_film du thread dans le bloc 'with' voient la meme version,
+            meme si un rechargement échange le film entre temps: les requetes en cours
+            finissent sur l'ancienne version, les suivantes utilisent la nouvelle.
+        """
+        film_id_normaliser = film_id.lower().strip()
+        film_data = self.load_film(film_id_normaliser)
+        if not hasattr(self._local, 'epingles'):
+            self._local.epingles = {}
+        #end if
+        precedent = self._local.epingles.get(film_id_normaliser)
+        self._local.epingles[film_id_normaliser] = film_data
+        try:
+            yield film_data
+        finally:
+            if precedent is None:
+                del self._local.epingles[film_id_normaliser]
+            else:
+                self._local.epingles[film_id_normaliser] = precedent
+            #end if
+        #end try
+    #end snapshot
 
-                #stockage
-                self.loaded_films[film_id] = {
-                    'embeddings': embeddings,
-                    'metadata': dataF_metadata
-                }
-                logger.info(f"film '{film_id}' chargé et comporte {len(embeddings)} critiques")
+    @contextmanager
+    def untracked(self):
+        """
+        accès du thread courant non comptés dans le trafic par film (acces_films)
+        Expl: le préchargement ne doit pas faire monter les films qu'il charge dans top:N
+        """
+        precedent = getattr(self._local, 'sans_trafic', False)
+        self._local.sans_trafic = True
+        try:
+            yield
+        finally:
+            self._local.sans_trafic = precedent
+        #end try
+    #end untracked
 
-            return self.loaded_films[film_id]
+    def film_version(self,film_id:str):
+        """version de l'instantané chargé d'un film (None s'il n'est pas chargé)"""
+        with self._verrou:
+            film_data = self.loaded_films.get(film_id.lower().strip())
+            return film_data['version'] if film_data is not None else None
+        #end with
+    #end film_version
+
+    def reload_film(self,film_id:str,force=False):
+        """
+        recharge un film depuis son instantané sur disque puis l'échange atomiquement dans le cache
+        Args:
+            film_id: ID du film
+            force: recharger meme si la version sur disque est celle déjà chargée
+        Returns:
+            tuple:(ancienne_version, nouvelle_version)
+        """
+        try:
+            film_id_normaliser = film_id.lower().strip()
+            ancienne_version = self.film_version(film_id_normaliser)
+            if not force and ancienne_version is not None and ancienne_version == disk_version(self.data_path / film_id_normaliser):
+                return ancienne_version, ancienne_version
             #end if
+
+            # chargement complet hors verrou: les requetes continuent sur l'ancienne version
+            film_data = self._read_film(film_id_normaliser)
+            self._store_film(film_id_normaliser,film_data,remplacer=True) # échange atomique
+            logger.info(f"film '{film_id_normaliser}' rechargé: {ancienne_version} -> {film_data['version']}")
+            return ancienne_version, film_data['version']
         except Exception as ex:
-            logger.error(f"erreur chargement film '{film_id}' : {ex}")
+            logger.error(f"erreur rechargement film '{film_id}': {ex}")
             raise
-    #end load_film
+    #end reload_film
+
+    def check_updates(self):
+        """
+        recharge les films chargés dont un nouvel instantané a été publié
+        Returns:
+            list: films rechargés
+        """
+        with self._verrou:
+            films = [(film, data['version']) for film, data in self.loaded_films.items() if data['version'] is not None]
+        #end with
+        recharges = []
+        for film, version in films:
+            try:
+                film_path = self.data_path / film
+                if film_path.exists() and disk_version(film_path) != version:
+                    self.reload_film(film)
+                    recharges.append(film)
+                #end if
+            except Exception as ex:
+                logger.error(f"surveillance: rechargement de '{film}' échoué, ancienne version conservée: {ex}")
+            #end try
+        #end for
+        return recharges
+    #end check_updates
+
+    def start_watcher(self,intervalle=30.0):
+        """
+        surveille data/processed en arrière-plan et recharge les films mis à jour
+        Args:
+            intervalle: secondes entre deux vérifications
+        Returns:
+            le thread de surveillance
+        """
+        self._arret_surveillance.clear()
+        def boucle():
+            while not self._arret_surveillance.wait(intervalle):
+                self.check_updates()
+            #end while
+        #end boucle
+        thread = threading.Thread(target=boucle, daemon=True, name="surveillance-films")
+        thread.start()
+        logger.info(f"surveillance des instantanés toutes les {intervalle}s")
+        return thread
+    #end start_watcher
+
+    def stop_watcher(self):
+        """arrete la surveillance des instantanés (et la compaction en arrière-plan)"""
+        self._arret_surveillance.set()
+    #end stop_watcher
+
+    def start_compactor(self,intervalle=300.0):
+        """
+        compacte en arrière-plan les films qui ont des segments delta ou des suppressions
+        Args:
+            intervalle: secondes entre deux passages
+        Returns:
+            le thread de compaction (arreté par stop_watcher)
+        """
+        self._arret_surveillance.clear()
+        def boucle():
+            while not self._arret_surveillance.wait(intervalle):
+                for film in self.list_available_films():
+                    try:
+                        self.compact(film)
+                    except Exception as ex:
+                        logger.error(f"compaction de '{film}' échouée, segments conservés: {ex}")
+                    #end try
+                #end for
+            #end while
+        #end boucle
+        thread = threading.Thread(target=boucle, daemon=True, name="compaction-films")
+        thread.start()
+        logger.info(f"compaction des segments toutes les {intervalle}s")
+        return thread
+    #end start_compactor
+
+    def cache_stats(self):
+        """
+        compteurs du cache des films pour dimensionner le budget mémoire
+        Returns:
+            dict: hits, misses, evictions, hit_ratio, films, octets_utilises, budget_octets
+        """
+        with self._verrou:
+            total = self.cache_compteurs['hits'] + self.cache_compteurs['misses']
+            return {
+                **self.cache_compteurs,
+                'hit_ratio': self.cache_compteurs['hits'] / total if total else 0.0,
+                'films': list(self.loaded_films),
+                'octets_utilises': sum(self._tailles_films.values()),
+                'budget_octets': self.memory_budget
+            }
+        #end with
+    #end cache_stats
+
+    def _build_film_data(self,embeddings,dataF_metadata,voisins=None,index_ann=None,textes=None,segments=(None,None),supprimes=None,
+                         features=None):
+        """
+        Construit l'entrée d'un film avec l'index ID critique -> ligne
+        Expl: les IDs sont triés une seule fois au chargement, la recherche
+            d'une critique devient un searchsorted (O(log n)) au lieu d'un
+            masque booléen sur tout le DataFrame à chaque requete.
+        Args:
+            embeddings: matrice des vecteurs du film
+            dataF_metadata: DataFrame des métadonnées (colonne 'id')
+            voisins: table des voisins précalculée (indices, scores) ou None
+            index_ann: index IVF du film ou None (recherche exacte)
+            textes: colonnes texte lues à la demande {colonne: TextStore}
+            segments: (vecteurs, métadonnées) des segments delta ou (None, None), voir segments.py
+            supprimes: lignes supprimées (tombstones, numérotation base puis segments)
+            features: signaux de la base écrits à l'ingestion (voir features.py), None -> calculés
+        Returns:
+            dict: {'embeddings', 'metadata', 'ids_tries', 'positions_ids', 'voisins', 'ann', 'textes',
+                'n_base', 'delta', 'supprimes', 'features', 'popularite_max', 'index_filtres', 'masques', 'version'}
+            Remarque: 'embeddings' ne contient que la base, les lignes >= n_base sont dans 'delta'
+                (voir get_vectors), 'metadata' couvre base + delta.
+        """
+        delta, dataF_delta = segments
+        supprimes = np.empty(0, dtype=np.int64) if supprimes is None else np.asarray(supprimes, dtype=np.int64)
+        n_base = len(embeddings)
+        if features is None:
+            features = compute_features(dataF_metadata)
+        #end if
+        if delta is not None:
+            features_delta = compute_features(dataF_delta) # segments petits: calculés au chargement
+            features = {nom: np.concatenate([tableau, features_delta[nom]]) for nom, tableau in features.items()}
+            dataF_metadata = pd.concat([dataF_metadata, dataF_delta], ignore_index=True)
+        #end if
+        if voisins is not None and (delta is not None or len(supprimes) > 0):
+            voisins = None # table calculée sur la base seule, reconstruite à la compaction
+        #end if
+
+        # index ID -> ligne sans les critiques supprimées
+        ids = dataF_metadata['id'].to_numpy(dtype=np.int64)
+        lignes = np.arange(len(ids))
+        if len(supprimes) > 0:
+            lignes = np.setdiff1d(lignes, supprimes, assume_unique=True)
+        #end if
+        positions_ids = lignes[np.argsort(ids[lignes], kind='stable')] # positions (iloc) dans l'ordre des ids triés
+        return {
+            'embeddings': embeddings,
+            'metadata': dataF_metadata,
+            'ids_tries': ids[positions_ids],
+            'positions_ids': positions_ids,
+            'voisins': voisins,
+            'ann': index_ann,
+            'textes': textes or {},
+            'n_base': n_base,
+            'delta': delta,
+            'supprimes': supprimes,
+            'features': features, # {'popularite', 'jours'} lignes base + segments
+            'popularite_max': float(features['popularite'].max()) if len(features['popularite']) > 0 else 0.0,
+            'index_filtres': {}, # {colonne: SortedIndex} construits au premier filtre (voir filter_mask)
+            'masques': OrderedDict(), # {filtres: masque} LRU
+            'version': None # version de l'instantané (voir snapshot.py), renseignée par _read_film
+        }
+    #end _build_film_data
+
+    def get_index_with_id(self,film_id:str,critique_id) -> Optional[int]:
+        """
+        Trouver la position (ligne) d'une critique à partir de son ID
+        Args:
+            film_id: ID du film
+            critique_id: ID de la critique (str ou int)
+        Returns:
+            position de la critique dans la matrice des vecteurs ou None si pas trouvée
+        """
+        try:
+            critique_id_int = int(critique_id)
+        except (TypeError, ValueError):
+            logger.error(f"ID de la critique invalide: {critique_id}")
+            return None
+        #end try
+
+        film_data = self.load_film(film_id)
+        ids_tries = film_data['ids_tries']
+        pos = int(np.searchsorted(ids_tries, critique_id_int))
+        if pos >= len(ids_tries) or ids_tries[pos] != critique_id_int:
+            logger.error(f"critique ID {critique_id} non trouvée pour le film {film_id}")
+            return None
+        #end if
+        return int(film_data['positions_ids'][pos])
+    #end get_index_with_id
+
+    def get_critique_by_id(self,film_id:str,critique_id):
+        """
+        recuperer les métadonnées d'une critique à partir de son ID
+        Returns:
+            Series de la critique ou None si pas trouvée
+        """
+        index = self.get_index_with_id(film_id,critique_id)
+        if index is None:
+            return None
+        #end if
+        return self.get_critique_metadata(film_id,[index]).iloc[0]
+    #end get_critique_by_id
 
 
     def add_film(self,film_id,emb_films,dataF_emb_films):
         """
-        Ajouter les vecteurs et les metadonnées d'un film
+        Ajouter les vecteurs et les metadonnées d'un film (en mémoire, remplace le film entier)
+        voir add_critiques pour ajouter des critiques à un film publié
         Args:
             film_id: ID du film
             emb_film : matrice des vecteurs de critiques (process dans Embedding)
@@ -115,23 +626,224 @@ class VectorStore:
             if len(emb_films) != len(dataF_emb_films):
                 raise ValueError("Nombre de vecteurs diff de metadonnées(incompatible)")
             #end if
-            self.loaded_films['film_id']= {
-                'embeddings': emb_films,
-                'metadata': dataF_emb_films
-            }
+            film_id_normaliser = film_id.lower().strip()
+            self._store_film(film_id_normaliser,self._build_film_data(emb_films,dataF_emb_films.reset_index(drop=True)),remplacer=True)
             logger.info(f"film '{film_id}' ajouté et contient: {len(emb_films)} critiques")
         except Exception as ex:
             logger.error(f"erreur ajout du film {film_id}: {ex}")
             raise
     #end add_film
 
-    def search_similar_vectors(self,film_id,vecteur_ref,k=10):
+    def get_vectors(self,film_id,indices):
+        """
+        vecteurs de critiques d'un film à partir de leurs lignes (base ou segments delta)
+        Args:
+            film_id: ID du film
+            indices: ligne (int) ou tableau de lignes
+        Returns:
+            vecteur (dim,) ou matrice (m, dim)
+        """
+        film_data = self.load_film(film_id)
+        if film_data['delta'] is None:
+            return np.asarray(film_data['embeddings'][indices])
+        #end if
+        positions = np.atleast_1d(np.asarray(indices, dtype=np.int64))
+        base = positions < film_data['n_base']
+        vecteurs = np.empty((len(positions), film_data['delta'].shape[1]), dtype=np.float32)
+        vecteurs[base] = film_data['embeddings'][positions[base]]
+        vecteurs[~base] = film_data['delta'][positions[~base] - film_data['n_base']]
+        return vecteurs[0] if np.ndim(indices) == 0 else vecteurs
+    #end get_vectors
+
+    def get_features(self,film_id,indices):
+        """
+        signaux des critiques d'un film pour le score hybride (voir recommandation/scoring.py)
+        Args:
+            film_id: ID du film
+            indices: tableau de lignes (base ou segments)
+        Returns:
+            tuple:(popularité normalisée dans [0, 1], date en jours depuis 1970 (-inf si inconnue))
+        """
+        film_data = self.load_film(film_id)
+        popularite = film_data['features']['popularite'][indices]
+        if film_data['popularite_max'] > 0:
+            popularite = popularite / np.float32(film_data['popularite_max'])
+        #end if
+        return popularite, film_data['features']['jours'][indices]
+    #end get_features
+
+    def _refresh_segments(self,film_id_normaliser):
+        """
+        met à jour le film chargé apres un ajout/suppression: la base (vecteurs, index) est
+        partagée avec l'ancienne entrée, seuls les segments et les tombstones de l'instantané sont relus
+        (rechargement complet si la base a changé entre temps)
+        """
+        film_path = self.data_path / film_id_normaliser
+        with self._verrou:
+            ancien = self.loaded_films.get(film_id_normaliser)
+        #end with
+        if ancien is None:
+            return # pas chargé: le prochain load_film lira l'instantané publié
+        #end if
+        etat = read_snapshot(film_path)
+        if etat['base'] != ancien.get('base'):
+            self.reload_film(film_id_normaliser)
+            return
+        #end if
+        n_base = ancien['n_base']
+        film_data = self._build_film_data(
+            ancien['embeddings'], ancien['metadata'].iloc[:n_base], ancien['voisins'],
+            ancien['ann'], ancien['textes'], segments=read_segments(etat['segments']), supprimes=read_tombstones(etat['tombstones']),
+            features={nom: tableau[:n_base] for nom, tableau in ancien['features'].items()}
+        )
+        film_data['version'] = etat['version']
+        film_data['base'] = etat['base']
+        self._store_film(film_id_normaliser,film_data,remplacer=True) # échange atomique
+    #end _refresh_segments
+
+    def add_critiques(self,film_id,embeddings,dataF):
+        """
+        ajoute des critiques à un film publié dans un nouveau segment delta (sans réécrire la base)
+        Expl: une critique dont l'ID existe déjà est remplacée (ancienne ligne supprimée).
+        Args:
+            film_id: ID du film
+            embeddings: matrice (m, dim) des vecteurs normalisés des nouvelles critiques
+            dataF: métadonnées alignées (colonnes de la base, dont 'id')
+        Returns:
+            Path: dossier du segment écrit
+        """
+        try:
+            film_id_normaliser = film_id.lower().strip()
+            film_path = self.data_path / film_id_normaliser
+            if not film_path.exists():
+                raise ValueError(f"film '{film_id_normaliser}' non trouvé dans {film_path}")
+            #end if
+            with self._verrou_ecriture:
+                # remplacement: les lignes actuelles des memes IDs deviennent des tombstones
+                film_data = self.load_film(film_id_normaliser)
+                ids = dataF['id'].to_numpy(dtype=np.int64)
+                existants = np.empty(0, dtype=np.int64)
+                if len(film_data['ids_tries']) > 0:
+                    pos = np.minimum(np.searchsorted(film_data['ids_tries'], ids), len(film_data['ids_tries']) - 1)
+                    existants = film_data['positions_ids'][pos[film_data['ids_tries'][pos] == ids]]
+                #end if
+
+                segment = append_segment(film_path, embeddings, dataF)
+                if len(existants) > 0:
+                    add_tombstones(film_path, existants)
+                #end if
+                write_manifest(film_path)
+                self._refresh_segments(film_id_normaliser)
+            #end with
+            logger.info(f"film '{film_id_normaliser}': {len(dataF)} critiques ajoutées ({len(existants)} remplacées)")
+            return segment
+        except Exception as ex:
+            logger.error(f"erreur ajout de critiques au film '{film_id}': {ex}")
+            raise
+    #end add_critiques
+
+    def delete_critiques(self,film_id,critique_ids):
+        """
+        supprime des critiques d'un film (tombstones filtrées à la recherche jusqu'à la compaction)
+        Returns:
+            int: nombre de critiques supprimées (IDs inconnus ignorés)
+        """
+        try:
+            film_id_normaliser = film_id.lower().strip()
+            film_path = self.data_path / film_id_normaliser
+            with self._verrou_ecriture:
+                lignes = [self.get_index_with_id(film_id_normaliser,c) for c in critique_ids]
+                lignes = [ligne for ligne in lignes if ligne is not None]
+                if lignes:
+                    add_tombstones(film_path, lignes)
+                    write_manifest(film_path)
+                    self._refresh_segments(film_id_normaliser)
+                #end if
+            #end with
+            logger.info(f"film '{film_id_normaliser}': {len(lignes)} critiques supprimées")
+            return len(lignes)
+        except Exception as ex:
+            logger.error(f"erreur suppression de critiques du film '{film_id}': {ex}")
+            raise
+    #end delete_critiques
+
+    def compact(self,film_id):
+        """
+        fusionne base + segments sans les critiques supprimées (voir segments.compact_film)
+        puis recharge le film s'il est chargé, les requetes continuent pendant la compaction
+        Returns:
+            dict: rapport de compaction ou None si rien à compacter
+        """
+        film_id_normaliser = film_id.lower().strip()
+        film_path = self.data_path / film_id_normaliser
+        with self._verrou_ecriture:
+            if not has_pending(film_path):
+                return None
+            #end if
+            rapport = compact_film(film_path)
+            if self.film_version(film_id_normaliser) is not None:
+                self.reload_film(film_id_normaliser)
+            #end if
+        #end with
+        return rapport
+    #end compact
+
+    def filter_mask(self,film_id,filtres):
+        """
+        masque des critiques d'un film autorisées par des filtres sur les métadonnées
+        Expl: index triés par colonne et masques des filtres récents gardés avec l'instantané du film
+        Args:
+            film_id: ID du film
+            filtres: dict des filtres (voir filters.py), None ou vide -> pas de filtre
+        Returns:
+            np.ndarray bool (lignes base + segments) ou None sans filtre
+        """
+        cle = normalize_filters(filtres)
+        if cle is None:
+            return None
+        #end if
+        film_data = self.load_film(film_id)
+        with self._verrou:
+            masque = film_data['masques'].get(cle)
+            if masque is not None:
+                film_data['masques'].move_to_end(cle)
+                return masque
+            #end if
+        #end with
+
+        def index_colonne(colonne):
+            with self._verrou:
+                index = film_data['index_filtres'].get(colonne)
+            #end with
+            if index is None and colonne in film_data['metadata'].columns:
+                index = SortedIndex(film_data['metadata'][colonne].to_numpy())
+                with self._verrou:
+                    film_data['index_filtres'][colonne] = index
+                #end with
+            #end if
+            return index
+        #end index_colonne
+
+        masque = build_mask(len(film_data['metadata']), filtres, index_colonne)
+        masque.flags.writeable = False # partagé entre les requetes
+        with self._verrou:
+            film_data['masques'][cle] = masque
+            while len(film_data['masques']) > self.MASQUES_MAX:
+                film_data['masques'].popitem(last=False)
+            #end while
+        #end with
+        return masque
+    #end filter_mask
+
+    def search_similar_vectors(self,film_id,vecteur_ref,k=10,nprobe=None,masque=None):
         """
         Recherche les vecteurs similaires (critiques) pour un film
         Args:
             film_id: film pour lequel la recherche est faite
             vecteur_ref: vecteur de la critique de reference 
             k: nombre de resultat à retourner
+            nprobe: listes IVF sondées si le film a un index approximatif (défaut: self.nprobe)
+            masque: critiques autorisées (voir filter_mask), appliqué pendant la sélection du top-k
             TODO: analyse le temps suite à k !!! 
         Returns:
             tuple:(scores_similarity, indices_results)
@@ -140,23 +852,225 @@ class VectorStore:
         try:
             #chargement du film
             film_data = self.load_film(film_id)
-            embeddings = film_data['embeddings']
+
+            # segments delta et suppressions: k+1 par segment (+ marge des supprimées) puis fusion
+            supprimes = film_data['supprimes']
+            k_segment = k + 1 + len(supprimes)
+            n_base = film_data['n_base']
+            masque_base = None if masque is None else masque[:n_base]
+            scores_k, indices_k = self._search_base(film_data, vecteur_ref, k_segment, nprobe, masque_base)
+            if film_data['delta'] is not None:
+                scores_d, indices_d = topk_dot(film_data['delta'], vecteur_ref, k_segment, None if masque is None else masque[n_base:])
+                scores_k = np.concatenate([scores_k, scores_d])
+                indices_k = np.concatenate([indices_k, indices_d + film_data['n_base']])
+            #end if
+            if film_data['delta'] is not None or len(supprimes) > 0:
+                garder = ~np.isin(indices_k, supprimes)
+                scores_k, positions = topk_scores(scores_k[garder], k+1)
+                indices_k = indices_k[garder][positions]
+            #end if
+
+            logger.info(f"recherche '{film_id}' : {len(indices_k)} résultats trouvés")
+
+            return scores_k, indices_k 
+        except Exception as ex:
+            logger.error(f"erreur recherche '{film_id}' : {ex}")
+            raise
+    #end search_similar_vectors
+
+    def _search_base(self,film_data,vecteur_ref,k,nprobe=None,masque=None):
+        """recherche des k meilleurs vecteurs de la base d'un film (IVF, numpy ou torch), masque optionnel"""
+        embeddings = film_data['embeddings']
+        if film_data['ann'] is not None:
+            # film volumineux: recherche approximative sur les listes IVF sondées
+            scores_k, indices_k = film_data['ann'].search(embeddings, vecteur_ref, k, nprobe=nprobe, masque=masque)
+        elif masque is not None and self.backend == "numpy":
+            # filtre appliqué pendant la sélection du top-k
+            scores_k, indices_k = topk_dot(embeddings, vecteur_ref, k, masque)
+        elif self.backend == "numpy" and self.shards and self.shards > 1 and len(embeddings) >= self.shard_min_size:
+            # très gros film: tranches de lignes cherchées en parallèle puis fusion des top-k
+            scores_k, indices_k = topk_dot_sharded(embeddings, vecteur_ref, k, self._shard_pool(), self.shards)
+        elif self.backend == "numpy":
+            # vecteurs déjà normalisés: produit scalaire + top-k par argpartition
+            scores_k, indices_k = topk_dot(embeddings, vecteur_ref, k)
+        else:
+            from sentence_transformers import util # pour le calcul du cosinus de simularité
 
             #calcul des similarités cosinus
             scores_similarity = util.cos_sim(vecteur_ref,embeddings)[0] # docs:
+            n_valides = len(scores_similarity)
+            if masque is not None:
+                import torch
+                scores_similarity[torch.from_numpy(~masque)] = -np.inf
+                n_valides = int(np.count_nonzero(masque))
+            #end if
 
             #recup des k resultats
-            scores_k, indices_k = scores_similarity.topk(k=min(k+1,len(scores_similarity)))
+            scores_k, indices_k = scores_similarity.topk(k=min(k,n_valides))
+            scores_k, indices_k = scores_k.numpy(), indices_k.numpy()
+        #end if
+        return scores_k, indices_k
+    #end _search_base
 
-            logger.info(f"recherche '{film_id}' : {len(indices_k)} résultats trouvés")
+    def _shard_pool(self):
+        """pool de threads de la recherche répartie (partagé par toutes les requetes)"""
+        with self._verrou:
+            if self._pool_shards is None:
+                self._pool_shards = ThreadPoolExecutor(max_workers=self.shards, thread_name_prefix="shard")
+            #end if
+            return self._pool_shards
+        #end with
+    #end _shard_pool
 
-            return scores_k.numpy(), indices_k.numpy() 
+    def search_similar_vectors_batch(self,film_id,requetes,k=10,nprobe=None):
+        """
+        Recherche les vecteurs similaires pour plusieurs critiques de reference en une fois
+        Args:
+            film_id: film pour lequel la recherche est faite
+            requetes: matrice (m, dim) des vecteurs de reference
+            k: nombre de resultat par requete (k+1 retournés, comme search_similar_vectors)
+            nprobe: listes IVF sondées si le film a un index approximatif
+        Returns:
+            tuple:(scores (m, k+1), indices (m, k+1))
+        """
+        try:
+            film_data = self.load_film(film_id)
+            embeddings = film_data['embeddings']
+            requetes = np.atleast_2d(requetes)
+            supprimes = film_data['supprimes']
+            k_segment = k + 1 + len(supprimes) # marge pour les lignes supprimées
+
+            if film_data['ann'] is not None:
+                # IVF: listes sondées différentes par requete -> une recherche par requete
+                # (lignes complétées par -1 / -inf si une requete a moins de candidats)
+                scores_k = np.full((len(requetes), k_segment), -np.inf, dtype=np.float32)
+                indices_k = np.full((len(requetes), k_segment), -1, dtype=np.int64)
+                for i, q in enumerate(requetes):
+                    scores_q, indices_q = film_data['ann'].search(embeddings, q, k_segment, nprobe=nprobe)
+                    scores_k[i, :len(scores_q)] = scores_q
+                    indices_k[i, :len(indices_q)] = indices_q
+                #end for
+            else:
+                # un GEMM par bloc de requetes (noyau numpy quel que soit le backend)
+                scores_k, indices_k = topk_dot_batch(embeddings, requetes, k_segment)
+            #end if
+
+            # fusion avec les segments delta, lignes supprimées à -inf / -1, puis k+1 meilleurs par ligne
+            if film_data['delta'] is not None or len(supprimes) > 0:
+                if film_data['delta'] is not None:
+                    scores_d, indices_d = topk_dot_batch(film_data['delta'], requetes, k_segment)
+                    scores_k = np.concatenate([scores_k, scores_d], axis=1)
+                    indices_k = np.concatenate([indices_k, indices_d + film_data['n_base']], axis=1)
+                #end if
+                supprime = np.isin(indices_k, supprimes)
+                scores_k = np.where(supprime, -np.inf, scores_k)
+                indices_k = np.where(supprime, -1, indices_k)
+                ordre = np.argsort(-scores_k, axis=1, kind="stable")[:, :k+1]
+                scores_k = np.take_along_axis(scores_k, ordre, axis=1)
+                indices_k = np.take_along_axis(indices_k, ordre, axis=1)
+            #end if
+
+            logger.info(f"recherche groupée '{film_id}' : {len(requetes)} requetes x {indices_k.shape[1]} résultats")
+            return scores_k, indices_k
         except Exception as ex:
-            logger.error(f"erreur recherche '{film_id}' : {ex}")
+            logger.error(f"erreur recherche groupée '{film_id}' : {ex}")
             raise
-    #end search_similar_vectors
+    #end search_similar_vectors_batch
+
+    def get_precomputed_neighbours(self,film_id,index,k=10):
+        """
+        Lecture des k voisins précalculés d'une critique (auto-recommandation déjà exclue)
+        Args:
+            film_id: ID du film
+            index: position de la critique de reference
+            k: nombre de resultats
+        Returns:
+            tuple:(scores, indices) ou None si pas de table ou table trop courte pour k
+        """
+        film_data = self.load_film(film_id)
+        voisins = film_data['voisins']
+        if voisins is None or voisins[0].shape[1] < min(k, len(film_data['embeddings']) - 1):
+            return None
+        #end if
+        indices, scores = voisins
+        return scores[index, :k].astype(np.float32), indices[index, :k].astype(np.int64) # index: int ou tableau de lignes
+    #end get_precomputed_neighbours
     #Avec seuil de similarité minimu 
 
+    def get_precomputed_range(self,film_id,index,seuil,limite=None):
+        """
+        Voisins précalculés d'une critique au dessus d'un seuil (auto-recommandation déjà exclue)
+        Expl: les lignes de la table sont triées par score décroissant. Les candidats (score de la
+            table >= seuil - MARGE_TABLE) sont re-notés exactement (produit scalaire des vecteurs,
+            comme range_dot), la réponse est complète si la ligne descend sous seuil - MARGE_TABLE
+            (ou si la limite est atteinte au dessus de son dernier score) avant sa fin.
+        Args:
+            film_id: ID du film
+            index: position de la critique de reference
+            seuil: similarité minimale
+            limite: nombre max de resultats (None -> tous)
+        Returns:
+            tuple:(scores, indices) ou None si la table ne suffit pas (recherche complète nécessaire)
+        """
+        film_data = self.load_film(film_id)
+        voisins = film_data['voisins']
+        if voisins is None:
+            return None
+        #end if
+        indices, scores = voisins
+        ligne = np.asarray(scores[index], dtype=np.float32)
+        nb = int(np.searchsorted(-ligne, -(seuil - self.MARGE_TABLE), side='right')) # candidats en tete de ligne
+        candidats = np.asarray(indices[index, :nb], dtype=np.int64)
+        embeddings = film_data['embeddings']
+        exacts = np.clip(np.asarray(embeddings[candidats], dtype=np.float32) @ np.asarray(embeddings[index], dtype=np.float32), -1.0, 1.0)
+        ordre = np.argsort(-exacts, kind="stable")
+        ordre = ordre[exacts[ordre] >= seuil]
+        exacts, candidats = exacts[ordre], candidats[ordre]
+
+        table_complete = ligne.shape[0] >= len(embeddings) - 1
+        if nb == ligne.shape[0] and not table_complete:
+            # lignes hors table: score <= dernier score de la table (+ marge), la limite doit etre atteinte au dessus
+            if limite is None or len(exacts) < max(limite, 1) or exacts[limite - 1] < ligne[-1] + self.MARGE_TABLE:
+                return None
+            #end if
+        #end if
+        nb = len(exacts) if limite is None else min(len(exacts), limite)
+        return exacts[:nb], candidats[:nb]
+    #end get_precomputed_range
+
+    def range_search_vectors(self,film_id,vecteur_ref,seuil,limite=None):
+        """
+        Recherche de toutes les critiques d'un film dont la similarité est >= seuil (recherche exacte)
+        Args:
+            film_id: film pour lequel la recherche est faite
+            vecteur_ref: vecteur de la critique de reference
+            seuil: similarité minimale
+            limite: nombre max de resultats (les meilleurs), None -> tous
+        Returns:
+            tuple:(scores_similarity, indices_results) triés par score décroissant
+        """
+        try:
+            film_data = self.load_film(film_id)
+            supprimes = film_data['supprimes']
+            limite_segment = None if limite is None else limite + len(supprimes)
+            scores, indices = range_dot(film_data['embeddings'], vecteur_ref, seuil, limite_segment)
+            if film_data['delta'] is not None or len(supprimes) > 0:
+                if film_data['delta'] is not None:
+                    scores_d, indices_d = range_dot(film_data['delta'], vecteur_ref, seuil, limite_segment)
+                    scores = np.concatenate([scores, scores_d])
+                    indices = np.concatenate([indices, indices_d + film_data['n_base']])
+                #end if
+                garder = ~np.isin(indices, supprimes)
+                scores, positions = topk_scores(scores[garder], int(garder.sum()) if limite is None else limite)
+                indices = indices[garder][positions]
+            #end if
+            logger.info(f"recherche par seuil {seuil}: {len(scores)} critiques")
+            return scores, indices
+        except Exception as ex:
+            logger.error(f"erreur recherche par seuil pour le film '{film_id}': {ex}")
+            raise
+    #end range_search_vectors
+
     def get_critique_metadata(self,film_id,indices):
         """
         recuperer les metadonnées des critiques
@@ -169,14 +1083,27 @@ class VectorStore:
         """
         try:
             film_data = self.load_film(film_id)
-            return film_data['metadata'].iloc[indices].copy() # 
+            dataF = film_data['metadata'].iloc[indices].copy() # 
+            # texte lu sur disque seulement pour ces lignes (segments delta: texte déjà en mémoire)
+            positions = np.atleast_1d(np.asarray(indices, dtype=np.int64))
+            base = positions < film_data['n_base']
+            for colonne, texte in film_data['textes'].items():
+                if base.all():
+                    dataF[colonne] = texte.get(positions)
+                else:
+                    valeurs = dataF[colonne].to_numpy(dtype=object) if colonne in dataF.columns else np.full(len(positions), None, dtype=object)
+                    valeurs[base] = texte.get(positions[base])
+                    dataF[colonne] = valeurs
+                #end if
+            #end for
+            return dataF
         except Exception as ex:
             logger.error(f"erreur recup métadonnées du film '{film_id}': {ex}")
             raise
     #end get_critique_metadata
 
     def get_film_metadata(self, film_id:str):
-        """recuperer toutes les metadata d'un film"""
+        """recuperer toutes les metadata d'un film (sans les colonnes texte lues à la demande)"""
         try:
             film_data = self.load_film(film_id)
             return film_data['metadata']
@@ -185,12 +1112,37 @@ class VectorStore:
             raise
     #end get_film_metadata
 
+    def save_traffic(self,path=None):
+        """sauvegarde le trafic par film (data/processed/trafic.json par defaut), cumulé avec l'existant"""
+        try:
+            path = Path(path) if path is not None else self.data_path / "trafic.json"
+            trafic = Counter(self.load_traffic(path))
+            with self._verrou:
+                trafic.update(self.acces_films)
+                self.acces_films.clear()
+            #end with
+            path.write_text(json.dumps(dict(trafic.most_common()), indent=2), encoding="utf-8")
+            return path
+        except Exception as ex:
+            logger.error(f"erreur sauvegarde trafic: {ex}")
+            raise
+    #end save_traffic
+
+    def load_traffic(self,path=None):
+        """trafic par film {film_id: nombre d'accès}, vide si pas encore de fichier"""
+        path = Path(path) if path is not None else self.data_path / "trafic.json"
+        if not path.exists():
+            return {}
+        #end if
+        return json.loads(path.read_text(encoding="utf-8"))
+    #end load_traffic
+
     #méthodes à ajouter :
     # films disponibles
     def list_available_films(self):
         """Liste de tous les films disponibles"""
         try:
-            films =[film.name for film in self.data_path.iterdir() if film.is_dir()] # à revoir si erreur
+            films =sorted(film.name for film in self.data_path.iterdir() if film.is_dir()) # à revoir si erreur
             logger.info(f"films disponibles: {films}")
             return films
         except Exception as ex:
@@ -248,7 +1200,7 @@ def main():
 
             #critique de ref
             critique_ref_index = 200 # essaie d'autre après 
-            critique_ref = dataF_metadata.iloc[critique_ref_index]
+            critique_ref = vector_store.get_critique_metadata(film_test,[critique_ref_index]).iloc[0]
             print(f"critique de ref (index {critique_ref_index}):")
             print(f"Contenu: {critique_ref['review_content'][:150]}")
             print(f"Film : {critique_ref['film_id']}")
@@ -21,6 +21,38 @@ class TestAPI:
         assert response.status_code == 200
         assert response.json()["status"] == "healthy"
     
+    def test_ready_endpoint_after_warm_up(self, monkeypatch, tmp_path):
+        """Test endpoint /ready: prêt seulement apres le préchargement des films (non compté dans le trafic)"""
+        import time
+        from src.api import dependencies
+        vector_store = dependencies.recommender_engine.vector_store
+        sauvegarde = vector_store.save_traffic
+        monkeypatch.setattr(vector_store, "save_traffic", lambda path=None: sauvegarde(tmp_path / "trafic.json")) # arret: pas d'écriture dans data/
+        monkeypatch.setenv("SC_WARMUP", "fightclub")
+        dependencies.etat_warmup["pret"].clear()
+        acces_avant = vector_store.acces_films["fightclub"]
+        assert client.get("/ready").status_code == 503
+        with TestClient(app) as client_demarre: # déclenche le démarrage (lifespan)
+            for _ in range(100):
+                response = client_demarre.get("/ready")
+                if response.status_code == 200:
+                    break
+                time.sleep(0.1)
+            assert response.status_code == 200
+            assert "fightclub" in response.json()["films_precharges"]
+            assert "fightclub" in dependencies.recommender_engine.vector_store.loaded_films
+            assert vector_store.acces_films["fightclub"] == acces_avant
+    
+    def test_admin_reload_requires_token(self, monkeypatch):
+        """Test rechargement admin: fermé sans SC_ADMIN_TOKEN, token obligatoire sinon"""
+        monkeypatch.delenv("SC_ADMIN_TOKEN", raising=False)
+        assert client.post("/admin/films/fightclub/reload").status_code == 404
+        monkeypatch.setenv("SC_ADMIN_TOKEN", "secret")
+        assert client.post("/admin/films/fightclub/reload").status_code == 403
+        assert client.post("/admin/films/fightclub/reload", headers={"X-Admin-Token": "faux"}).status_code == 403
+        response = client.post("/admin/films/fightclub/reload", headers={"X-Admin-Token": "secret"})
+        assert response.status_code == 200 and response.json()["film"] == "fightclub"
+
     def test_films_endpoint(self):
         """Test endpoint films"""
         response = client.get("/films")
@@ -65,4 +97,23 @@ class TestAPI:
                 "k": 3
             }
         )
-        assert response.status_code == 404
\ No newline at end of file
+        assert response.status_code == 404
+    def test_search_endpoint(self, monkeypatch):
+        """Test endpoint recherche par texte (encodeur factice, pas de téléchargement du modèle)"""
+        import numpy as np
+        from src.api import dependencies
+        from src.recommandation.query_encoder import QueryEncoder
+        vector_store = dependencies.recommender_engine.vector_store
+        vecteur = np.asarray(vector_store.load_film("fightclub")['embeddings'][0], dtype=np.float32)
+
+        class FauxModele:
+            def embeddings_generer(self, texts, batch_size=32, show_progress=True):
+                return np.tile(vecteur, (len(texts), 1))
+
+        monkeypatch.setattr(dependencies.recommender_engine, "query_encoder", QueryEncoder(fabrique=FauxModele))
+        response = client.post("/search", json={"texte": "la premiere règle", "film_id": "fightclub", "k": 3})
+        assert response.status_code == 200
+        assert len(response.json()["recommendations"]) == 3
+        assert client.post("/search", json={"texte": "x", "film_id": "film_inexistant"}).status_code == 404
+        assert client.post("/search", json={"texte": "", "film_id": "fightclub"}).status_code == 422
+        assert client.get("/stats").json()["requetes"]["misses"] == 1
@@ -8,7 +8,7 @@ from pathlib import Path
 # Ajouter 'src' au PYTHONPATH pour pouvoir importer le package sous src/
 sys.path.insert(0, str((Path(__file__).resolve().parents[1] / "src")))
 
-from data_processing.data_cleaner  import clean_critiques_data, validate_cleaned_data, save_cleaned_data
+from data_processing.data_cleaner  import clean_critiques_data, validate_cleaned_data, save_cleaned_data, clean_critiques_stream
 
 class TestDataCleanerWithRealFiles:
     """Tests avec les fichiers CSV réels"""
@@ -130,6 +130,43 @@ class TestDataCleanerWithRealFiles:
             
             print(f"✅ Workflow complet réussi pour {film_name}")
 
+def test_clean_critiques_stream_matches_in_memory(tmp_path):
+    """Test du nettoyage en streaming: meme résultat qu'en mémoire, doublons supprimés entre les lots"""
+    # Arrange - fichier réel + 300 critiques recopiées en fin de fichier (doublons dans d'autres lots)
+    brut = pd.read_csv(Path(__file__).parent.parent / "data" / "fightclub_critiques.csv")
+    csv_path = tmp_path / "export.csv"
+    pd.concat([brut, brut.sample(300, random_state=0)]).to_csv(csv_path, index=False)
+
+    # Act
+    en_memoire = clean_critiques_data(csv_path, "fightclub")
+    rapport = clean_critiques_stream(csv_path, "fightclub", tmp_path / "cleaned.csv", chunksize=97)
+    streaming = pd.read_csv(tmp_path / "cleaned.csv")
+
+    # Assert
+    assert rapport['lignes_initiales'] == 1300 and rapport['lignes_finales'] == len(en_memoire) == len(streaming)
+    assert rapport['doublons'] >= 300
+    assert streaming['review_content'].tolist() == en_memoire['review_content'].tolist()
+    assert streaming.columns.tolist() == en_memoire.columns.tolist() == rapport['colonnes']
+    assert not (tmp_path / "cleaned.csv.tmp").exists()
+
+def test_clean_critiques_stream_removes_tmp_on_error(tmp_path, monkeypatch):
+    """Test du nettoyage en streaming: erreur en cours de lecture -> ni fichier temporaire ni sortie"""
+    # Arrange - le deuxième lot échoue
+    from data_processing import data_cleaner
+    clean_chunk = data_cleaner.clean_chunk
+    appels = []
+    def clean_chunk_echoue(lot, film_name, vus):
+        appels.append(len(lot))
+        if len(appels) == 2:
+            raise RuntimeError("lot illisible")
+        return clean_chunk(lot, film_name, vus)
+    monkeypatch.setattr(data_cleaner, "clean_chunk", clean_chunk_echoue)
+
+    # Act & Assert
+    with pytest.raises(RuntimeError):
+        clean_critiques_stream(Path(__file__).parent.parent / "data" / "fightclub_critiques.csv", "fightclub", tmp_path / "cleaned.csv", chunksize=100)
+    assert not (tmp_path / "cleaned.csv.tmp").exists() and not (tmp_path / "cleaned.csv").exists()
+
 def test_data_quality_after_cleaning():
     """Test de la qualité des données après nettoyage"""
     # Arrange & Act
@@ -0,0 +1,134 @@
+"""
+Test des backends d'inférence de la classe Embedding (modèle BERT minuscule local, sans téléchargement)
+Auteur : Jo kabonga
+Date : 18/10/2026
+
+"""
+
+import pytest
+import numpy as np
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str((Path(__file__).resolve().parents[1] / "src")))
+
+from data_processing.embedding import Embedding
+from data_processing.inference_backends import drift_report
+
+@pytest.fixture(scope="module")
+def modele_local(tmp_path_factory):
+    """petit modèle sentence-transformers à poids aléatoires (meme structure que MiniLM)"""
+    import torch
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+    from sentence_transformers import SentenceTransformer, models
+    torch.manual_seed(0)
+    dossier = tmp_path_factory.mktemp("modele")
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + [chr(c) for c in range(97, 123)] + ["film", "critique", "fight", "club"]
+    (dossier / "vocab.txt").write_text("\n".join(vocab))
+    BertTokenizerFast(vocab_file=str(dossier / "vocab.txt")).save_pretrained(dossier / "bert")
+    BertModel(BertConfig(vocab_size=len(vocab), hidden_size=64, num_hidden_layers=2, num_attention_heads=4,
+                         intermediate_size=128)).save_pretrained(dossier / "bert")
+    modele = SentenceTransformer(modules=[models.Transformer(str(dossier / "bert")), models.Pooling(64, "mean"), models.Normalize()])
+    modele.save(str(dossier / "st"))
+    return str(dossier / "st")
+
+class TestEmbeddingBackends:
+    def test_backend_inconnu(self):
+        """Test backend inconnu refusé avant le chargement du modèle"""
+        with pytest.raises(ValueError):
+            Embedding("modele_inexistant", backend="fp8")
+
+    @pytest.mark.parametrize("backend", ["int8", "bf16"])
+    def test_backends_proches_de_float32(self, modele_local, backend):
+        """Test vecteurs normalisés float32 et faible dérive par rapport au backend torch"""
+        textes = ["fight club", "critique du film", "a b c d", "club film critique fight", "z y x"] * 4
+        reference = Embedding(modele_local).embeddings_generer(textes, show_progress=False)
+        vecteurs = Embedding(modele_local, backend=backend).embeddings_generer(textes, show_progress=False)
+        assert vecteurs.dtype == np.float32 and vecteurs.shape == reference.shape
+        np.testing.assert_allclose(np.linalg.norm(vecteurs, axis=1), 1.0, atol=1e-3)
+        rapport = drift_report(reference, vecteurs, k=3)
+        assert rapport['cosinus_min'] > 0.98
+
+    def test_drift_report(self):
+        """Test rapport de dérive: identique -> cosinus 1 et accord total, bruit -> accord partiel"""
+        rng = np.random.default_rng(0)
+        reference = rng.standard_normal((200, 32)).astype(np.float32)
+        reference /= np.linalg.norm(reference, axis=1, keepdims=True)
+        rapport = drift_report(reference, reference, k=5)
+        assert rapport['cosinus_min'] == pytest.approx(1.0, abs=1e-5) and rapport['accord_topk'] == 1.0
+
+        bruit = reference + 0.3 * rng.standard_normal(reference.shape).astype(np.float32)
+        bruit /= np.linalg.norm(bruit, axis=1, keepdims=True)
+        rapport = drift_report(reference, bruit, k=5)
+        assert 0.0 < rapport['accord_topk'] < 1.0 and rapport['cosinus_moyen'] < 1.0
+        with pytest.raises(ValueError):
+            drift_report(reference, reference[:10])
+
+    def test_process_dataf_persistent_cache(self, modele_local, tmp_path, monkeypatch):
+        """Test cache persistant: seuls les textes absents (normalisés) sont encodés, cache relu par un autre processus"""
+        import pandas as pd
+        from data_processing.embedding_cache import EmbeddingCache, text_digests
+        dataF = pd.DataFrame({'id': range(6), 'review_content': ["fight club", "critique du film", "a b c",
+                                                                   "fight  club ", "z y x", "film"]})
+        embedding = Embedding(modele_local, cache_dir=tmp_path)
+        encodes = []
+        generer = embedding.embeddings_generer
+        monkeypatch.setattr(embedding, "embeddings_generer", lambda texts, **kw: encodes.append(len(texts)) or generer(texts, show_progress=False))
+
+        _, vecteurs = embedding.process_dataF(dataF)
+        assert encodes == [5] # "fight  club " normalisé = "fight club"
+        reference = generer(dataF['review_content'].tolist(), show_progress=False)
+        np.testing.assert_allclose(vecteurs, reference, atol=1e-5)
+
+        # ré-indexation: une nouvelle critique -> un seul texte encodé
+        dataF_jour = pd.concat([dataF, pd.DataFrame({'id': [6], 'review_content': ["club club"]})], ignore_index=True)
+        _, vecteurs_jour = embedding.process_dataF(dataF_jour)
+        assert encodes == [5, 1]
+        np.testing.assert_allclose(vecteurs_jour[:6], vecteurs, atol=1e-6)
+
+        # cache relu depuis le disque, clé = modèle + backend
+        cache = EmbeddingCache(tmp_path, f"{modele_local}|torch")
+        assert len(cache) == 6
+        trouve, _ = cache.lookup(text_digests(["fight club", "inconnu"]))
+        assert trouve.tolist() == [True, False]
+        assert len(EmbeddingCache(tmp_path, f"{modele_local}|int8")) == 0
+
+    def test_token_budget_batches_and_chunking(self, modele_local):
+        """Test lots à budget de tokens (ordre d'origine rendu) et découpage des critiques longues"""
+        from data_processing.token_batching import token_budget_batches, split_windows, encode_bucketed
+        lots = token_budget_batches([5, 100, 20, 100, 3], token_budget=200, max_batch=3, ecart_max=None)
+        assert [lot.tolist() for lot in lots] == [[1, 3], [2, 0, 4]]
+        lots = token_budget_batches([5, 100, 20, 100, 4, 18], token_budget=200, max_batch=3)
+        assert [lot.tolist() for lot in lots] == [[1, 3], [2, 5], [0, 4]] # padding borné par ecart_max
+        fenetres = split_windows(list(range(10)), 4, chevauchement=1)
+        assert fenetres == [[0, 1, 2, 3], [3, 4, 5, 6], [6, 7, 8, 9]]
+
+        textes = ["fight club", "a b c d e f", "critique", "film film film film"]
+        reference = Embedding(modele_local).embeddings_generer(textes, show_progress=False)
+        lots = Embedding(modele_local, token_budget=8).embeddings_generer(textes, show_progress=False)
+        np.testing.assert_allclose(lots, reference, atol=1e-5) # meme vecteurs, meme ordre
+
+        # critique plus longue que le modèle: tronquée par defaut, découpée avec chunking
+        embedding = Embedding(modele_local, token_budget=4096)
+        embedding.model.max_seq_length = 16
+        long_texte = " ".join(["fight club critique film"] * 12)
+        stats = {}
+        encode_bucketed(embedding.model, "torch", [long_texte, "film"], chunking=False, stats=stats)
+        assert stats['tronques'] == 1 and stats['fenetres'] == 2
+        vecteurs = encode_bucketed(embedding.model, "torch", [long_texte, "film"], chunking=True, stats=stats)
+        assert stats['tronques'] == 0 and stats['fenetres'] > 3
+        np.testing.assert_allclose(np.linalg.norm(vecteurs, axis=1), 1.0, atol=1e-5)
+
+    def test_embedding_pool_streams_in_order(self, modele_local):
+        """Test pool multi-processus: memes vecteurs que l'encodage direct, tranches rendues dans l'ordre"""
+        from data_processing.embedding_pool import EmbeddingPool, physical_cores
+        assert physical_cores() >= 1
+        textes = [f"{mot} {i % 7}" for i, mot in enumerate(["fight club", "critique", "film", "a b c d e"] * 10)]
+        reference = Embedding(modele_local).embeddings_generer(textes, show_progress=False)
+
+        with EmbeddingPool(modele_local, workers=2, taille_tranche=6) as pool:
+            tranches = list(pool.iter_encode(textes))
+            assert [debut for debut, _ in tranches] == list(range(0, len(textes), 6))
+            np.testing.assert_allclose(np.concatenate([v for _, v in tranches]), reference, atol=1e-5)
+
+        assert Embedding(modele_local).pool is None and Embedding(modele_local, workers=3).pool.workers == 3
@@ -7,8 +7,11 @@ Date : 3/11/2025
 """
 
 import pytest
+import numpy as np
+import pandas as pd
 from src.recommandation.recommender_engine import RecommanderEngine
 from src.vector_store.vector_store import VectorStore
+from src.vector_store.columnar import write_columnar
 
 class TestRecommenderEngine:
     @pytest.fixture
@@ -56,4 +59,299 @@ class TestRecommenderEngine:
             # Vérifier qu'aucun résultat n'a un score de 1.0 (auto-reco)
             assert all(resultats['similarity_score'] < 1.0)
         else:
-            pytest.skip("aucune critique similaire retrouvée ")
\ No newline at end of file
+            pytest.skip("aucune critique similaire retrouvée ")
+
+    def test_find_similar_precomputed_table(self, engine, tmp_path):
+        """Test service depuis la table des voisins précalculée, identique à la recherche directe"""
+        from src.vector_store.neighbours import build_film_neighbours
+        film_data = engine.vector_store.load_film("fightclub")
+        film_path = tmp_path / "fightclub"
+        film_path.mkdir()
+        np.save(film_path / "embeddings.npy", film_data['embeddings'])
+        write_columnar(film_path, film_data['metadata'])
+        build_film_neighbours(film_path)
+
+        engine_table = RecommanderEngine(VectorStore(tmp_path))
+        assert engine_table.vector_store.get_precomputed_neighbours("fightclub", 0, 10) is not None
+        for critique_id in ["20761", str(film_data['metadata']['id'].iloc[500])]:
+            attendu = engine.find_similar(critique_id=critique_id, film_id="fightclub", k=10, scores_sim_min=0.5)
+            resultats = engine_table.find_similar(critique_id=critique_id, film_id="fightclub", k=10, scores_sim_min=0.5)
+            assert len(resultats) == len(attendu)
+            assert len(set(resultats['id']) & set(attendu['id'])) >= len(attendu) - 1 # quasi-égalités de score
+            np.testing.assert_allclose(resultats['similarity_score'], attendu['similarity_score'], atol=1e-3)
+
+    def test_find_similar_many_equivalent(self, engine):
+        """Test recherche groupée équivalente à find_similar pour chaque critique"""
+        dataF_metadata = engine.vector_store.load_film("fightclub")['metadata']
+        critique_ids = [str(dataF_metadata['id'].iloc[i]) for i in (0, 132, 500, 997)] + ["999999"]
+        resultats = engine.find_similar_many(critique_ids, "fightclub", k=5, scores_sim_min=0.5)
+        assert "999999" not in set(resultats['critique_ref_id'])
+        for critique_id in critique_ids[:-1]:
+            attendu = engine.find_similar(critique_id=critique_id, film_id="fightclub", k=5, scores_sim_min=0.5)
+            groupe = resultats[resultats['critique_ref_id'] == critique_id]
+            assert len(groupe) == len(attendu)
+            np.testing.assert_allclose(groupe['similarity_score'], attendu['similarity_score'], atol=1e-5)
+
+    def test_result_cache_hits_coalescing_invalidation(self, engine):
+        """Test cache des résultats: hit, regroupement des requetes en cours, purge au rechargement"""
+        import threading
+        from src.recommandation.result_cache import ResultCache
+        engine_cache = RecommanderEngine(engine.vector_store, result_cache=ResultCache(max_entries=2))
+        attendu = engine.find_similar(critique_id="20761", film_id="fightclub", k=5, scores_sim_min=0.5)
+        premier = engine_cache.find_similar(critique_id="20761", film_id="fightclub", k=5, scores_sim_min=0.5)
+        premier['similarity_score'] = 0.0 # copie: le cache n'est pas modifié
+        second = engine_cache.find_similar(critique_id="20761", film_id="fightclub", k=5, scores_sim_min=0.5)
+        np.testing.assert_allclose(second['similarity_score'], attendu['similarity_score'])
+        assert engine_cache.result_cache.stats()['hits'] == 1
+
+        # requetes simultanées sur une meme clé: un seul calcul
+        cache = ResultCache()
+        debut, appels = threading.Event(), []
+        def calcul():
+            appels.append(1)
+            debut.wait(5)
+            return "resultat"
+        threads = [threading.Thread(target=cache.get_or_compute, args=(("film", 1), calcul)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        while cache.stats()['misses'] + cache.stats()['coalesced'] < 4:
+            pass
+        debut.set()
+        for thread in threads:
+            thread.join()
+        assert len(appels) == 1 and cache.stats()['coalesced'] == 3
+
+        # nouvel instantané du film -> entrées purgées
+        engine.vector_store.reload_film("fightclub", force=True)
+        assert len(engine_cache.result_cache) == 0
+
+    def test_result_cache_invalidate_during_failing_computation(self):
+        """Test invalidation pendant un calcul qui échoue: erreur d'origine rendue, appelants en attente libérés"""
+        import threading
+        from src.recommandation.result_cache import ResultCache
+        cache = ResultCache()
+        debut, erreurs = threading.Event(), []
+        def calcul():
+            debut.wait(5)
+            raise RuntimeError("recherche impossible")
+        def appel():
+            try:
+                cache.get_or_compute(("f", 1), calcul)
+            except Exception as ex:
+                erreurs.append(ex)
+        threads = [threading.Thread(target=appel, daemon=True) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        while cache.stats()['misses'] + cache.stats()['coalesced'] < 2:
+            pass
+        cache.invalidate("f") # rechargement du film pendant le calcul
+        debut.set()
+        for thread in threads:
+            thread.join(5)
+        assert not any(thread.is_alive() for thread in threads)
+        assert len(erreurs) == 2 and all(isinstance(ex, RuntimeError) for ex in erreurs)
+        assert cache.get_or_compute(("f", 1), lambda: "ok") == "ok" # rien de gardé en cours
+
+    def test_find_above_threshold(self, engine, tmp_path):
+        """Test recherche par seuil: parcours complet et table précalculée équivalents"""
+        from src.vector_store.neighbours import build_film_neighbours
+        film_data = engine.vector_store.load_film("fightclub")
+        index_ref = engine._get_index_with_id("fightclub", "20761")
+        scores_tous = film_data['embeddings'] @ film_data['embeddings'][index_ref]
+        attendus = int((np.delete(scores_tous, index_ref) >= 0.5).sum())
+
+        resultats = engine.find_above_threshold("20761", "fightclub", scores_sim_min=0.5)
+        assert len(resultats) == attendus
+        assert (resultats['similarity_score'] >= 0.5).all()
+        assert resultats['similarity_score'].is_monotonic_decreasing
+        assert len(engine.find_above_threshold("20761", "fightclub", scores_sim_min=0.5, limite=3)) == min(3, attendus)
+
+        film_path = tmp_path / "fightclub"
+        film_path.mkdir()
+        np.save(film_path / "embeddings.npy", film_data['embeddings'])
+        write_columnar(film_path, film_data['metadata'])
+        build_film_neighbours(film_path, k=10)
+        engine_table = RecommanderEngine(VectorStore(tmp_path))
+        assert engine_table.vector_store.get_precomputed_range("fightclub", index_ref, 0.99) is not None
+        assert engine_table.vector_store.get_precomputed_range("fightclub", index_ref, -1.0) is None # table trop courte
+        assert len(engine_table.find_above_threshold("20761", "fightclub", scores_sim_min=0.5)) == attendus
+        # table re-notée exactement: memes critiques et memes scores que le parcours complet
+        for index in range(0, len(film_data['embeddings']), 7):
+            for seuil in (0.5, 0.6, 0.7):
+                table = engine_table.vector_store.get_precomputed_range("fightclub", index, seuil)
+                if table is None:
+                    continue
+                scores_exacts = np.delete(film_data['embeddings'] @ film_data['embeddings'][index], index)
+                assert len(table[0]) == int((scores_exacts >= seuil).sum())
+                np.testing.assert_allclose(table[0], film_data['embeddings'][table[1]] @ film_data['embeddings'][index], atol=1e-7)
+
+    def test_find_similar_mmr_diversity(self, engine):
+        """Test re-classement MMR: lambda=1 identique au top-k, lambda<1 moins de redondance"""
+        from src.recommandation.diversity import mmr_select
+        attendu = engine.find_similar(critique_id="20761", film_id="fightclub", k=5, scores_sim_min=0.3)
+        pertinence = engine.find_similar(critique_id="20761", film_id="fightclub", k=5, scores_sim_min=0.3, mmr_lambda=1.0)
+        assert list(pertinence['id']) == list(attendu['id'])
+
+        # deux quasi-doublons: le second n'est pas choisi quand la diversité compte
+        vecteurs = np.array([[1, 0, 0], [0.99, 0.141, 0], [0.6, 0, 0.8]], dtype=np.float32)
+        scores = np.array([0.95, 0.94, 0.80], dtype=np.float32)
+        assert list(mmr_select(scores, vecteurs, 2, mmr_lambda=1.0)) == [0, 1]
+        assert list(mmr_select(scores, vecteurs, 2, mmr_lambda=0.5)) == [0, 2]
+
+        diversifies = engine.find_similar(critique_id="20761", film_id="fightclub", k=5, scores_sim_min=0.3, mmr_lambda=0.5)
+        assert len(diversifies) == len(attendu)
+        assert (diversifies['similarity_score'] >= 0.3).all()
+
+    def test_find_similar_filters(self, engine):
+        """Test filtres (note, date, auteur) appliqués pendant le top-k: k résultats qui respectent le filtre"""
+        dataF_metadata = engine.vector_store.load_film("fightclub")['metadata']
+        filtres = {'rating_min': 8, 'date_min': "2015-01-01"}
+        resultats = engine.find_similar(critique_id="20761", film_id="fightclub", k=10, scores_sim_min=-1.0, filtres=filtres)
+        assert len(resultats) == 10
+        assert (resultats['rating'] >= 8).all()
+        assert (resultats['review_date_creation'] >= pd.Timestamp("2015-01-01")).all()
+
+        autorises = (dataF_metadata['rating'] >= 8) & (dataF_metadata['review_date_creation'] >= pd.Timestamp("2015-01-01"))
+        masque = engine.vector_store.filter_mask("fightclub", filtres)
+        np.testing.assert_array_equal(masque, autorises.to_numpy())
+
+        user_ref = engine.vector_store.get_critique_by_id("fightclub", "20761")['user_id']
+        resultats = engine.find_similar(critique_id="20761", film_id="fightclub", k=10, scores_sim_min=-1.0,
+                                        filtres={'exclude_same_user': True})
+        assert len(resultats) == 10 and (resultats['user_id'] != user_ref).all()
+        with pytest.raises(ValueError):
+            engine.vector_store.filter_mask("fightclub", {'note_min': 8})
+
+    def test_find_similar_hybrid_scoring(self, engine):
+        """Test score hybride: candidats re-classés par cosinus + popularité + récence (signaux précalculés)"""
+        from src.recommandation.scoring import HybridScorer
+        from src.vector_store.features import compute_features
+        film_data = engine.vector_store.load_film("fightclub")
+        np.testing.assert_allclose(film_data['features']['popularite'], compute_features(film_data['metadata'])['popularite'])
+
+        scorer = HybridScorer(poids_popularite=0.5, poids_recence=0.2, demi_vie_jours=365.0, horloge=lambda: 1.7e9)
+        hybride = RecommanderEngine(engine.vector_store, scorer=scorer)
+        resultats = hybride.find_similar(critique_id="20761", film_id="fightclub", k=5, scores_sim_min=0.3)
+        assert len(resultats) == 5
+        assert (resultats['similarity_score'] >= 0.3).all()
+        assert np.all(np.diff(resultats['hybrid_score'].to_numpy()) <= 1e-6) # ordre du score hybride
+
+        # score = expression attendue recalculée sur les résultats
+        popularite, jours = engine.vector_store.get_features("fightclub", [engine._get_index_with_id("fightclub", str(i)) for i in resultats['id']])
+        attendu = resultats['similarity_score'].to_numpy() + 0.5 * popularite + 0.2 * np.exp2(-np.maximum(1.7e9 / 86400 - jours, 0) / 365.0)
+        np.testing.assert_allclose(resultats['hybrid_score'].to_numpy(), attendu, rtol=1e-5)
+        assert popularite.max() <= 1.0
+
+        # date inconnue -> récence 0, poids nuls -> cosinus seul
+        assert scorer.score(np.array([0.5]), np.array([0.0]), np.array([-np.inf]))[0] == pytest.approx(0.5)
+        assert RecommanderEngine(engine.vector_store, scorer=HybridScorer()).scorer is None
+
+    def test_search_text_query_cache(self, engine):
+        """Test recherche par texte libre: modèle chargé à la demande, vecteurs des requetes en cache LRU"""
+        from src.recommandation.query_encoder import QueryEncoder
+        film_data = engine.vector_store.load_film("fightclub")
+        vecteur_ref = np.asarray(film_data['embeddings'][132], dtype=np.float32)
+
+        class FauxModele:
+            appels = 0
+            textes = []
+            def embeddings_generer(self, texts, batch_size=32, show_progress=True):
+                FauxModele.appels += 1
+                FauxModele.textes.extend(texts)
+                return np.tile(vecteur_ref, (len(texts), 1))
+
+        encodeur = QueryEncoder(max_entries=2, fabrique=FauxModele)
+        moteur = RecommanderEngine(engine.vector_store, query_encoder=encodeur)
+        assert not encodeur.charge
+
+        resultats = moteur.search_text("Tyler  Durden", "fightclub", k=5)
+        assert encodeur.charge and FauxModele.appels == 1
+        assert FauxModele.textes == ["Tyler  Durden"] # texte d'origine encodé, la normalisation ne sert qu'à la clé
+        assert len(resultats) == 5
+        assert str(resultats['id'].iloc[0]) == str(film_data['metadata']['id'].iloc[132]) # vecteur identique en premier
+        assert resultats['similarity_score'].iloc[0] == pytest.approx(1.0, abs=1e-5)
+
+        # texte normalisé: meme clé de cache, pas d'inférence
+        moteur.search_text("  tyler durden ", "fightclub", k=3)
+        assert FauxModele.appels == 1 and encodeur.stats()['hits'] == 1
+        with pytest.raises(ValueError):
+            encodeur.encode("   ")
+        with pytest.raises(ValueError):
+            moteur.search_text("tyler", "film_inexistant", k=3)
+
+    def test_micro_batcher_threads_and_asyncio(self):
+        """Test micro-batching: requetes concurrentes encodées par lots, chaque appelant reçoit son vecteur"""
+        import asyncio
+        import threading
+        from src.recommandation.batch_scheduler import MicroBatcher
+        lots = []
+
+        def encode_lot(textes):
+            lots.append(len(textes))
+            return np.array([[float(t), -float(t)] for t in textes], dtype=np.float32)
+
+        batcher = MicroBatcher(encode_lot, max_batch=8, max_wait=0.05)
+        resultats = {}
+        depart = threading.Barrier(20)
+
+        def appelant(i):
+            depart.wait()
+            resultats[i] = batcher.encode(str(i), timeout=5)
+
+        threads = [threading.Thread(target=appelant, args=(i,)) for i in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert all(resultats[i][0] == i and resultats[i][1] == -i for i in range(20))
+        assert max(lots) <= 8 and len(lots) < 20 and sum(lots) == 20
+
+        async def requetes():
+            return await asyncio.gather(*(batcher.encode_async(str(i)) for i in range(5)))
+        vecteurs = asyncio.run(requetes())
+        assert [v[0] for v in vecteurs] == [0, 1, 2, 3, 4]
+        assert lots[-1] == 5 # un seul lot pour les 5 requetes asyncio
+
+        stats = batcher.stats()
+        assert stats['textes'] == 25 and stats['taille_max'] <= 8 and stats['file'] == 0
+
+        # erreur du modèle propagée à tous les appelants du lot
+        erreur = MicroBatcher(lambda textes: 1 / 0, max_batch=4, max_wait=0.01)
+        with pytest.raises(ZeroDivisionError):
+            erreur.encode("x", timeout=5)
+        batcher.close()
+        erreur.close()
+
+    def test_micro_batcher_bad_batch_and_close(self):
+        """Test micro-batching: lot de mauvaise taille -> exception (pas de blocage), le thread continue; fermeture sans texte oublié"""
+        import time
+        from src.recommandation.batch_scheduler import MicroBatcher
+        appels = []
+
+        def encode_lot(textes):
+            appels.append(list(textes))
+            if len(appels) == 1:
+                return np.zeros((len(textes) + 1, 2), dtype=np.float32) # une ligne de trop
+            return np.ones((len(textes), 2), dtype=np.float32)
+
+        batcher = MicroBatcher(encode_lot, max_batch=4, max_wait=0.01)
+        with pytest.raises(ValueError):
+            batcher.encode("x", timeout=5)
+        assert batcher.encode("y", timeout=5)[0] == 1.0 # lot suivant traité normalement
+        assert batcher.stats()['erreurs'] == 1
+
+        # fermeture pendant un lot: les textes encore en file sont rejetés, pas laissés en attente
+        lent = MicroBatcher(lambda textes: time.sleep(0.3) or np.ones((len(textes), 2), dtype=np.float32), max_batch=1, max_wait=0.0)
+        premier = lent.submit("a")
+        time.sleep(0.05)
+        restants = [lent.submit(str(i)) for i in range(3)]
+        lent.close(timeout=0.01)
+        for futur in restants:
+            with pytest.raises(RuntimeError):
+                futur.result(timeout=5)
+        assert premier.result(timeout=5)[0] == 1.0
+        with pytest.raises(RuntimeError):
+            lent.submit("b")
+        lent._thread.join(5)
+        assert not lent._thread.is_alive()
+        batcher.close()
@@ -9,6 +9,7 @@ import pytest
 import numpy as np
 import pandas as pd
 from src.vector_store.vector_store import VectorStore
+from src.vector_store.columnar import write_columnar
 
 class TestVectoreStore:
     def test_init(self):
@@ -44,3 +45,308 @@ class TestVectoreStore:
         assert len(indices) == 6
         assert all(score <=1.0 for score in scores) # le score de similarité doit etre compris entre 1 et 0
 
+
+    def test_get_index_with_id(self):
+        """Test index ID critique -> ligne (position dans la matrice)"""
+        vector_store = VectorStore()
+        dataF_metadata = vector_store.load_film("fightclub")['metadata']
+        for position in [0, 200, len(dataF_metadata) - 1]:
+            critique_id = dataF_metadata['id'].iloc[position]
+            assert vector_store.get_index_with_id("fightclub", str(critique_id)) == position
+        assert vector_store.get_index_with_id("fightclub", "999999") is None
+        assert vector_store.get_index_with_id("fightclub", "abc") is None
+    #end test_get_index_with_id
+
+    def test_load_film_mmap(self, tmp_path):
+        """Test chargement mmap (embeddings.vec page-aligné) identique au chargement complet"""
+        from src.vector_store.storage import write_vectors, read_header, TAILLE_PAGE
+        source = VectorStore().load_film("fightclub")
+        film_path = tmp_path / "fightclub"
+        film_path.mkdir()
+        write_vectors(film_path / "embeddings.vec", source['embeddings'])
+        write_columnar(film_path, source['metadata'])
+
+        assert read_header(film_path / "embeddings.vec")[:2] == source['embeddings'].shape
+        assert (film_path / "embeddings.vec").stat().st_size == TAILLE_PAGE + source['embeddings'].nbytes
+        film_data = VectorStore(tmp_path, mmap=True).load_film("fightclub")
+        assert isinstance(film_data['embeddings'], np.memmap)
+        np.testing.assert_array_equal(film_data['embeddings'], source['embeddings'])
+    #end test_load_film_mmap
+
+    def test_search_backend_numpy_equivalent_torch(self):
+        """Test backend numpy (dot + argpartition) équivalent au backend torch"""
+        store_numpy = VectorStore(backend="numpy")
+        store_torch = VectorStore(backend="torch")
+        embeddings = store_numpy.load_film("fightclub")['embeddings']
+        for index in [0, 200, 500]:
+            scores_np, indices_np = store_numpy.search_similar_vectors("fightclub", embeddings[index], k=10)
+            scores_t, indices_t = store_torch.search_similar_vectors("fightclub", embeddings[index], k=10)
+            np.testing.assert_allclose(scores_np, scores_t, atol=1e-5)
+            np.testing.assert_array_equal(indices_np, indices_t)
+            assert indices_np[0] == index
+        with pytest.raises(ValueError):
+            VectorStore(backend="faiss")
+    #end test_search_backend_numpy_equivalent_torch
+
+    def test_search_sharded_equivalent(self):
+        """Test recherche répartie en tranches (threads) identique à la recherche sur un coeur"""
+        store = VectorStore()
+        store_shards = VectorStore(shards=3, shard_min_size=0)
+        embeddings = store.load_film("fightclub")['embeddings']
+        for index in [0, 200, 997]:
+            scores, indices = store.search_similar_vectors("fightclub", embeddings[index], k=10)
+            scores_s, indices_s = store_shards.search_similar_vectors("fightclub", embeddings[index], k=10)
+            np.testing.assert_allclose(scores_s, scores, atol=1e-5)
+            assert set(indices_s.tolist()) == set(indices.tolist())
+    #end test_search_sharded_equivalent
+
+    def test_build_neighbour_table(self):
+        """Test table des voisins précalculée (par blocs) identique à la recherche directe"""
+        from src.vector_store.neighbours import build_neighbour_table
+        vector_store = VectorStore()
+        embeddings = vector_store.load_film("fightclub")['embeddings']
+        indices, scores = build_neighbour_table(embeddings, k=20, block_size=64)
+        assert indices.shape == (len(embeddings), 20)
+        assert indices.dtype == np.int32 and scores.dtype == np.float32
+        for index in [0, 200, 997]:
+            scores_live, indices_live = vector_store.search_similar_vectors("fightclub", embeddings[index], k=20)
+            masque = indices_live != index
+            assert index not in indices[index]
+            np.testing.assert_allclose(scores[index], scores_live[masque][:20], atol=1e-5)
+            # ordre des quasi-égalités près (GEMM vs GEMV), les voisins ont les bons scores
+            np.testing.assert_allclose(embeddings[indices[index]] @ embeddings[index], scores_live[masque][:20], atol=1e-5)
+        # scores exacts (float32): meme réponse au seuil que la recherche directe pour toutes les paires
+        exacts = np.einsum('ij,ikj->ik', embeddings, embeddings[indices])
+        for seuil in (0.5, 0.6, 0.7):
+            loin_du_seuil = np.abs(exacts - seuil) > 1e-6
+            assert ((scores >= seuil) == (exacts >= seuil))[loin_du_seuil].all()
+    #end test_build_neighbour_table
+
+    def test_ann_index_ivf(self, tmp_path):
+        """Test index IVF: rappel complet en sondant toutes les listes, sélection par taille du film"""
+        from src.vector_store.ann_index import IVFIndex, evaluate_recall
+        source = VectorStore().load_film("fightclub")
+        index = IVFIndex.build(source['embeddings'], n_listes=16)
+        assert index.offsets[-1] == len(source['embeddings'])
+        rapport = evaluate_recall(source['embeddings'], index, k=10, nprobes=(1, 16), n_requetes=50)
+        assert rapport[0]['recall'] <= rapport[1]['recall'] == 1.0
+
+        film_path = tmp_path / "fightclub"
+        film_path.mkdir()
+        np.save(film_path / "embeddings.npy", source['embeddings'])
+        write_columnar(film_path, source['metadata'])
+        index.save(film_path)
+        assert VectorStore(tmp_path).load_film("fightclub")['ann'] is None # film sous le seuil
+        vector_store = VectorStore(tmp_path, ann_min_size=0, nprobe=16)
+        assert vector_store.load_film("fightclub")['ann'] is not None
+        _, indices = vector_store.search_similar_vectors("fightclub", source['embeddings'][200], k=5)
+        assert indices[0] == 200 and len(indices) == 6
+    #end test_ann_index_ivf
+
+    def test_memory_budget_lru(self, tmp_path):
+        """Test éviction LRU des films quand le budget mémoire est dépassé"""
+        source = VectorStore().load_film("fightclub")
+        for nom in ("film_a", "film_b", "film_c"):
+            (tmp_path / nom).mkdir()
+            np.save(tmp_path / nom / "embeddings.npy", source['embeddings'])
+            write_columnar(tmp_path / nom, source['metadata'])
+
+        vector_store = VectorStore(tmp_path)
+        vector_store.load_film("film_a")
+        vector_store.memory_budget = int(2.5 * vector_store.cache_stats()['octets_utilises'])
+        vector_store.load_film("film_b")
+        vector_store.load_film("film_a") # film_b devient le moins récemment utilisé
+        vector_store.load_film("film_c")
+        assert list(vector_store.loaded_films) == ["film_a", "film_c"]
+        stats = vector_store.cache_stats()
+        assert (stats['hits'], stats['misses'], stats['evictions']) == (1, 3, 1)
+        assert stats['octets_utilises'] <= stats['budget_octets']
+    #end test_memory_budget_lru
+
+    def test_reload_film_snapshot_swap(self, tmp_path):
+        """Test rechargement à chaud: nouvelle version échangée, requete en cours sur l'ancienne"""
+        from src.vector_store.snapshot import write_manifest
+        source = VectorStore().load_film("fightclub")
+        film_path = tmp_path / "fightclub"
+        film_path.mkdir()
+        np.save(film_path / "embeddings.npy", source['embeddings'])
+        write_columnar(film_path, source['metadata'])
+        assert write_manifest(film_path)['version'] == 1
+
+        vector_store = VectorStore(tmp_path)
+        version_1 = vector_store.load_film("fightclub")['version']
+        assert version_1.startswith("v1-")
+        with vector_store.snapshot("fightclub") as film_data:
+            # publication d'une nouvelle version (500 critiques) pendant une requete
+            np.save(film_path / "embeddings.npy", source['embeddings'][:500])
+            write_columnar(film_path, source['metadata'].iloc[:500])
+            write_manifest(film_path)
+            assert vector_store.check_updates() == ["fightclub"]
+            assert len(vector_store.load_film("fightclub")['embeddings']) == len(film_data['embeddings']) == 998
+        assert vector_store.film_version("fightclub").startswith("v2-")
+        assert len(vector_store.load_film("fightclub")['embeddings']) == 500
+        assert vector_store.reload_film("fightclub")[1] == vector_store.film_version("fightclub") # pas de changement
+    #end test_reload_film_snapshot_swap
+
+    def test_columnar_metadata_roundtrip(self, tmp_path):
+        """Test format colonnes des métadonnées: relecture identique, sans colonne 'embedding'"""
+        from src.vector_store.columnar import read_columnar
+        dataF = pd.DataFrame({
+            'id': np.array([3, 1, 2], dtype=np.int64),
+            'review_content': ["é'’ critique", "", None],
+            'user_id': ["anonyme", "42", "7"],
+            'embedding': [np.zeros(3)] * 3
+        })
+        write_columnar(tmp_path, dataF)
+        relu, _ = read_columnar(tmp_path)
+        assert list(relu.columns) == ['id', 'review_content', 'user_id']
+        assert relu['id'].dtype == np.int64 and list(relu['id']) == [3, 1, 2]
+        assert list(relu['review_content'][:2]) == ["é'’ critique", ""] and pd.isna(relu['review_content'][2])
+        assert 'embedding' not in VectorStore().load_film("fightclub")['metadata'].columns
+    #end test_columnar_metadata_roundtrip
+
+    def test_lazy_review_text(self):
+        """Test texte des critiques lu sur disque seulement pour les lignes demandées"""
+        vector_store = VectorStore()
+        film_data = vector_store.load_film("fightclub")
+        assert 'review_content' not in film_data['metadata'].columns
+        complet = VectorStore(lazy_text=False).load_film("fightclub")['metadata']
+        lignes = [5, 0, 997]
+        dataF = vector_store.get_critique_metadata("fightclub", lignes)
+        assert list(dataF['review_content']) == list(complet['review_content'].iloc[lignes])
+        critique_id = complet['id'].iloc[5]
+        assert vector_store.get_critique_by_id("fightclub", critique_id)['review_content'] == complet['review_content'].iloc[5]
+    #end test_lazy_review_text
+
+    def test_delta_segments_tombstones_compaction(self, tmp_path):
+        """Test ajout en segments delta, suppressions (tombstones) puis compaction"""
+        from src.vector_store.neighbours import build_film_neighbours
+        source = VectorStore(lazy_text=False).load_film("fightclub")
+        film_path = tmp_path / "fightclub"
+        film_path.mkdir()
+        np.save(film_path / "embeddings.npy", source['embeddings'])
+        write_columnar(film_path, source['metadata'])
+        build_film_neighbours(film_path, k=20)
+        n = len(source['embeddings'])
+
+        vector_store = VectorStore(tmp_path)
+        vector_store.load_film("fightclub")
+        id_remplace = int(source['metadata']['id'].iloc[7])
+        nouvelles = pd.DataFrame({'id': [10**9, 10**9 + 1, id_remplace], 'review_content': ["ajout 1", "ajout 2", "modifiée"],
+                                  'user_id': ["a", "b", "c"]})
+        vecteurs = source['embeddings'][[3, 4, 5]].copy()
+        vector_store.add_critiques("fightclub", vecteurs, nouvelles)
+
+        film_data = vector_store.load_film("fightclub")
+        assert film_data['n_base'] == n and len(film_data['metadata']) == n + 3
+        index_ajout = vector_store.get_index_with_id("fightclub", 10**9)
+        assert index_ajout == n
+        assert vector_store.get_index_with_id("fightclub", id_remplace) == n + 2 # ancienne ligne remplacée
+        assert vector_store.get_critique_by_id("fightclub", id_remplace)['review_content'] == "modifiée"
+        scores, indices = vector_store.search_similar_vectors("fightclub", vecteurs[0], k=5)
+        assert {3, n} <= set(indices.tolist()) and 7 not in set(vector_store.search_similar_vectors("fightclub", source['embeddings'][7], k=5)[1].tolist())
+        assert vector_store.get_precomputed_neighbours("fightclub", 0, 10) is None # table périmée jusqu'à la compaction
+
+        assert vector_store.delete_critiques("fightclub", [10**9, 999999]) == 1
+        assert vector_store.get_index_with_id("fightclub", 10**9) is None
+        assert n not in vector_store.search_similar_vectors("fightclub", vecteurs[0], k=5)[1]
+        batch_scores, batch_indices = vector_store.search_similar_vectors_batch("fightclub", vecteurs[:1], k=5)
+        np.testing.assert_allclose(batch_scores[0], vector_store.search_similar_vectors("fightclub", vecteurs[0], k=5)[0], atol=1e-5)
+        assert n not in batch_indices
+
+        rapport = vector_store.compact("fightclub")
+        assert rapport == {'critiques': n + 1, 'segments': 1, 'supprimees': 2}
+        film_data = vector_store.load_film("fightclub")
+        assert film_data['delta'] is None and len(film_data['embeddings']) == n + 1
+        assert film_data['voisins'] is not None and not (film_path / "segments").exists()
+        assert vector_store.get_critique_by_id("fightclub", id_remplace)['review_content'] == "modifiée"
+        assert vector_store.compact("fightclub") is None
+    #end test_delta_segments_tombstones_compaction
+
+    def test_reingest_drops_segments_and_tombstones(self, tmp_path):
+        """Test ingestion complète apres ajouts/suppressions: ni doublons des segments ni anciennes tombstones"""
+        from src.vector_store.segments import write_base
+        from src.vector_store.snapshot import read_snapshot
+        source = VectorStore(lazy_text=False).load_film("fightclub")
+        film_path = tmp_path / "fightclub"
+        write_base(film_path, source['embeddings'][:200], source['metadata'].iloc[:200])
+
+        vector_store = VectorStore(tmp_path)
+        ajouts = source['metadata'].iloc[200:203].reset_index(drop=True)
+        vector_store.add_critiques("fightclub", source['embeddings'][200:203], ajouts)
+        vector_store.delete_critiques("fightclub", [int(source['metadata']['id'].iloc[5])])
+        ancienne_base = read_snapshot(film_path)['base']
+
+        # nouvelle ingestion du meme film, critiques ajoutées comprises (comme Embedding.save_embeddings)
+        write_base(film_path, source['embeddings'][:203], source['metadata'].iloc[:203], k_voisins=10)
+        etat = read_snapshot(film_path)
+        assert etat['base'] != ancienne_base and etat['segments'] == [] and etat['tombstones'] is None
+        vector_store.reload_film("fightclub")
+        film_data = vector_store.load_film("fightclub")
+        assert len(film_data['metadata']) == 203 and film_data['metadata']['id'].is_unique
+        assert film_data['delta'] is None and len(film_data['supprimes']) == 0
+        assert vector_store.get_index_with_id("fightclub", int(source['metadata']['id'].iloc[5])) == 5
+        assert film_data['voisins'] is not None
+    #end test_reingest_drops_segments_and_tombstones
+
+    def test_compaction_publishes_new_base(self, tmp_path):
+        """Test compaction: nouvelle base publiée d'un coup, l'instantané précédent reste lisible"""
+        from src.vector_store.segments import write_base, append_segment, add_tombstones, compact_film, read_segments
+        from src.vector_store.snapshot import read_snapshot, write_manifest
+        source = VectorStore(lazy_text=False).load_film("fightclub")
+        film_path = tmp_path / "fightclub"
+        write_base(film_path, source['embeddings'][:100], source['metadata'].iloc[:100])
+        append_segment(film_path, source['embeddings'][100:110], source['metadata'].iloc[100:110])
+        add_tombstones(film_path, [0, 1])
+        write_manifest(film_path)
+        avant = read_snapshot(film_path)
+
+        assert compact_film(film_path) == {'critiques': 108, 'segments': 1, 'supprimees': 2}
+        apres = read_snapshot(film_path)
+        assert apres['base'] != avant['base'] and apres['segments'] == [] and apres['tombstones'] is None
+        assert len(read_segments(avant['segments'])[0]) == 10 # lecture en cours: ancienne base intacte
+        assert len(VectorStore(tmp_path).load_film("fightclub")['embeddings']) == 108
+    #end test_compaction_publishes_new_base
+
+    def test_stale_derived_tables_rejected(self, tmp_path):
+        """Test table des voisins / index IVF calculés sur d'autres vecteurs (meme nombre de lignes) ignorés"""
+        from src.vector_store.neighbours import build_film_neighbours, load_neighbour_table
+        from src.vector_store.ann_index import build_film_ann_index, IVFIndex
+        source = VectorStore(lazy_text=False).load_film("fightclub")
+        film_path = tmp_path / "fightclub"
+        film_path.mkdir()
+        np.save(film_path / "embeddings.npy", source['embeddings'])
+        write_columnar(film_path, source['metadata'])
+        build_film_neighbours(film_path, k=10)
+        build_film_ann_index(film_path, taille_min=0)
+        assert load_neighbour_table(film_path) is not None and IVFIndex.load(film_path) is not None
+        scores = np.load(film_path / "neighbours_scores.npy")
+        np.save(film_path / "neighbours_scores.npy", scores.astype(np.float16)) # ancien format arrondi
+        assert load_neighbour_table(film_path) is None
+        np.save(film_path / "neighbours_scores.npy", scores)
+
+        np.save(film_path / "embeddings.npy", source['embeddings'][::-1]) # nouveaux vecteurs, meme taille
+        assert load_neighbour_table(film_path) is None and IVFIndex.load(film_path) is None
+        film_data = VectorStore(tmp_path, ann_min_size=0).load_film("fightclub")
+        assert film_data['voisins'] is None and film_data['ann'] is None
+    #end test_stale_derived_tables_rejected
+
+    def test_read_film_rejects_unpublished_files(self, tmp_path):
+        """Test fichier réécrit apres le manifest (publication en cours): lecture refusée jusqu'au nouveau manifest"""
+        from src.vector_store.snapshot import write_manifest, read_snapshot, snapshot_matches
+        source = VectorStore(lazy_text=False).load_film("fightclub")
+        film_path = tmp_path / "fightclub"
+        film_path.mkdir()
+        np.save(film_path / "embeddings.npy", source['embeddings'])
+        write_columnar(film_path, source['metadata'])
+        write_manifest(film_path)
+        assert snapshot_matches(film_path, read_snapshot(film_path))
+
+        np.save(film_path / "embeddings.npy", source['embeddings'][:500]) # écrivain en cours, manifest pas encore publié
+        assert not snapshot_matches(film_path, read_snapshot(film_path))
+        with pytest.raises(RuntimeError):
+            VectorStore(tmp_path)._read_film("fightclub", tentatives=2)
+        write_columnar(film_path, source['metadata'].iloc[:500])
+        write_manifest(film_path)
+        assert len(VectorStore(tmp_path).load_film("fightclub")['embeddings']) == 500
+    #end test_read_film_rejects_unpublished_files